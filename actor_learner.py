@@ -0,0 +1,369 @@
+# actor_learner.py
+"""
+Multi-process actor-learner training for the DQN boss.
+
+Actor processes play BossAssaultEnv episodes with a local torch-free copy of the policy
+(policy_inference.NumpyPolicy). They write transitions into their own slots of a shared-memory
+block (transition_layout). Only (actor, slot, count, episode stats) messages go through a
+queue. The learner (the calling process) owns the DQNAgent, its optimizer and replay memory.
+It copies each received slot out, hands the slot straight back to its actor, and passes the
+whole chunk to agent.learn_batch: one vectorized write into the replay ring, then the gradient
+steps due for that many environment steps.
+
+Every publish_every gradient steps, the learner writes the policy weights and epsilon into a
+SharedWeights block. Actors pick up the new version between episodes.
+
+Simulation scales with the number of actors. The learner trains on the cadence set by
+DQNAgent(learn_every, gradient_steps), and a gradient step costs far more than simulating a
+transition, so the learner only keeps up if learn_every grows with the number of actors. The
+CLI default is LEARN_EVERY_PER_ACTOR environment steps per actor between gradient steps of
+LEARNER_BATCH_SIZE samples (benchmark.py learner measures both sides). Actor timing decides
+the order in which transitions reach the learner, so runs with more than one actor are not
+bit-reproducible even with a seed.
+
+    python actor_learner.py --actors 8 --episodes 200000
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from state_encoding import OBS_DIM, REPLAY_STORAGE_MODES
+from policy_inference import NumpyPolicy, WEIGHT_NAMES, POLICY_WEIGHTS_FILE
+from seeding import spawn
+from headless_training import (BossAssaultEnv, TrainingStatsLog, NUM_EPISODES_TO_TRAIN, SAVE_AGENT_EVERY_N_EPISODES,
+                               AGENT_MODEL_FILE, LOG_STATS_EVERY_N_EPISODES, TRAINING_STATS_FILE, CHECKPOINT_DIR)
+
+CHUNK_TRANSITIONS = 256 # Transitions per slot (one queue message)
+SLOTS_PER_ACTOR = 4     # Slots an actor can fill while the learner drains the others
+PUBLISH_EVERY_N_UPDATES = 100 # Gradient steps between weight broadcasts
+POLL_SECONDS = 0.5
+# Default learner cadence: one gradient step of LEARNER_BATCH_SIZE samples every
+# LEARN_EVERY_PER_ACTOR x actors transitions, so the learner's capacity grows with the actors'
+LEARN_EVERY_PER_ACTOR = 48
+LEARNER_BATCH_SIZE = 256
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays laid out in one multiprocessing.shared_memory block. layout is a list
+    of (name, dtype, shape). Create in the parent with name=None; attach in a child with the
+    parent's block name (SharedArrays(layout, block.name)).
+    """
+    def __init__(self, layout, name=None):
+        self.layout = [(field, np.dtype(dtype).str, tuple(shape)) for field, dtype, shape in layout]
+        offsets = []
+        size = 0
+        for _field, dtype, shape in self.layout:
+            size = -(-size // 8) * 8 # 8-byte align every array
+            offsets.append(size)
+            size += np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=max(size, 1))
+        self.name = self.shm.name
+        self.arrays = {field: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+                       for (field, dtype, shape), offset in zip(self.layout, offsets)}
+
+    def spec(self):
+        """Picklable (layout, name) to attach from another process."""
+        return self.layout, self.name
+
+    def close(self):
+        self.arrays = {} # Views must be dropped before the buffer can be released
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class SharedWeights(SharedArrays):
+    """
+    Policy weights plus epsilon in shared memory, with one writer (the learner) and many readers.
+    Writes are guarded by a sequence lock: version is odd while a write is in progress, and a
+    reader retries if the version changed during its copy.
+    """
+    HEADER = [("version", np.int64, (1,)), ("epsilon", np.float64, (1,))]
+
+    @classmethod
+    def for_weights(cls, weights):
+        """New block sized for weights, a {WEIGHT_NAMES: array} dict."""
+        return cls(cls.HEADER + [(name, np.float32, np.shape(weights[name])) for name in WEIGHT_NAMES])
+
+    def version(self):
+        return int(self.arrays["version"][0])
+
+    def publish(self, weights, epsilon):
+        arrays = self.arrays
+        version = arrays["version"]
+        version[0] += 1 # Odd: write in progress
+        for name in WEIGHT_NAMES:
+            arrays[name][...] = weights[name]
+        arrays["epsilon"][0] = epsilon
+        version[0] += 1
+
+    def read(self):
+        """(version, [weight arrays in WEIGHT_NAMES order], epsilon): a consistent copy."""
+        arrays = self.arrays
+        while True:
+            before = int(arrays["version"][0])
+            if before % 2:
+                time.sleep(0)
+                continue
+            weights = [arrays[name].copy() for name in WEIGHT_NAMES]
+            epsilon = float(arrays["epsilon"][0])
+            if int(arrays["version"][0]) == before:
+                return before, weights, epsilon
+
+
+def transition_layout(num_actors, slots_per_actor=SLOTS_PER_ACTOR, chunk=CHUNK_TRANSITIONS):
+    """SharedArrays layout of the transition slots: (actor, slot, row, ...) per field."""
+    slots = (num_actors, slots_per_actor, chunk)
+    return [("states", np.float32, slots + (OBS_DIM,)), ("actions", np.int64, slots),
+            ("rewards", np.float32, slots), ("next_states", np.float32, slots + (OBS_DIM,)),
+            ("dones", np.bool_, slots)]
+
+
+def policy_weights(agent):
+    """{WEIGHT_NAMES: float32 array} of agent.policy_net (same names as DQNAgent.export_policy)."""
+    return {name.replace(".", "_"): tensor.detach().cpu().numpy()
+            for name, tensor in agent.policy_net.state_dict().items()}
+
+
+def _next_free_slot(free_slots, stop):
+    while not stop.is_set():
+        try:
+            return free_slots.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return None
+
+
+def _play_and_stream(actor_id, policy, env, weights, slots, free_slots, full_slots, stop, writer=None):
+    """
+    Actor loop: fills free slots with transitions, refreshing the policy between episodes.
+    With a writer (trajectory_store.TrajectoryWriter), also stores every transition on disk.
+    """
+    version = weights.version()
+    observations = env.observations
+    states, actions, rewards, next_states, dones = (slots.arrays[field][actor_id] for field in
+                                                    ("states", "actions", "rewards", "next_states", "dones"))
+    chunk = states.shape[1]
+    slot = _next_free_slot(free_slots, stop)
+    filled = 0
+    episodes = [] # (episode_reward, boss_won) finished since the last message
+    while slot is not None:
+        env.reset()
+        while not env.done:
+            _next_state_dict, reward, done, info = env.step()
+            if info["action_idx"] is None:
+                continue
+            states[slot, filled] = observations[0]
+            actions[slot, filled] = info["action_idx"]
+            rewards[slot, filled] = reward
+            next_states[slot, filled] = observations[1]
+            dones[slot, filled] = done
+            if writer is not None:
+                writer.add(observations[0], info["action_idx"], reward, observations[1], done)
+            filled += 1
+            if filled == chunk:
+                full_slots.put((actor_id, slot, filled, episodes))
+                episodes = []
+                filled = 0
+                slot = _next_free_slot(free_slots, stop)
+                if slot is None:
+                    return
+        episodes.append((env.episode_reward, bool(env.boss_won)))
+        if writer is not None:
+            writer.end_episode()
+        if weights.version() != version:
+            version, arrays, policy.epsilon = weights.read()
+            policy.set_weights(*arrays)
+
+
+def _run_actor(actor_id, seed, weights_spec, slots_spec, free_slots, full_slots, stop, record, env_kwargs):
+    """Actor process body: plays episodes and streams transitions until stop is set."""
+    weights = SharedWeights(*weights_spec)
+    slots = SharedArrays(*slots_spec)
+    writer = None
+    try:
+        if record is not None:
+            from trajectory_store import TrajectoryWriter
+            record_dir, record_storage = record
+            writer = TrajectoryWriter(record_dir, record_storage, name=f"actor{actor_id}")
+        _version, arrays, epsilon = weights.read()
+        policy = NumpyPolicy(*arrays, epsilon=epsilon)
+        env = BossAssaultEnv(agent=policy, state_dicts=False, seed=seed, **env_kwargs)
+        _play_and_stream(actor_id, policy, env, weights, slots, free_slots, full_slots, stop, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+        weights.close()
+        slots.close()
+
+
+def _copy_slot(slots, actor_id, slot, count):
+    """(states, actions, rewards, next_states, dones) copies of the first count rows of a slot."""
+    return tuple(slots.arrays[field][actor_id, slot, :count].copy()
+                 for field in ("states", "actions", "rewards", "next_states", "dones"))
+
+
+def _stop_actors(actors, full_slots, stop, timeout=10.0):
+    """Stops the actors, draining their pending messages so none blocks on exit."""
+    stop.set()
+    deadline = time.monotonic() + timeout
+    while any(actor.is_alive() for actor in actors) and time.monotonic() < deadline:
+        try:
+            while True:
+                full_slots.get_nowait()
+        except queue.Empty:
+            pass
+        for actor in actors:
+            actor.join(timeout=0.05)
+    for actor in actors:
+        if actor.is_alive():
+            actor.terminate()
+            actor.join()
+
+
+def run_actor_learner(agent, num_episodes, num_actors=4, seed=None, publish_every=PUBLISH_EVERY_N_UPDATES,
+                      chunk=CHUNK_TRANSITIONS, slots_per_actor=SLOTS_PER_ACTOR,
+                      stats_file=TRAINING_STATS_FILE, save_every=SAVE_AGENT_EVERY_N_EPISODES,
+                      log_every=LOG_STATS_EVERY_N_EPISODES, model_dir=os.path.dirname(AGENT_MODEL_FILE),
+                      final_model_file=AGENT_MODEL_FILE, verbose=True, record_dir=None, record_storage="uint8",
+                      checkpoints=None, policy_file=POLICY_WEIGHTS_FILE, **env_kwargs):
+    """
+    Trains agent with num_actors actor processes until num_episodes episodes have been
+    reported. Stats CSV and checkpoints as in headless_training.run_headless_training.
+    With record_dir, each actor also appends its episodes to that trajectory store
+    (writer "actor<i>", see trajectory_store.py). With checkpoints (a CheckpointStore),
+    periodic checkpoints are saved there in the background. The final model is also
+    exported to policy_file (None: not exported).
+    Returns (all_episode_rewards, boss_win_flags) in the order episodes reached the learner.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    weights = SharedWeights.for_weights(policy_weights(agent))
+    weights.publish(policy_weights(agent), agent.epsilon)
+    slots = SharedArrays(transition_layout(num_actors, slots_per_actor, chunk))
+    free_slots = [ctx.Queue() for _ in range(num_actors)]
+    for actor_queue in free_slots:
+        for slot in range(slots_per_actor):
+            actor_queue.put(slot)
+    full_slots = ctx.Queue()
+    stop = ctx.Event()
+    actor_seeds = spawn(seed, num_actors)
+    actors = [ctx.Process(target=_run_actor, daemon=True,
+                          args=(actor_id, actor_seeds[actor_id], weights.spec(), slots.spec(),
+                                free_slots[actor_id], full_slots, stop,
+                                (record_dir, record_storage) if record_dir else None, env_kwargs))
+              for actor_id in range(num_actors)]
+    for actor in actors:
+        actor.start()
+
+    stats = TrainingStatsLog(stats_file, log_every, verbose)
+    published_at = agent.update_count
+    try:
+        while len(stats.episode_rewards) < num_episodes:
+            try:
+                actor_id, slot, count, episodes = full_slots.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if not any(actor.is_alive() for actor in actors):
+                    raise RuntimeError("All actor processes exited.")
+                continue
+            transitions = _copy_slot(slots, actor_id, slot, count)
+            free_slots[actor_id].put(slot) # The actor refills it while the learner trains
+            agent.learn_batch(*transitions)
+
+            if agent.update_count - published_at >= publish_every:
+                weights.publish(policy_weights(agent), agent.epsilon)
+                published_at = agent.update_count
+
+            for episode_reward, boss_won in episodes:
+                if len(stats.episode_rewards) >= num_episodes:
+                    break
+                episode = stats.record(episode_reward, boss_won, agent.epsilon, num_episodes)
+                if save_every and episode % save_every == 0:
+                    if checkpoints is not None:
+                        checkpoints.save_async(agent, episode, stats.summary())
+                    else:
+                        agent.save(os.path.join(model_dir, f"dqn_boss_episode_{episode}.pth"))
+    finally:
+        _stop_actors(actors, full_slots, stop)
+        stats.close()
+        if checkpoints is not None:
+            checkpoints.flush()
+        for block in (weights, slots):
+            block.close()
+            block.unlink()
+
+    if final_model_file:
+        agent.save(final_model_file)
+        if verbose: print(f"Training finished. Agent saved to {final_model_file}")
+        if policy_file:
+            agent.export_policy(policy_file) # Keeps main.py play mode on the new weights
+    return stats.episode_rewards, stats.boss_win_flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the DQN boss with parallel actor processes.")
+    parser.add_argument("--actors", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--episodes", type=int, default=NUM_EPISODES_TO_TRAIN)
+    parser.add_argument("--model", default=AGENT_MODEL_FILE, help="Final model path (also loaded with --resume-weights).")
+    parser.add_argument("--policy-out", default=POLICY_WEIGHTS_FILE,
+                        help="Also export the final policy here for torch-free play ('' = no export).")
+    parser.add_argument("--stats-file", default=TRAINING_STATS_FILE)
+    parser.add_argument("--save-every", type=int, default=SAVE_AGENT_EVERY_N_EPISODES)
+    parser.add_argument("--log-every", type=int, default=LOG_STATS_EVERY_N_EPISODES)
+    parser.add_argument("--resume-weights", action="store_true", help="Load --model before training.")
+    parser.add_argument("--publish-every", type=int, default=PUBLISH_EVERY_N_UPDATES,
+                        help="Gradient steps between weight broadcasts to the actors.")
+    parser.add_argument("--chunk", type=int, default=CHUNK_TRANSITIONS, help="Transitions per actor message.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prioritized-replay", action="store_true", help="Prioritized experience replay (sum-tree).")
+    parser.add_argument("--learn-every", type=int, default=None,
+                        help=f"Train every k transitions (default {LEARN_EVERY_PER_ACTOR} x actors).")
+    parser.add_argument("--gradient-steps", type=int, default=1, help="Gradient steps per training call.")
+    parser.add_argument("--batch-size", type=int, default=LEARNER_BATCH_SIZE, help="Transitions per gradient step.")
+    parser.add_argument("--replay-size", type=int, default=50000, help="Replay buffer capacity (transitions).")
+    parser.add_argument("--replay-storage", choices=REPLAY_STORAGE_MODES, default="float32",
+                        help="Replay observation storage: 85, 24 or 14 bytes per transition.")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="Checkpoint store for the periodic checkpoints ('' = dqn_boss_episode_N.pth files).")
+    parser.add_argument("--weights-only-checkpoints", action="store_true",
+                        help="Periodic checkpoints keep only the policy network and epsilon.")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="Actors also append their episodes to this trajectory store (trajectory_store.py).")
+    parser.add_argument("--record-storage", choices=REPLAY_STORAGE_MODES, default="uint8")
+    args = parser.parse_args(argv)
+
+    from agent import DQNAgent
+    learner_seed, actors_seed = spawn(args.seed, 2) if args.seed is not None else (None, None)
+    agent = DQNAgent(seed=learner_seed, prioritized_replay=args.prioritized_replay, batch_size=args.batch_size,
+                     learn_every=args.learn_every or LEARN_EVERY_PER_ACTOR * args.actors, gradient_steps=args.gradient_steps,
+                     replay_buffer_size=args.replay_size, replay_storage=args.replay_storage)
+    if args.resume_weights and os.path.exists(args.model):
+        agent.load(args.model)
+
+    checkpoints = None
+    if args.checkpoint_dir:
+        from checkpoint_store import CheckpointStore
+        checkpoints = CheckpointStore(args.checkpoint_dir, weights_only=args.weights_only_checkpoints)
+
+    os.makedirs(os.path.dirname(args.model) or ".", exist_ok=True)
+    start = time.perf_counter()
+    run_actor_learner(agent, args.episodes, args.actors, seed=actors_seed, publish_every=args.publish_every,
+                      chunk=args.chunk, stats_file=args.stats_file, save_every=args.save_every,
+                      log_every=args.log_every, model_dir=os.path.dirname(args.model) or ".",
+                      final_model_file=args.model, record_dir=args.record, record_storage=args.record_storage,
+                      checkpoints=checkpoints, policy_file=args.policy_out)
+    if checkpoints is not None:
+        checkpoints.close()
+    elapsed = time.perf_counter() - start
+    print(f"{args.episodes} episodes in {elapsed:.1f}s ({args.episodes / elapsed:.1f} episodes/sec, {args.actors} actors)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
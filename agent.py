@@ -1,26 +1,31 @@
 # agent.py
 import numpy as np
-import random
 import pickle
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from collections import deque # For replay buffer
-
-# --- State Discretization Parameters ---
-HP_BINS = 5
-RAGE_BINS = 4
-CD_STATES_PER_SKILL = {"horizontal_shot": 3, "vertical_shot": 3, "heal": 4}
-NUM_TANK_BINS = 4
-NUM_KNIGHT_BINS = 4
-NUM_AD_BINS = 5
-ROUND_BINS = 9
+from targeting import heuristic_skill_params
+from seeding import GLOBAL_RANDOM, python_rng, numpy_rng, spawn, int_seed, episode_seed
+from replay import ReplayBuffer, PrioritizedReplayBuffer
+from training_state import atomic_save, arrays_to_tensors, tensors_to_arrays
+from policy_inference import POLICY_WEIGHTS_FILE
+# State discretization parameters and encoders live in the torch-free state_encoding module
+from state_encoding import OBS_DIM, encode_state_dict, replay_codec
 
 ACTION_MAP_AGENT = {
     0: "normal_attack", 1: "horizontal_shot", 2: "vertical_shot", 3: "heal", 4: "ultimate"
 }
 NUM_ACTIONS = len(ACTION_MAP_AGENT)
 
+
+def available_action_mask(available_skill_keys, out=None):
+    """(NUM_ACTIONS,) bool row of the skills in available_skill_keys (Boss.get_available_skills_keys)."""
+    if out is None:
+        out = np.empty(NUM_ACTIONS, dtype=bool)
+    for idx, sk_key in ACTION_MAP_AGENT.items():
+        out[idx] = sk_key in available_skill_keys
+    return out
+
 # Define the Neural Network for the Q-value approximation
 class DQN(nn.Module):
     def __init__(self, input_dim, output_dim):
@@ -40,7 +45,9 @@ class DQNAgent:
                  exploration_rate=1.0, exploration_decay=0.99999, # Adjusted decay
                  min_exploration_rate=0.005,
                  boss_skills_ref=None,
-                 replay_buffer_size=50000, batch_size=64, target_update_freq=100):
+                 replay_buffer_size=50000, batch_size=64, target_update_freq=100, seed=None,
+                 prioritized_replay=False, per_alpha=0.6, per_beta=0.4, per_beta_steps=100000,
+                 learn_every=1, gradient_steps=1, replay_storage="float32"):
         
         self.lr = learning_rate
         self.gamma = discount_factor
@@ -50,11 +57,24 @@ class DQNAgent:
         self.boss_skills_ref = boss_skills_ref
 
         # Define input and output dimensions for the neural network
-        self.input_dim = 9 # (hp, rage, cd_hshot, cd_vshot, cd_heal, tanks, knights, ads, round)
+        self.input_dim = OBS_DIM # (hp, rage, cd_hshot, cd_vshot, cd_heal, tanks, knights, ads, round)
         self.output_dim = NUM_ACTIONS
 
-        # Policy Network (main Q-network)
-        self.policy_net = DQN(self.input_dim, self.output_dim)
+        # Random streams: exploration, targeting and replay sampling. Without a seed the agent
+        # uses the global random / np.random state as before; with one it owns its streams.
+        # np_rng draws the batched exploration of choose_actions.
+        self.rng = GLOBAL_RANDOM
+        self.np_rng = np.random
+        init_seed = None
+        if seed is not None:
+            init_seed, stream_seed = spawn(seed, 2)
+            self.reseed(stream_seed)
+
+        # Policy Network (main Q-network); a seeded agent draws its initial weights from its own seed
+        with torch.random.fork_rng(devices=[], enabled=init_seed is not None):
+            if init_seed is not None:
+                torch.manual_seed(int_seed(init_seed, 63))
+            self.policy_net = DQN(self.input_dim, self.output_dim)
         # Target Network (for stable Q-value calculation)
         self.target_net = DQN(self.input_dim, self.output_dim)
         self.target_net.load_state_dict(self.policy_net.state_dict())
@@ -63,88 +83,72 @@ class DQNAgent:
         self.optimizer = optim.Adam(self.policy_net.parameters(), lr=self.lr)
         self.criterion = nn.MSELoss() # Mean Squared Error Loss for Q-value prediction
 
-        # Replay Buffer
-        self.replay_buffer = deque(maxlen=replay_buffer_size)
+        # Replay Buffer: preallocated NumPy ring buffer (see replay.py), optionally prioritized.
+        # replay_storage "uint8" / "packed" (or an ObservationCodec for other board configurations)
+        # stores observations as integer codes: 24 / 14 bytes per transition instead of 85
+        self.prioritized_replay = prioritized_replay
+        codec = replay_codec(replay_storage)
+        if prioritized_replay:
+            self.replay_buffer = PrioritizedReplayBuffer(replay_buffer_size, self.input_dim, batch_size, self.rng, codec,
+                                                         alpha=per_alpha, beta=per_beta, beta_steps=per_beta_steps)
+        else:
+            self.replay_buffer = ReplayBuffer(replay_buffer_size, self.input_dim, batch_size, self.rng, codec)
         self.batch_size = batch_size
         self.target_update_freq = target_update_freq
-        self.update_count = 0 # Counter for target network updates
+        self.update_count = 0 # Gradient steps taken
+        # Update cadence (replay ratio): every learn_every environment steps, take gradient_steps
+        # gradient steps of batch_size samples each. Epsilon decay and target syncs tick on
+        # environment steps, so they follow the same schedule whatever the cadence.
+        # The defaults (1, 1) are one gradient step per boss decision.
+        self.learn_every = max(1, learn_every)
+        self.gradient_steps = max(1, gradient_steps)
+        self.env_steps = 0 # Environment steps since the buffer first held a batch
 
         # Device configuration (CPU or GPU if available)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.policy_net.to(self.device)
         self.target_net.to(self.device)
 
+    def reseed(self, seed):
+        """Switches the agent to its own random stream seeded from seed (int or SeedSequence)."""
+        self.rng = python_rng(seed)
+        self.np_rng = numpy_rng(episode_seed(seed, 0)) # A child stream, independent of rng
+        if hasattr(self, "replay_buffer"):
+            self.replay_buffer.rng = self.rng
+
     def _discretize_state(self, game_state_dict):
         """
         Converts a raw game state dictionary into a normalized numpy array (float32)
-        suitable for neural network input.
+        suitable for neural network input. Hot paths should use state_encoding.ObservationWriter
+        to encode straight from the game into a preallocated buffer instead.
         """
-        hp_val = game_state_dict["boss_hp"]
-        max_hp = game_state_dict.get("boss_max_hp", 50) # Default to 50 if not found for safety
-
-        # Normalize HP (0-1 range)
-        hp_normalized = hp_val / max_hp if max_hp > 0 else 0.0
-
-        # Rage (already 0-3, normalize to 0-1)
-        rage_normalized = game_state_dict["boss_rage"] / (RAGE_BINS - 1)
+        return encode_state_dict(game_state_dict)
 
-        # Cooldowns (already capped, normalize to 0-1)
-        cd_hshot_normalized = game_state_dict["skill_cooldowns"]["horizontal_shot"] / (CD_STATES_PER_SKILL["horizontal_shot"] - 1)
-        cd_vshot_normalized = game_state_dict["skill_cooldowns"]["vertical_shot"] / (CD_STATES_PER_SKILL["vertical_shot"] - 1)
-        cd_heal_normalized = game_state_dict["skill_cooldowns"]["heal"] / (CD_STATES_PER_SKILL["heal"] - 1)
-        
-        # Unit counts (already capped, normalize to 0-1)
-        tank_normalized = game_state_dict["unit_counts"]["Tank"] / (NUM_TANK_BINS - 1)
-        knight_normalized = game_state_dict["unit_counts"]["Knight"] / (NUM_KNIGHT_BINS - 1)
-        ad_normalized = game_state_dict["unit_counts"]["AD"] / (NUM_AD_BINS - 1)
-        
-        # Round index (already capped and min-clamped, normalize to 0-1)
-        round_normalized = max(0, game_state_dict["current_round"] - 1) / (ROUND_BINS - 1)
-        
-        # Create a numpy array from normalized values
-        state_vector = np.array([
-            hp_normalized,
-            rage_normalized,
-            cd_hshot_normalized,
-            cd_vshot_normalized,
-            cd_heal_normalized,
-            tank_normalized,
-            knight_normalized,
-            ad_normalized,
-            round_normalized
-        ], dtype=np.float32)
-
-        return state_vector
-
-    def choose_action(self, state_vector, available_skill_keys, grid_units_for_targeting):
+    def choose_action(self, state_vector, available_skill_keys, grid_units_for_targeting, forced_action_idx=None):
         """
         Chooses an action based on epsilon-greedy strategy.
+        If forced_action_idx is given (e.g. by an environment's step()), that skill is used
+        instead, provided it is currently available; only its targets are picked heuristically.
         """
         available_action_indices = [idx for idx, sk_key in ACTION_MAP_AGENT.items() if sk_key in available_skill_keys]
         if not available_action_indices:
             return None, [], None # No available actions
 
         action_idx = -1
-        if np.random.rand() <= self.epsilon:
+        if forced_action_idx is not None:
+            if forced_action_idx not in available_action_indices:
+                return None, [], None # Forced skill is on cooldown / lacks rage
+            action_idx = forced_action_idx
+        elif (np.random.rand() if self.rng is GLOBAL_RANDOM else self.rng.random()) <= self.epsilon:
             # Exploration: choose a random available action
-            action_idx = random.choice(available_action_indices)
+            action_idx = self.rng.choice(available_action_indices)
         else:
-            # Exploitation: choose action with highest Q-value from the policy network
-            state_tensor = torch.from_numpy(state_vector).float().unsqueeze(0).to(self.device)
-            self.policy_net.eval()
-            with torch.no_grad():
-                q_values = self.policy_net(state_tensor).squeeze(0)
-            self.policy_net.train()
-
-            masked_q_values = q_values.clone()
-            for i in range(self.output_dim):
-                if i not in available_action_indices:
-                    masked_q_values[i] = -float('inf')
+            # Exploitation: choose action with highest Q-value among the available ones
+            mask = available_action_mask(available_skill_keys)
+            action_idx = int(self.greedy_actions(state_vector[None], mask[None])[0])
 
-            action_idx = torch.argmax(masked_q_values).item()
-
-            if action_idx not in available_action_indices:
-                 action_idx = random.choice(available_action_indices)
+            if action_idx not in available_action_indices: # Only with NaN Q-values
+                 action_idx = self.rng.choice(available_action_indices)
 
         chosen_skill_key = ACTION_MAP_AGENT.get(action_idx)
         if not chosen_skill_key:
@@ -153,68 +157,55 @@ class DQNAgent:
         skill_params = self._get_heuristic_skill_params(chosen_skill_key, grid_units_for_targeting)
         return chosen_skill_key, skill_params, action_idx
 
+    def greedy_actions(self, state_matrix, available_mask):
+        """
+        Index of the highest-Q available action for each row of state_matrix (N, OBS_DIM), in
+        one forward pass. available_mask is (N, NUM_ACTIONS) bool; rows with no available
+        action get an arbitrary index (choose_actions returns -1 for them).
+        """
+        states = torch.from_numpy(np.asarray(state_matrix, dtype=np.float32)).to(self.device)
+        mask = torch.from_numpy(np.asarray(available_mask, dtype=bool)).to(self.device)
+        # The network has no dropout / batch norm, so no eval()/train() switch is needed
+        with torch.no_grad():
+            q_values = self.policy_net(states)
+        return q_values.masked_fill_(~mask, -float('inf')).argmax(dim=1).cpu().numpy()
+
+    def choose_actions(self, state_matrix, available_mask, epsilon=None):
+        """
+        Batched epsilon-greedy skill choice for N games (e.g. batch_env.VectorizedBossEnv):
+        state_matrix is (N, OBS_DIM), available_mask (N, NUM_ACTIONS) bool (see
+        available_action_mask / VectorizedBossEnv.available_skills). Returns (N,) int64 action
+        indices; -1 where no skill is available. Only skills are chosen: targets are up to the
+        caller. epsilon defaults to the agent's current exploration rate.
+        """
+        available_mask = np.asarray(available_mask, dtype=bool)
+        epsilon = self.epsilon if epsilon is None else epsilon
+        num_rows = len(available_mask)
+        actions = self.greedy_actions(state_matrix, available_mask).astype(np.int64)
+        explore = self.np_rng.random(num_rows) <= epsilon
+        if explore.any():
+            # Uniform random available action: the largest random key among the available columns
+            keys = np.where(available_mask[explore], self.np_rng.random((int(explore.sum()), NUM_ACTIONS)), -1.0)
+            actions[explore] = keys.argmax(axis=1)
+        actions[~available_mask.any(axis=1)] = -1
+        return actions
+
     def _get_heuristic_skill_params(self, skill_key, grid_units):
         """
         Heuristic to determine skill parameters (targets, directions) based on the chosen skill.
-        This part is identical to the original QLearningTableAgent's logic.
+        This part is identical to the original QLearningTableAgent's logic (see targeting.py).
         """
-        player_unit_positions=[]; ads_positions=[]; knights_positions=[]; tanks_positions=[]
-        grid_h = len(grid_units); grid_w = len(grid_units[0]) if grid_h > 0 else 0
-        for r_loop in range(grid_h):
-            for c_loop in range(grid_w):
-                unit = grid_units[r_loop][c_loop]
-                if unit:
-                    player_unit_positions.append((r_loop,c_loop))
-                    if unit.name=="AD": ads_positions.append((r_loop,c_loop))
-                    elif unit.name=="Knight": knights_positions.append((r_loop,c_loop))
-                    elif unit.name=="Tank": tanks_positions.append((r_loop,c_loop))
-        
-        params = {}
-        if skill_key=="normal_attack":
-            target_list_normal = []
-            if ads_positions: target_list_normal = [random.choice(ads_positions)]
-            elif knights_positions: target_list_normal = [random.choice(knights_positions)]
-            elif tanks_positions: target_list_normal = [random.choice(tanks_positions)]
-            elif player_unit_positions: target_list_normal = [random.choice(player_unit_positions)]
-            return target_list_normal
-
-        elif skill_key=="horizontal_shot":
-            best_row,max_targets=-1,-1
-            for r_idx in range(grid_h):
-                count=sum(1 for c_idx in range(grid_w) if grid_units[r_idx][c_idx] and grid_units[r_idx][c_idx].name in ["AD","Knight"])
-                if count>max_targets:max_targets=count;best_row=r_idx
-            
-            params["line_idx"] = best_row if best_row != -1 else (random.randint(0,grid_h-1) if grid_h > 0 else 0)
-            params["direction"] = random.choice(["ltr", "rtl"])
-        
-        elif skill_key=="vertical_shot":
-            best_col,max_targets=-1,-1
-            for c_idx in range(grid_w):
-                count=sum(1 for r_idx in range(grid_h) if grid_units[r_idx][c_idx] and grid_units[r_idx][c_idx].name in ["AD","Knight"])
-                if count>max_targets:max_targets=count;best_col=c_idx
-
-            params["line_idx"] = best_col if best_col != -1 else (random.randint(0,grid_w-1) if grid_w > 0 else 0)
-            params["direction"] = random.choice(["ttb", "btt"])
-
-        elif skill_key=="ultimate":
-            target_list_ulti = []
-            targets_ulti_temp = ads_positions+knights_positions+tanks_positions; random.shuffle(targets_ulti_temp)
-            if len(targets_ulti_temp)<6:
-                empty_cells=[(r_loop,c_loop) for r_loop in range(grid_h) for c_loop in range(grid_w) if grid_units[r_loop][c_loop] is None]
-                random.shuffle(empty_cells); targets_ulti_temp.extend(empty_cells[:6-len(targets_ulti_temp)])
-            target_list_ulti = targets_ulti_temp[:6]
-            return target_list_ulti
-        
-        return params
+        return heuristic_skill_params(skill_key, grid_units, self.rng)
 
     def remember(self, state, action, reward, next_state, done):
         """Stores an experience tuple (S, A, R, S', Done) in the replay buffer."""
-        self.replay_buffer.append((state, action, reward, next_state, done))
+        self.replay_buffer.add(state, action, reward, next_state, done)
 
     def learn(self, current_state_vector, action_idx, reward, next_state_vector, done):
         """
-        Performs a single learning step on the DQN.
-        Samples a batch, computes loss, and updates network weights.
+        Records one environment step and trains on the configured cadence: every learn_every
+        steps, gradient_steps gradient steps on freshly sampled batches. Also decays epsilon
+        and syncs the target network on environment-step counts.
         """
         if action_idx is None or action_idx < 0 or action_idx >= NUM_ACTIONS:
             return
@@ -226,17 +217,80 @@ class DQNAgent:
         if len(self.replay_buffer) < self.batch_size:
             return
 
-        # Sample a batch of experiences from the replay buffer
-        batch = random.sample(self.replay_buffer, self.batch_size)
-        # Unpack the batch into separate tensors
-        states, actions, rewards, next_states, dones = zip(*batch)
+        self.env_steps += 1
+        if self.env_steps % self.learn_every == 0:
+            for _ in range(self.gradient_steps):
+                self._gradient_step()
+
+        # Update target network periodically (every target_update_freq environment steps)
+        if self.env_steps % self.target_update_freq == 0:
+            self.target_net.load_state_dict(self.policy_net.state_dict())
 
-        # Convert unpacked lists to PyTorch tensors and move to device
-        states = torch.tensor(np.array(states), dtype=torch.float32).to(self.device)
-        actions = torch.tensor(list(actions), dtype=torch.long).to(self.device)
-        rewards = torch.tensor(list(rewards), dtype=torch.float32).to(self.device)
-        next_states = torch.tensor(np.array(next_states), dtype=torch.float32).to(self.device)
-        dones = torch.tensor(list(dones), dtype=torch.bool).to(self.device)
+        # Decay epsilon
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+
+    def learn_batch(self, states, actions, rewards, next_states, dones):
+        """
+        learn() for N environment steps at once: the transitions go into replay memory with one
+        vectorized write, then the gradient steps, target syncs and epsilon decay that the N
+        learn() calls would have made run on the grown buffer. Steps taken before the buffer
+        held a batch do not count, as in learn().
+        """
+        actions = np.asarray(actions)
+        valid = (actions >= 0) & (actions < NUM_ACTIONS)
+        if not valid.all():
+            states, actions, rewards, next_states, dones = (np.asarray(field)[valid] for field in
+                                                            (states, actions, rewards, next_states, dones))
+        count = len(actions)
+        if count == 0:
+            return
+        size_before = len(self.replay_buffer)
+        self.replay_buffer.add_batch(states, actions, rewards, next_states, dones)
+        # learn() counts the i-th of these steps (i = 1..count) once the buffer holds a batch
+        counted = max(0, min(count, size_before + count - self.batch_size + 1))
+        start, end = self.env_steps, self.env_steps + counted
+        self.env_steps = end
+
+        synced = start // self.target_update_freq
+        for step in range((start // self.learn_every + 1) * self.learn_every, end + 1, self.learn_every):
+            if (step - 1) // self.target_update_freq > synced: # A sync due before this learn step
+                self.target_net.load_state_dict(self.policy_net.state_dict())
+                synced = (step - 1) // self.target_update_freq
+            for _ in range(self.gradient_steps):
+                self._gradient_step()
+            if step // self.target_update_freq > synced:
+                self.target_net.load_state_dict(self.policy_net.state_dict())
+                synced = step // self.target_update_freq
+        if end // self.target_update_freq > synced:
+            self.target_net.load_state_dict(self.policy_net.state_dict())
+
+        for _ in range(counted):
+            if self.epsilon <= self.epsilon_min:
+                break
+            self.epsilon *= self.epsilon_decay
+
+    def train_offline(self, dataset, num_steps):
+        """
+        num_steps gradient steps on batches sampled from dataset (e.g. a trajectory_store.TrajectoryStore)
+        instead of the replay buffer, syncing the target network every target_update_freq steps.
+        Epsilon and the replay buffer are left as they are.
+        """
+        for _ in range(num_steps):
+            self._gradient_step(dataset)
+            if self.update_count % self.target_update_freq == 0:
+                self.target_net.load_state_dict(self.policy_net.state_dict())
+
+    def _gradient_step(self, dataset=None):
+        """One DQN gradient step on a batch of batch_size transitions sampled from replay (or dataset)."""
+        # Sample a batch of experiences from the replay buffer: one vectorized gather per field
+        prioritized = dataset is None and self.prioritized_replay
+        if prioritized:
+            rows, batch, is_weights = self.replay_buffer.sample(self.batch_size)
+        else:
+            rows, batch = (self.replay_buffer if dataset is None else dataset).sample(self.batch_size)
+        # Wrap the batch arrays as tensors (no copy on CPU) and move to device
+        states, actions, rewards, next_states, dones = (torch.from_numpy(array).to(self.device) for array in batch)
 
         # Calculate current Q values (Q(s, a)) using the policy network
         current_q_values = self.policy_net(states).gather(1, actions.unsqueeze(1)).squeeze(1)
@@ -246,8 +300,13 @@ class DQNAgent:
             next_q_values = self.target_net(next_states).max(1)[0]
             target_q_values = rewards + self.gamma * next_q_values * (~dones)
 
-        # Compute the loss
-        loss = self.criterion(current_q_values, target_q_values)
+        # Compute the loss; prioritized batches weight each squared TD error by its IS weight
+        if prioritized:
+            td_errors = target_q_values - current_q_values
+            loss = (torch.from_numpy(is_weights).to(self.device) * td_errors.pow(2)).mean()
+            self.replay_buffer.update_priorities(rows, td_errors.detach().cpu().numpy())
+        else:
+            loss = self.criterion(current_q_values, target_q_values)
 
         # Perform backpropagation
         self.optimizer.zero_grad()
@@ -255,70 +314,75 @@ class DQNAgent:
         for param in self.policy_net.parameters():
             param.grad.data.clamp_(-1, 1) # Gradient clipping
         self.optimizer.step()
-
-        # Update target network periodically
         self.update_count += 1
-        if self.update_count % self.target_update_freq == 0:
-            self.target_net.load_state_dict(self.policy_net.state_dict())
 
-        # Decay epsilon
-        if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
+    def _checkpoint(self):
+        return {
+            'policy_net_state_dict': self.policy_net.state_dict(),
+            'target_net_state_dict': self.target_net.state_dict(),
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'epsilon': self.epsilon,
+            'update_count': self.update_count,
+            'env_steps': self.env_steps,
+        }
+
+    def _load_checkpoint(self, checkpoint):
+        self.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
+        self.target_net.load_state_dict(checkpoint['target_net_state_dict'])
+        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        self.epsilon = checkpoint['epsilon']
+        self.update_count = checkpoint['update_count']
+        self.env_steps = checkpoint.get('env_steps', self.update_count) # Older checkpoints: one step per update
+
+        self.policy_net.to(self.device)
+        self.target_net.to(self.device)
+        self.target_net.eval()
 
     def load(self, filepath="dqn_boss_agent.pth"):
         """Loads the DQN policy and target network states, optimizer state, and agent parameters."""
         try:
-            checkpoint = torch.load(filepath, map_location=self.device)
-            self.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
-            self.target_net.load_state_dict(checkpoint['target_net_state_dict'])
-            self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-            self.epsilon = checkpoint['epsilon']
-            self.update_count = checkpoint['update_count']
-            
-            self.policy_net.to(self.device)
-            self.target_net.to(self.device)
-            self.target_net.eval()
+            self._load_checkpoint(torch.load(filepath, map_location=self.device))
             print(f"DQN Agent loaded from {filepath}. Epsilon: {self.epsilon:.4f}")
         except FileNotFoundError:
             print(f"No DQN Agent model found at {filepath}. Starting training from scratch or playing with untrained agent.")
         except Exception as e:
             print(f"Error loading DQN Agent: {e}")
 
+    def training_state(self):
+        """
+        Everything save() stores plus the replay memory and the agent's own random streams:
+        what training needs to continue exactly (see training_state.py).
+        """
+        state = self._checkpoint()
+        state['replay_buffer'] = arrays_to_tensors(self.replay_buffer.state_dict())
+        if self.rng is not GLOBAL_RANDOM: # Unseeded agents draw from the global streams (saved by the run)
+            state['rng_state'] = self.rng.getstate()
+            state['np_rng_state'] = self.np_rng.bit_generator.state
+        return state
+
+    def load_training_state(self, state):
+        self._load_checkpoint(state)
+        self.replay_buffer.load_state_dict(tensors_to_arrays(state['replay_buffer']))
+        if 'rng_state' in state:
+            if self.rng is GLOBAL_RANDOM: # Seeded run resumed into an unseeded agent: give it its own streams
+                self.reseed(0)
+            self.rng.setstate(state['rng_state'])
+            self.np_rng.bit_generator.state = state['np_rng_state']
+
+    def export_policy(self, filepath=POLICY_WEIGHTS_FILE):
+        """
+        Writes the policy network's weights to an .npz file for the torch-free
+        policy_inference.NumpyPolicy (arrays named after the state_dict keys, "." -> "_").
+        """
+        weights = {name.replace(".", "_"): tensor.detach().cpu().numpy()
+                   for name, tensor in self.policy_net.state_dict().items()}
+        np.savez(filepath, **weights)
+        print(f"DQN policy weights exported to {filepath}")
+
     def save(self, filepath="dqn_boss_agent.pth"):
-        """Saves the DQN policy and target network states, optimizer state, and agent parameters."""
+        """Saves the DQN policy and target network states, optimizer state, and agent parameters (atomically)."""
         try:
-            torch.save({
-                'policy_net_state_dict': self.policy_net.state_dict(),
-                'target_net_state_dict': self.target_net.state_dict(),
-                'optimizer_state_dict': self.optimizer.state_dict(),
-                'epsilon': self.epsilon,
-                'update_count': self.update_count,
-            }, filepath)
+            atomic_save(self._checkpoint(), filepath)
             print(f"DQN Agent saved to {filepath}")
         except Exception as e:
             print(f"Error saving DQN Agent: {e}")
-
-def get_game_state_for_q_table(game_logic_instance):
-    boss=game_logic_instance.boss
-    grid=game_logic_instance.grid_units
-    
-    state_dict={}
-    state_dict["boss_hp"]=boss.current_hp
-    state_dict["boss_max_hp"]=boss.max_hp
-    state_dict["boss_rage"]=boss.current_rage
-    state_dict["skill_cooldowns"]={
-        "horizontal_shot":boss.skills["horizontal_shot"]["cd_timer"],
-        "vertical_shot":boss.skills["vertical_shot"]["cd_timer"],
-        "heal":boss.skills["heal"]["cd_timer"],
-    }
-    
-    unit_counts={"Tank":0,"Knight":0,"AD":0}
-    for r_loop in range(game_logic_instance.grid_size):
-        for c_loop in range(game_logic_instance.grid_size):
-            unit=grid[r_loop][c_loop]
-            if unit and unit.name in unit_counts:
-                unit_counts[unit.name]+=1
-    state_dict["unit_counts"]=unit_counts
-    
-    state_dict["current_round"]=game_logic_instance.current_round
-    return state_dict
\ No newline at end of file
@@ -0,0 +1,27 @@
+# atomic_file.py
+"""
+Atomic file replacement (torch-free).
+
+replace_file writes a file under a temporary name next to it, fsyncs it and renames it over
+the target with os.replace, so readers and a run interrupted mid-write only ever see the old
+or the new complete file. Every writer (process and thread) gets its own temporary name.
+"""
+import os
+import threading
+
+
+def replace_file(data_writer, filepath):
+    """Writes a file through data_writer(binary file) into a temporary name, then renames it over filepath."""
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    # Created like open() would create it: mode 0666 minus the umask, applied by the kernel
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            data_writer(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
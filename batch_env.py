@@ -0,0 +1,437 @@
+# batch_env.py
+"""
+Vectorized batch environment: N independent games stored as NumPy arrays.
+
+Each game is the same Tactics Grid game as GameLogic (same board-size scaling), but boards, boss HP, rage,
+cooldowns, stock and round counters live in (N, ...) arrays and every phase (placement,
+player damage, normal attack, line shots with the Tank charge-absorb rule, ultimate, heal,
+round advance) is resolved for all games with array ops. Rewards follow the same formulas
+as GameLogic.process_player_attack / process_boss_attack.
+
+Cells are flattened row-major: cell = r * grid_size + c.
+"""
+import numpy as np
+
+from units import (PLAYER_UNIT_SPECS, EMPTY, UNIT_TYPE_CODES, UNIT_CODE_NAMES,
+                   UNIT_CODE_MAX_HP, UNIT_CODE_ATTACK, UNIT_CODE_KILL_REWARD, CELL_STATES, CELL_STATE_DECODE)
+from boss import Boss
+from line_tables import line_shot_table, CELL_STATE_OF
+from scaling import check_grid_size, scaled, BASE_UNITS_ROUND_1, BASE_UNITS_LATER_ROUNDS
+from seeding import numpy_rng
+from state_encoding import (OBS_DIM, _RAGE_DIV, _CD_HSHOT_DIV, _CD_VSHOT_DIV, _CD_HEAL_DIV, _TANK_DIV, _KNIGHT_DIV,
+                            _AD_DIV, _ROUND_DIV)
+
+# --- Unit type codes (0 = empty cell), shared with board.Board ---
+TANK, KNIGHT, AD = UNIT_TYPE_CODES["Tank"], UNIT_TYPE_CODES["Knight"], UNIT_TYPE_CODES["AD"]
+UNIT_TYPE_NAMES = UNIT_CODE_NAMES[1:] # Index = code - 1, also the stock column order
+UNIT_MAX_HP = np.array(UNIT_CODE_MAX_HP, dtype=np.int8)
+UNIT_ATTACK = np.array(UNIT_CODE_ATTACK, dtype=np.int16)
+KILL_REWARD = np.array(UNIT_CODE_KILL_REWARD, dtype=np.float32)
+
+# --- Boss skill indices (same order as agent.ACTION_MAP_AGENT) ---
+NORMAL_ATTACK, HORIZONTAL_SHOT, VERTICAL_SHOT, HEAL, ULTIMATE = 0, 1, 2, 3, 4
+SKILL_KEYS = ["normal_attack", "horizontal_shot", "vertical_shot", "heal", "ultimate"]
+COOLDOWN_SKILLS = ["horizontal_shot", "vertical_shot", "heal"] # Column order of the cooldown array
+
+# Cell state <-> (type code, HP) lookups for the line-shot tables
+CELL_STATE = np.array(CELL_STATE_OF, dtype=np.int64).reshape(len(UNIT_CODE_NAMES), 256) # [code, hp]
+CELL_STATE_TYPE = np.array([code for code, _hp in CELL_STATE_DECODE], dtype=np.int8)
+CELL_STATE_HP = np.array([hp for _code, hp in CELL_STATE_DECODE], dtype=np.int8)
+
+
+class VectorizedBossEnv:
+    """
+    N games stepped together. The per-game flow matches headless_training.BossAssaultEnv:
+    reset() plays the first player phase, step() runs the boss turn, advances the round and
+    plays the next player phase for games that continue.
+    """
+    def __init__(self, num_envs, grid_size=4, max_rounds=9, seed=None):
+        self.num_envs = num_envs
+        self.grid_size = check_grid_size(grid_size)
+        self.num_cells = grid_size * grid_size
+        self.max_rounds = max_rounds
+        self.rng = numpy_rng(seed) # seed: int, SeedSequence (e.g. seeding.spawn) or None
+
+        boss = Boss(grid_size=grid_size) # HP, heal and skill reach scaled like GameLogic's
+        self.boss_max_hp = boss.max_hp
+        self.boss_max_rage = boss.max_rage
+        self.skill_cd = np.array([boss.skills[k]["cd"] for k in COOLDOWN_SKILLS], dtype=np.int8)
+        self.heal_amount = boss.skills["heal"]["heal_amount"]
+        self.ultimate_rage_cost = boss.skills["ultimate"]["rage_cost"]
+        self.ultimate_damage = boss.skills["ultimate"]["damage"]
+        self.ultimate_targets = boss.skills["ultimate"]["targets"]
+        self.shot_charges = boss.skills["horizontal_shot"]["charges"]
+        self.max_stock = np.array([scaled(PLAYER_UNIT_SPECS[name]["max_accumulation"], grid_size)
+                                   for name in UNIT_TYPE_NAMES], dtype=np.int16)
+        self.stock_regeneration = scaled(1, grid_size)
+        self.max_units_to_place_round_1 = scaled(BASE_UNITS_ROUND_1, grid_size)
+        self.max_units_to_place_later_rounds = scaled(BASE_UNITS_LATER_ROUNDS, grid_size)
+
+        n, cells = num_envs, self.num_cells
+        self.unit_type = np.zeros((n, cells), dtype=np.int8)
+        self.unit_hp = np.zeros((n, cells), dtype=np.int8)
+        self.boss_hp = np.zeros(n, dtype=np.int16)
+        self.rage = np.zeros(n, dtype=np.int8)
+        self.cooldowns = np.zeros((n, len(COOLDOWN_SKILLS)), dtype=np.int8)
+        self.stock = np.zeros((n, len(UNIT_TYPE_NAMES)), dtype=np.int16) # int16: scaled stocks exceed int8
+        self.round = np.zeros(n, dtype=np.int16)
+        self.placed_this_round = np.zeros(n, dtype=np.int16)
+        self.destroyed_this_round = np.zeros(n, dtype=np.int16)
+        self.episode_over = np.ones(n, dtype=bool)
+        self.boss_won = np.zeros(n, dtype=bool)
+        self.episode_reward = np.zeros(n, dtype=np.float32)
+
+        # line_cells[axis, line, reverse, k]: k-th cell hit by a shot (axis 0 = row, 1 = column)
+        g = grid_size
+        idx = np.arange(g)
+        rows = idx[:, None] * g + idx[None, :]   # rows[line, k]
+        cols = idx[None, :] * g + idx[:, None]   # cols[line, k]
+        self.line_cells = np.stack([np.stack([rows, rows[:, ::-1]], axis=1),
+                                    np.stack([cols, cols[:, ::-1]], axis=1)])
+        self._arange = np.arange(n)
+        # Line shots resolve in one table lookup per game (None on boards too large to tabulate)
+        self.line_table = line_shot_table(grid_size, self.shot_charges, 1)
+        self._line_powers = CELL_STATES ** np.arange(grid_size, dtype=np.int64)
+
+    # --- Helpers ---
+    def _mask(self, mask):
+        if mask is None:
+            return np.ones(self.num_envs, dtype=bool)
+        return np.asarray(mask, dtype=bool)
+
+    def occupied(self):
+        return self.unit_type != EMPTY
+
+    def unit_counts(self):
+        """(N, 3) counts of Tank, Knight, AD on each board."""
+        return np.stack([(self.unit_type == code).sum(axis=1) for code in (TANK, KNIGHT, AD)], axis=1)
+
+    def placement_limit(self):
+        return np.where(self.round == 1, self.max_units_to_place_round_1, self.max_units_to_place_later_rounds)
+
+    def available_skills(self):
+        """(N, 5) bool mask, same rule as Boss.get_available_skills_keys."""
+        avail = np.ones((self.num_envs, len(SKILL_KEYS)), dtype=bool)
+        avail[:, HORIZONTAL_SHOT] = self.cooldowns[:, 0] == 0
+        avail[:, VERTICAL_SHOT] = self.cooldowns[:, 1] == 0
+        avail[:, HEAL] = self.cooldowns[:, 2] == 0
+        avail[:, ULTIMATE] = self.rage >= self.ultimate_rage_cost
+        return avail
+
+    def observe(self, out=None):
+        """(N, 9) float32 observations, identical to DQNAgent._discretize_state per game."""
+        if out is None:
+            out = np.empty((self.num_envs, OBS_DIM), dtype=np.float32)
+        counts = self.unit_counts()
+        out[:, 0] = self.boss_hp / self.boss_max_hp
+        # Same divisors as state_encoding.ObservationWriter
+        out[:, 1] = self.rage / _RAGE_DIV
+        out[:, 2] = self.cooldowns[:, 0] / _CD_HSHOT_DIV
+        out[:, 3] = self.cooldowns[:, 1] / _CD_VSHOT_DIV
+        out[:, 4] = self.cooldowns[:, 2] / _CD_HEAL_DIV
+        out[:, 5] = counts[:, 0] / _TANK_DIV
+        out[:, 6] = counts[:, 1] / _KNIGHT_DIV
+        out[:, 7] = counts[:, 2] / _AD_DIV
+        out[:, 8] = np.maximum(0, self.round - 1) / _ROUND_DIV
+        return out
+
+    def _random_pick(self, valid):
+        """Uniform random column among True entries of each row of valid; -1 for empty rows."""
+        keys = np.where(valid, self.rng.random(valid.shape), -1.0)
+        picked = keys.argmax(axis=1)
+        return np.where(valid.any(axis=1), picked, -1)
+
+    # --- Episode / round flow ---
+    def reset(self, mask=None):
+        """Starts new games for rows in mask and plays their first player phase."""
+        m = self._mask(mask)
+        self.unit_type[m] = EMPTY
+        self.unit_hp[m] = 0
+        self.boss_hp[m] = self.boss_max_hp
+        self.rage[m] = 0
+        self.cooldowns[m] = 0
+        self.stock[m] = self.max_stock
+        self.round[m] = 0
+        self.episode_over[m] = False
+        self.boss_won[m] = False
+        self.episode_reward[m] = 0
+        self._setup_new_round(m)
+        self.episode_reward += self._run_player_phase(m)
+        return self.observe()
+
+    def _setup_new_round(self, m):
+        self.round[m] += 1
+        self.placed_this_round[m] = 0
+        self.destroyed_this_round[m] = 0
+        cd = self.cooldowns[m]
+        self.cooldowns[m] = np.where(cd > 0, cd - 1, cd)
+        regen = m & (self.round > 1)
+        self.stock[regen] = np.minimum(self.stock[regen] + self.stock_regeneration, self.max_stock)
+
+    def _finish(self, m):
+        self.episode_over |= m
+        self.boss_won[m] = self.boss_hp[m] > 0
+
+    def advance_round(self, mask=None):
+        """
+        proceed_to_next_round for rows in mask, plus the round-start game over check used by
+        run_training_loop. Returns the rows whose episode ended.
+        """
+        m = self._mask(mask) & ~self.episode_over
+        ended = m & (((self.round >= self.max_rounds) & (self.boss_hp > 0)) | (self.boss_hp <= 0))
+        cont = m & ~ended
+        self._setup_new_round(cont)
+        ended |= cont & (self.round >= self.max_rounds) & (self.boss_hp > 0)
+        self._finish(ended)
+        return ended
+
+    # --- Player side ---
+    def place(self, cells, unit_codes, mask=None):
+        """
+        One placement per game: unit_codes[i] (1..3) at cells[i] for rows in mask.
+        Applies the same checks as GameLogic.place_unit_from_stock. Returns success mask.
+        """
+        m = self._mask(mask) & ~self.episode_over
+        cells = np.asarray(cells)
+        unit_codes = np.asarray(unit_codes)
+        safe_cells = np.clip(cells, 0, self.num_cells - 1)
+        safe_codes = np.clip(unit_codes, 1, 3)
+        ok = (m & (cells >= 0) & (cells < self.num_cells) & (unit_codes >= 1) & (unit_codes <= 3)
+              & (self.placed_this_round < self.placement_limit())
+              & (self.stock[self._arange, safe_codes - 1] > 0)
+              & (self.unit_type[self._arange, safe_cells] == EMPTY))
+        rows = self._arange[ok]
+        self.unit_type[rows, safe_cells[ok]] = safe_codes[ok]
+        self.unit_hp[rows, safe_cells[ok]] = UNIT_MAX_HP[safe_codes[ok]]
+        self.stock[rows, safe_codes[ok] - 1] -= 1
+        self.placed_this_round[ok] += 1
+        return ok
+
+    def place_random(self, mask=None):
+        """
+        Vectorized RandomPlacementPlayer: each slot picks a uniformly random unit type with
+        stock left and a uniformly random empty cell.
+        """
+        m = self._mask(mask) & ~self.episode_over
+        for _ in range(self.max_units_to_place_round_1):
+            can = m & (self.placed_this_round < self.placement_limit())
+            if not can.any():
+                break
+            codes = self._random_pick(self.stock > 0) + 1
+            cells = self._random_pick(~self.occupied())
+            self.place(cells, codes, can & (codes > 0) & (cells >= 0))
+
+    def player_attack(self, mask=None):
+        """process_player_attack for rows in mask. Returns (damage, reward, done)."""
+        m = self._mask(mask) & ~self.episode_over
+        damage = np.where(m, UNIT_ATTACK[self.unit_type].sum(axis=1), 0)
+        self.boss_hp = np.where(m, np.maximum(self.boss_hp - damage, 0), self.boss_hp).astype(np.int16)
+        reward = -damage.astype(np.float32)
+        died = m & (damage > 0) & (self.boss_hp <= 0)
+        reward[died] -= 100
+        self._finish(died)
+        return damage, reward, died
+
+    def _run_player_phase(self, m):
+        self.place_random(m)
+        _damage, reward, _done = self.player_attack(m)
+        return reward
+
+    # --- Boss side ---
+    def heuristic_targets(self, skills):
+        """
+        Vectorized DQNAgent._get_heuristic_skill_params. Returns a targets dict:
+            cell      (N,)  normal attack target, -1 when the board is empty
+            line      (N,)  row / column index for line shots
+            reverse   (N,)  True for "rtl" / "btt"
+            ultimate  (N, cells) bool, up to ultimate_targets unique target cells
+        """
+        skills = np.asarray(skills)
+        ut = self.unit_type
+        occupied = ut != EMPTY
+        g = self.grid_size
+        # Normal attack: random AD, else Knight, else Tank
+        priority = np.where(occupied, ut.astype(np.float64), -np.inf) # AD=3 > Knight=2 > Tank=1
+        cell = np.where(occupied.any(axis=1), (priority + self.rng.random(ut.shape)).argmax(axis=1), -1)
+        # Line shots: first line with the most AD/Knight units
+        soft = ((ut == AD) | (ut == KNIGHT)).reshape(self.num_envs, g, g)
+        best_row = soft.sum(axis=2).argmax(axis=1)
+        best_col = soft.sum(axis=1).argmax(axis=1)
+        line = np.where(skills == VERTICAL_SHOT, best_col, best_row)
+        reverse = self.rng.random(self.num_envs) < 0.5
+        # Ultimate: all units in random order first, then random empty cells, capped at ultimate_targets
+        keys = self.rng.random(ut.shape) + occupied
+        order = np.argsort(-keys, axis=1)[:, :self.ultimate_targets]
+        ultimate = np.zeros(ut.shape, dtype=bool)
+        ultimate[self._arange[:, None], order] = True
+        return {"cell": cell, "line": line, "reverse": reverse, "ultimate": ultimate}
+
+    def _damage_cells(self, rows, cells, amount, reward, destroyed):
+        """Hits (rows[i], cells[i]) for amount; non-lethal hits give 1.5/damage, kills the kill reward."""
+        hp = self.unit_hp[rows, cells] - amount
+        codes = self.unit_type[rows, cells]
+        killed = hp <= 0
+        np.add.at(reward, rows, np.where(killed, KILL_REWARD[codes], amount * 1.5))
+        np.add.at(destroyed, rows, killed.astype(np.int8))
+        self.unit_hp[rows, cells] = np.maximum(hp, 0)
+        self.unit_type[rows[killed], cells[killed]] = EMPTY
+
+    def _line_shot_from_table(self, shot, cells_in_line, reward, destroyed):
+        """Resolves the line shots of the games in shot with one line_tables lookup each."""
+        rows = self._arange[shot]
+        cells = cells_in_line[shot]
+        states = CELL_STATE[self.unit_type[rows[:, None], cells], self.unit_hp[rows[:, None], cells]]
+        pattern = states @ self._line_powers
+        table = self.line_table
+        after = table.states_after[pattern]
+        self.unit_type[rows[:, None], cells] = CELL_STATE_TYPE[after]
+        self.unit_hp[rows[:, None], cells] = CELL_STATE_HP[after]
+        reward[rows] += table.reward[pattern]
+        destroyed[rows] += table.kills[pattern]
+
+    def _line_shot_by_charge(self, shot, cells_in_line, reward, destroyed):
+        """Charge-by-charge line shots: a Tank absorbs charges until it dies or they run out."""
+        charges = np.where(shot, self.shot_charges, 0)
+        hit_any = np.zeros(self.num_envs, dtype=bool)
+        for k in range(self.grid_size):
+            c = cells_in_line[:, k]
+            code = self.unit_type[self._arange, c]
+            hit = (charges > 0) & (code != EMPTY)
+            hit_any |= hit
+            tank = hit & (code == TANK)
+            other = hit & ~tank
+            # Tank: takes min(charges, hp) hits, +1.5 each; if it survives the shot stops there
+            hp = self.unit_hp[self._arange, c]
+            n_hits = np.where(tank, np.minimum(charges, hp), 0)
+            reward += n_hits * 1.5
+            tank_dead = tank & (n_hits >= hp)
+            reward[tank_dead] += KILL_REWARD[TANK]
+            charges = np.where(tank, np.where(tank_dead, charges - n_hits, 0), charges)
+            self.unit_hp[self._arange[tank], c[tank]] = (hp - n_hits)[tank]
+            self.unit_type[self._arange[tank_dead], c[tank_dead]] = EMPTY
+            destroyed += tank_dead
+            # Other units: one charge each
+            rows = self._arange[other]
+            self._damage_cells(rows, c[other], 1, reward, destroyed)
+            charges = np.where(other, charges - 1, charges)
+        reward[shot & ~hit_any] -= 3
+
+    def boss_attack(self, skills, targets=None, mask=None):
+        """
+        process_boss_attack for rows in mask with explicit skill indices (N,).
+        targets defaults to heuristic_targets(skills). Returns (reward, done) where done is the
+        transition done flag process_boss_attack would report.
+        """
+        m = self._mask(mask) & ~self.episode_over
+        skills = np.asarray(skills)
+        if targets is None:
+            targets = self.heuristic_targets(skills)
+        reward = np.zeros(self.num_envs, dtype=np.float32)
+        done = np.zeros(self.num_envs, dtype=bool)
+        self.destroyed_this_round[m] = 0
+
+        # Unavailable skill: the boss does nothing (no reward), as when the agent returns no skill
+        skill_ok = self.available_skills()[self._arange, np.clip(skills, 0, len(SKILL_KEYS) - 1)] & (skills >= 0) & (skills < len(SKILL_KEYS))
+        idle = m & ~skill_ok
+        idle_done = idle & (((self.round >= self.max_rounds) & (self.boss_hp > 0)) | (self.boss_hp <= 0))
+        reward[idle_done & (self.boss_hp > 0)] += 150
+        done |= idle_done
+
+        act = m & skill_ok
+        # Skill effects and cooldowns (Boss.apply_skill_effect_and_cd)
+        heal = act & (skills == HEAL)
+        ult = act & (skills == ULTIMATE)
+        gains = act & ~heal & ~ult
+        self.boss_hp[heal] = np.minimum(self.boss_hp[heal] + self.heal_amount, self.boss_max_hp)
+        self.rage[ult] -= self.ultimate_rage_cost
+        self.rage[gains] = np.minimum(self.rage[gains] + 1, self.boss_max_rage)
+        for col, skill in enumerate((HORIZONTAL_SHOT, VERTICAL_SHOT, HEAL)):
+            self.cooldowns[act & (skills == skill), col] = self.skill_cd[col]
+
+        destroyed = self.destroyed_this_round
+
+        # Normal attack
+        na = act & (skills == NORMAL_ATTACK)
+        cell = np.asarray(targets["cell"])
+        safe_cell = np.clip(cell, 0, self.num_cells - 1)
+        na_hit = na & (cell >= 0) & (cell < self.num_cells) & (self.unit_type[self._arange, safe_cell] != EMPTY)
+        reward[na & ~na_hit] -= 2
+        rows = self._arange[na_hit]
+        self._damage_cells(rows, safe_cell[na_hit], 1, reward, destroyed)
+
+        # Line shots: charges travel along the line; a Tank absorbs charges until it dies or they run out
+        shot = act & ((skills == HORIZONTAL_SHOT) | (skills == VERTICAL_SHOT))
+        if shot.any():
+            axis = (skills == VERTICAL_SHOT).astype(np.intp)
+            line = np.clip(np.asarray(targets["line"]), 0, self.grid_size - 1)
+            reverse = np.asarray(targets["reverse"]).astype(np.intp)
+            cells_in_line = self.line_cells[axis, line, reverse] # (N, grid_size)
+            if self.line_table is not None:
+                self._line_shot_from_table(shot, cells_in_line, reward, destroyed)
+            else:
+                self._line_shot_by_charge(shot, cells_in_line, reward, destroyed)
+
+        # Ultimate: every unique target cell takes 2 damage, empty cells are wasted
+        if ult.any():
+            ult_cells = np.asarray(targets["ultimate"], dtype=bool) & ult[:, None]
+            hit_cells = ult_cells & (self.unit_type != EMPTY)
+            units_hit = hit_cells.sum(axis=1)
+            rows, cells = np.nonzero(hit_cells)
+            self._damage_cells(rows, cells, self.ultimate_damage, reward, destroyed)
+            reward[ult & (units_hit == 0) & (ult_cells.sum(axis=1) > 0)] -= 5
+            multi = ult & (units_hit > 2)
+            reward[multi] += units_hit[multi] * 2
+
+        # Heal reward is judged on HP after healing
+        hp_after = self.boss_hp
+        heal_reward = np.select([hp_after < self.boss_max_hp * 0.3, hp_after < self.boss_max_hp * 0.6,
+                                 hp_after > self.boss_max_hp * 0.9], [10, 5, -5], 1)
+        reward[heal] += heal_reward[heal]
+
+        # End of boss turn: wipe bonus, round-limit bonus or survival bonus
+        wiped = act & ~self.occupied().any(axis=1) & (destroyed > 0)
+        reward[wiped] += 150
+        done |= wiped
+        rest = act & ~wiped
+        reward[rest & (self.round >= self.max_rounds) & (self.boss_hp > 0)] += 150
+        reward[rest & (self.round < self.max_rounds) & (self.boss_hp > 0)] += 2
+        self._finish(done)
+        return reward, done
+
+    def random_available_actions(self):
+        """Uniform random available skill index per game."""
+        return self._random_pick(self.available_skills())
+
+    def step(self, skills, targets=None):
+        """
+        Boss turn for every running game, then round advance and the next player phase.
+        Returns (obs_after_boss, reward, done, info) like BossAssaultEnv.step, batched;
+        info["acted"] marks the games that took a boss turn and info["obs"] holds the
+        observations for the next decision.
+        """
+        acted = ~self.episode_over
+        reward, done = self.boss_attack(skills, targets, acted)
+        obs_after_boss = self.observe()
+        self.episode_reward += np.where(acted, reward, 0)
+        cont = acted & ~done
+        self.advance_round(cont)
+        cont &= ~self.episode_over
+        player_reward = np.where(cont, self._run_player_phase(cont), 0)
+        self.episode_reward += player_reward
+        info = {"acted": acted, "player_reward": player_reward, "obs": self.observe()}
+        return obs_after_boss, reward, done, info
+
+    # --- Interop with the scalar engine ---
+    def copy_from_game(self, row, game):
+        """Loads the state of a GameLogic instance into game slot `row`."""
+        self.unit_type[row] = np.frombuffer(game.board.types, dtype=np.int8)
+        self.unit_hp[row] = np.frombuffer(game.board.hp, dtype=np.int8)
+        boss = game.boss
+        self.boss_hp[row] = boss.current_hp
+        self.rage[row] = boss.current_rage
+        self.cooldowns[row] = [boss.skills[k]["cd_timer"] for k in COOLDOWN_SKILLS]
+        self.stock[row] = [game.player_current_accumulation.get(name, 0) for name in UNIT_TYPE_NAMES]
+        self.round[row] = game.current_round
+        self.placed_this_round[row] = game.units_placed_this_round_count
+        self.destroyed_this_round[row] = game.units_destroyed_this_round_by_boss
+        self.episode_over[row] = game.game_phase == "GAME_OVER"
@@ -0,0 +1,669 @@
+# benchmark.py
+"""
+Micro-benchmarks for the simulation and training paths.
+
+    python benchmark.py training --episodes 500
+        Episodes/sec of headless_training vs the window-driven main.run_training_loop.
+        The window loop needs PyQt5; on a machine without a display run it with
+        QT_QPA_PLATFORM=offscreen.
+
+    python benchmark.py batch --envs 4096 --episodes 100000
+        Episodes/sec of batch_env.VectorizedBossEnv vs the scalar BossAssaultEnv, both with
+        uniformly random available skills and heuristic targeting (no learning).
+
+    python benchmark.py parity --games 3000
+        Rule check of batch_env.VectorizedBossEnv against GameLogic: every player attack and
+        boss turn of seeded games is resolved by both engines from the same state (same skill
+        and targets); reward, done, board, boss HP, rage and cooldowns must match. Exits with
+        status 1 on a mismatch.
+
+    python benchmark.py encode --calls 200000
+        Microseconds per observation: dict + _discretize_state vs ObservationWriter.
+
+    python benchmark.py snapshot --calls 20000
+        Microseconds per branch of a mid-game GameLogic: copy.deepcopy vs snapshot/restore
+        and push_undo/undo.
+
+    python benchmark.py lineshot --calls 100000
+        Microseconds per line-shot resolution: charge-by-charge vs line_tables lookup.
+
+    python benchmark.py replay --calls 5000
+        Microseconds per replay batch (sample + tensors) and per DQNAgent.learn step with a full
+        buffer: deque of tuples vs the replay.ReplayBuffer ring buffer, and the prioritized
+        (sum-tree) buffer.
+
+    python benchmark.py storage --episodes 300 --capacity 10000000
+        Bytes per stored transition, buffer size at --capacity and add / batch cost of the
+        float32, uint8 and bit-packed replay storage modes (DQNAgent replay_storage).
+
+    python benchmark.py cadence --episodes 2000 --cadences 1x1x64 4x1x256 8x2x256
+        Episodes/sec and samples trained per boss decision of headless training at each
+        learn-every x gradient-steps x batch-size cadence (see DQNAgent learn_every).
+
+    python benchmark.py learner --actors 1 2 4 8
+        Transitions/sec one actor_learner actor produces, and transitions/sec the learner takes
+        in at the default cadence for each actor count (learn_every = LEARN_EVERY_PER_ACTOR x
+        actors, LEARNER_BATCH_SIZE samples), with DQNAgent.learn_batch and with per-row learn().
+
+    python benchmark.py select --rows 1024 --calls 200
+        Microseconds per boss decision: DQNAgent.choose_action one state at a time vs
+        choose_actions over a batch of rows (one forward pass, vectorized masking).
+
+    python benchmark.py scaling --sizes 4 16 64 256
+        Microseconds per environment step (boss turn + player phase) and per snapshot/restore
+        against board size, with the fallback boss and random placement player.
+
+    python benchmark.py mcts --episodes 100 --budget-ms 5 20
+        Boss win rate, mean episode reward and ms/decision of MCTSBoss at each time budget,
+        against the random-skill baseline (random placement player).
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+
+def _seed_everything(seed):
+    import numpy as np
+    import torch
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def bench_headless_training(num_episodes, seed=0):
+    from agent import DQNAgent
+    from headless_training import run_headless_training
+    _seed_everything(seed)
+    agent = DQNAgent()
+    start = time.perf_counter()
+    run_headless_training(agent, num_episodes, stats_file=None, save_every=0,
+                          final_model_file=None, verbose=False)
+    return num_episodes / (time.perf_counter() - start)
+
+
+def bench_window_training(num_episodes, seed=0):
+    """Runs main.run_training_loop against a real (possibly offscreen) TacticsGridWindow."""
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    import main as gui
+    from agent import DQNAgent
+    _seed_everything(seed)
+    app = QApplication.instance() or QApplication(sys.argv)
+    agent = DQNAgent()
+    window = gui.TacticsGridWindow(agent_to_use=agent)
+    window.show()
+
+    # Keep the benchmark from touching the real Model/ directory
+    saved_paths = gui.TRAINING_STATS_FILE, gui.AGENT_MODEL_FILE, gui.NUM_EPISODES_TO_TRAIN, gui.TRAIN_MODE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        gui.TRAINING_STATS_FILE = os.path.join(tmp_dir, "stats.csv")
+        gui.AGENT_MODEL_FILE = os.path.join(tmp_dir, "agent.pth")
+        gui.NUM_EPISODES_TO_TRAIN = num_episodes
+        gui.TRAIN_MODE = True
+        try:
+            start = time.perf_counter()
+            gui.run_training_loop(window, agent, num_episodes)
+            elapsed = time.perf_counter() - start
+        finally:
+            gui.TRAINING_STATS_FILE, gui.AGENT_MODEL_FILE, gui.NUM_EPISODES_TO_TRAIN, gui.TRAIN_MODE = saved_paths
+            window.close()
+    app.processEvents()
+    return num_episodes / elapsed
+
+
+def cmd_training(args):
+    headless_eps = bench_headless_training(args.episodes, args.seed)
+    print(f"headless_training      : {headless_eps:8.1f} episodes/sec")
+    if args.skip_window:
+        return
+    window_eps = bench_window_training(args.episodes, args.seed)
+    if window_eps is None:
+        print("window run_training_loop: skipped (PyQt5 not installed)")
+        return
+    print(f"window run_training_loop: {window_eps:8.1f} episodes/sec")
+    print(f"speedup                : {headless_eps / window_eps:8.2f}x")
+
+
+def bench_scalar_env(num_episodes, seed=0):
+    from headless_training import BossAssaultEnv
+    from agent import DQNAgent, ACTION_MAP_AGENT
+    _seed_everything(seed)
+    agent = DQNAgent()
+    env = BossAssaultEnv(agent=agent)
+    boss_wins = 0
+    start = time.perf_counter()
+    for _ in range(num_episodes):
+        env.reset()
+        while not env.done:
+            available_keys = env.game.boss.get_available_skills_keys()
+            env.step(random.choice([idx for idx, key in ACTION_MAP_AGENT.items() if key in available_keys]))
+        boss_wins += env.boss_won
+    return num_episodes / (time.perf_counter() - start), boss_wins / num_episodes
+
+
+def bench_batch_env(num_envs, num_episodes, seed=0):
+    import numpy as np
+    from batch_env import VectorizedBossEnv
+    env = VectorizedBossEnv(num_envs, seed=seed)
+    # Every game slot plays the same number of episodes; stopping at a global episode count
+    # instead would over-sample whichever outcome finishes in the last synchronized wave.
+    quota = np.full(num_envs, max(1, num_episodes // num_envs))
+    finished = 0
+    boss_wins = 0
+    start = time.perf_counter()
+    env.reset()
+    while not env.episode_over.all():
+        env.step(env.random_available_actions())
+        over = env.episode_over & (quota > 0)
+        finished += int(over.sum())
+        boss_wins += int(env.boss_won[over].sum())
+        quota[over] -= 1
+        env.reset(over & (quota > 0))
+    return finished / (time.perf_counter() - start), boss_wins / finished
+
+
+def cmd_batch(args):
+    scalar_eps, scalar_wr = bench_scalar_env(args.scalar_episodes, args.seed)
+    print(f"scalar BossAssaultEnv  : {scalar_eps:10.1f} episodes/sec (boss win rate {scalar_wr:.3f})")
+    batch_eps, batch_wr = bench_batch_env(args.envs, args.episodes, args.seed)
+    print(f"VectorizedBossEnv x{args.envs:<5}: {batch_eps:10.1f} episodes/sec (boss win rate {batch_wr:.3f})")
+    print(f"speedup                : {batch_eps / scalar_eps:10.1f}x")
+
+
+def _boss_params(skill_key, targets, grid_size):
+    """process_boss_attack params of game slot 0 of VectorizedBossEnv.heuristic_targets."""
+    import numpy as np
+    if skill_key == "normal_attack":
+        cell = int(targets["cell"][0])
+        return [divmod(cell, grid_size)] if cell >= 0 else []
+    if skill_key in ("horizontal_shot", "vertical_shot"):
+        reverse = bool(targets["reverse"][0])
+        direction = ("rtl" if reverse else "ltr") if skill_key == "horizontal_shot" else ("btt" if reverse else "ttb")
+        return {"line_idx": int(targets["line"][0]), "direction": direction}
+    if skill_key == "ultimate":
+        return [divmod(int(cell), grid_size) for cell in np.flatnonzero(targets["ultimate"][0])]
+    return {}
+
+
+def _parity_diffs(batch, game, reward, done, batch_reward, batch_done):
+    """Names of the results and state fields where game slot 0 of batch differs from game."""
+    import numpy as np
+    from batch_env import COOLDOWN_SKILLS
+    types = np.frombuffer(game.board.types, dtype=np.int8)
+    hp = np.where(types != 0, np.frombuffer(game.board.hp, dtype=np.int8), 0)
+    boss = game.boss
+    fields = {"reward": abs(float(batch_reward[0]) - reward) > 1e-4,
+              "done": bool(batch_done[0]) != bool(done),
+              "board types": not np.array_equal(batch.unit_type[0], types),
+              "board HP": not np.array_equal(np.where(batch.unit_type[0] != 0, batch.unit_hp[0], 0), hp),
+              "boss HP": int(batch.boss_hp[0]) != boss.current_hp,
+              "rage": int(batch.rage[0]) != boss.current_rage,
+              "cooldowns": batch.cooldowns[0].tolist() != [boss.skills[key]["cd_timer"] for key in COOLDOWN_SKILLS]}
+    return [name for name, differs in fields.items() if differs]
+
+
+def check_batch_parity(num_games, seed=0, grid_size=4):
+    """
+    Plays seeded GameLogic games (random placement player, random available skill) and resolves
+    every player attack and boss turn a second time in a one-game VectorizedBossEnv loaded from
+    the same state, the boss turn with the same skill and targets (process_boss_attack with
+    forced_action). Returns (boss decisions, player attacks, [mismatch descriptions]).
+    """
+    import numpy as np
+    from game_logic import GameLogic
+    from headless_training import RandomPlacementPlayer
+    from batch_env import VectorizedBossEnv, SKILL_KEYS
+    game = GameLogic(grid_size=grid_size, state_dicts=False, action_log=False, seed=seed)
+    batch = VectorizedBossEnv(1, grid_size=grid_size, seed=seed)
+    player = RandomPlacementPlayer()
+    decisions, attacks, mismatches = 0, 0, []
+    for episode in range(num_games):
+        game.start_new_game()
+        while True:
+            player.place_units(game)
+            batch.copy_from_game(0, game)
+            _status, _msg, _damage, _state, reward, done = game.end_placement_phase()
+            _batch_damage, batch_reward, batch_done = batch.player_attack()
+            attacks += 1
+            diffs = _parity_diffs(batch, game, reward, done, batch_reward, batch_done)
+            if diffs:
+                mismatches.append(f"game {episode} round {game.current_round} player attack: {', '.join(diffs)}")
+            if done:
+                break
+            skill_key = game.rng.choice(game.boss.get_available_skills_keys())
+            skills = np.array([SKILL_KEYS.index(skill_key)])
+            batch.copy_from_game(0, game)
+            targets = batch.heuristic_targets(skills)
+            results = game.process_boss_attack(forced_action=(skill_key, _boss_params(skill_key, targets, grid_size)))
+            reward, done = results[4], results[5]
+            batch_reward, batch_done = batch.boss_attack(skills, targets)
+            decisions += 1
+            diffs = _parity_diffs(batch, game, reward, done, batch_reward, batch_done)
+            if diffs:
+                mismatches.append(f"game {episode} round {game.current_round} {skill_key}: {', '.join(diffs)}")
+            if done:
+                break
+            # Round advance and round-start game over check, as in BossAssaultEnv.step
+            status, _msg, _state = game.proceed_to_next_round()
+            if status == "game_over" or game.check_game_over_conditions()[0]:
+                break
+    return decisions, attacks, mismatches
+
+
+def cmd_parity(args):
+    decisions, attacks, mismatches = check_batch_parity(args.games, args.seed, args.grid_size)
+    for mismatch in mismatches[:20]:
+        print(mismatch)
+    print(f"{args.games} games on {args.grid_size}x{args.grid_size}: {decisions} boss decisions and "
+          f"{attacks} player attacks compared, {len(mismatches)} mismatches")
+    if mismatches:
+        sys.exit(1)
+
+
+def cmd_encode(args):
+    from game_logic import GameLogic
+    from agent import DQNAgent
+    from state_encoding import ObservationWriter, get_game_state_for_q_table
+    _seed_everything(args.seed)
+    agent = DQNAgent()
+    game = GameLogic(agent_instance=agent)
+    for r, c in random.sample(game.board.empty_positions(), 5):
+        game.board.place(r, c, random.randint(1, 3))
+    writer = ObservationWriter()
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        agent._discretize_state(get_game_state_for_q_table(game))
+    dict_us = (time.perf_counter() - start) / args.calls * 1e6
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        writer.write(game)
+    writer_us = (time.perf_counter() - start) / args.calls * 1e6
+    print(f"dict + _discretize_state: {dict_us:6.2f} us/observation")
+    print(f"ObservationWriter.write : {writer_us:6.2f} us/observation")
+
+
+def _mid_game_env(seed):
+    """A BossAssaultEnv with an agent, played a few rounds in (for state-copy benchmarks)."""
+    from agent import DQNAgent
+    from headless_training import BossAssaultEnv
+    _seed_everything(seed)
+    env = BossAssaultEnv(agent=DQNAgent(), action_log=True)
+    env.reset()
+    for _ in range(3):
+        if env.done:
+            env.reset()
+        env.step()
+    if env.done:
+        env.reset()
+    return env
+
+
+def _time_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def cmd_snapshot(args):
+    import copy
+    env = _mid_game_env(args.seed)
+    game = env.game
+    before = game.snapshot()
+    env.step() # One boss turn + the next player phase: the kind of branch a search explores
+    after = game.snapshot()
+    deepcopy_us = _time_us(lambda: copy.deepcopy(game), max(1, args.calls // 100))
+
+    def restore_both():
+        game.restore(before)
+        game.restore(after)
+
+    def push_undo():
+        game.push_undo()
+        game.undo()
+    print(f"copy.deepcopy(GameLogic): {deepcopy_us:8.2f} us")
+    print(f"snapshot()              : {_time_us(game.snapshot, args.calls):8.2f} us")
+    print(f"restore(snapshot)       : {_time_us(restore_both, args.calls) / 2:8.2f} us")
+    print(f"push_undo() + undo()    : {_time_us(push_undo, args.calls):8.2f} us")
+
+
+def cmd_lineshot(args):
+    from line_tables import line_shot_table, resolve_line_shot, CELL_STATE_OF
+    env = _mid_game_env(args.seed)
+    board = env.game.board
+    table = line_shot_table(board.size, 4)
+    lines = [[r * board.size + c for c in range(board.size)] for r in range(board.size)]
+
+    def by_charge():
+        for cells in lines:
+            states = [CELL_STATE_OF[board.types[cell] * 256 + board.hp[cell]] for cell in cells]
+            resolve_line_shot(states, 4, 1)
+
+    def by_table():
+        for cells in lines:
+            table.entries[table.pattern(board.types, board.hp, cells)]
+    print(f"charge by charge: {_time_us(by_charge, args.calls) / len(lines):6.2f} us/shot")
+    print(f"line table      : {_time_us(by_table, args.calls) / len(lines):6.2f} us/shot")
+
+
+def cmd_replay(args):
+    from collections import deque
+    import numpy as np
+    import torch
+    from agent import DQNAgent
+    from state_encoding import OBS_DIM
+    _seed_everything(args.seed)
+    agent = DQNAgent(exploration_rate=0.0)
+    per_agent = DQNAgent(exploration_rate=0.0, prioritized_replay=True)
+    capacity, batch_size = agent.replay_buffer.capacity, agent.batch_size
+    transitions = deque(maxlen=capacity) # The former replay memory
+    for _ in range(capacity):
+        state = np.random.rand(OBS_DIM).astype(np.float32)
+        transition = (state, random.randrange(5), random.uniform(-10, 10), np.random.rand(OBS_DIM).astype(np.float32), random.random() < 0.1)
+        transitions.append(transition)
+        agent.replay_buffer.add(*transition)
+        per_agent.replay_buffer.add(*transition)
+
+    def deque_batch():
+        states, actions, rewards, next_states, dones = zip(*random.sample(transitions, batch_size))
+        return (torch.tensor(np.array(states), dtype=torch.float32), torch.tensor(list(actions), dtype=torch.long),
+                torch.tensor(list(rewards), dtype=torch.float32), torch.tensor(np.array(next_states), dtype=torch.float32),
+                torch.tensor(list(dones), dtype=torch.bool))
+
+    def ring_batch():
+        _rows, batch = agent.replay_buffer.sample(batch_size)
+        return tuple(torch.from_numpy(array) for array in batch)
+
+    def per_batch():
+        rows, batch, weights = per_agent.replay_buffer.sample(batch_size)
+        per_agent.replay_buffer.update_priorities(rows, np.random.rand(batch_size))
+        return tuple(torch.from_numpy(array) for array in batch)
+
+    def learn_step():
+        agent.learn(*transitions[random.randrange(capacity)])
+
+    def per_learn_step():
+        per_agent.learn(*transitions[random.randrange(capacity)])
+    print(f"deque batch           : {_time_us(deque_batch, args.calls):8.2f} us")
+    print(f"ring buffer batch     : {_time_us(ring_batch, args.calls):8.2f} us")
+    print(f"prioritized batch     : {_time_us(per_batch, args.calls):8.2f} us  (sample + priority update)")
+    print(f"learn step (ring)     : {_time_us(learn_step, args.calls):8.2f} us")
+    print(f"learn step (priority) : {_time_us(per_learn_step, args.calls):8.2f} us")
+
+
+def cmd_storage(args):
+    from agent import DQNAgent
+    from headless_training import run_headless_training
+    from replay import ReplayBuffer
+    from state_encoding import OBS_DIM, REPLAY_STORAGE_MODES, replay_codec
+    _seed_everything(args.seed)
+    # Real game transitions, collected with float32 storage
+    agent = DQNAgent(replay_buffer_size=args.episodes * 20)
+    run_headless_training(agent, args.episodes, stats_file=None, save_every=0, final_model_file=None, verbose=False)
+    stored = agent.replay_buffer
+    transitions = list(zip(stored.states[:stored.size], stored.actions[:stored.size], stored.rewards[:stored.size],
+                           stored.next_states[:stored.size], stored.dones[:stored.size]))
+    print(f"{len(transitions)} transitions, buffer of {args.capacity:,}")
+    print(f"{'storage':>8} {'bytes/transition':>17} {'buffer MB':>10} {'add us':>7} {'batch us':>9}")
+    for storage in REPLAY_STORAGE_MODES:
+        buffer = ReplayBuffer(len(transitions), OBS_DIM, agent.batch_size, codec=replay_codec(storage))
+        start = time.perf_counter()
+        for transition in transitions:
+            buffer.add(*transition)
+        add_us = (time.perf_counter() - start) / len(transitions) * 1e6
+        batch_us = _time_us(lambda: buffer.sample(agent.batch_size), args.calls)
+        bytes_per_transition = buffer.bytes_per_transition()
+        print(f"{storage:>8} {bytes_per_transition:17d} {bytes_per_transition * args.capacity / 1e6:10.0f} "
+              f"{add_us:7.2f} {batch_us:9.2f}")
+
+
+def cmd_cadence(args):
+    from agent import DQNAgent
+    from headless_training import run_headless_training
+    print(f"{'cadence':>12} {'episodes/s':>11} {'samples/step':>13} {'epsilon':>8}")
+    for cadence in args.cadences:
+        learn_every, gradient_steps, batch_size = (int(part) for part in cadence.split("x"))
+        _seed_everything(args.seed)
+        agent = DQNAgent(learn_every=learn_every, gradient_steps=gradient_steps, batch_size=batch_size)
+        start = time.perf_counter()
+        run_headless_training(agent, args.episodes, stats_file=None, save_every=0,
+                              final_model_file=None, verbose=False)
+        episodes_per_sec = args.episodes / (time.perf_counter() - start)
+        samples_per_step = agent.update_count * batch_size / max(1, agent.env_steps)
+        print(f"{cadence:>12} {episodes_per_sec:11.1f} {samples_per_step:13.1f} {agent.epsilon:8.4f}")
+
+
+def _actor_transitions(seconds, seed=0):
+    """Transitions one actor_learner actor (NumpyPolicy, epsilon 0.3) streams in `seconds`; returns (arrays, per sec)."""
+    import numpy as np
+    from agent import DQNAgent
+    from actor_learner import policy_weights
+    from headless_training import BossAssaultEnv
+    from policy_inference import NumpyPolicy, WEIGHT_NAMES
+    weights = policy_weights(DQNAgent(seed=seed))
+    policy = NumpyPolicy(*(weights[name] for name in WEIGHT_NAMES), epsilon=0.3)
+    env = BossAssaultEnv(agent=policy, state_dicts=False, seed=seed)
+    rows = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        env.reset()
+        while not env.done:
+            _next_state_dict, reward, done, info = env.step()
+            if info["action_idx"] is not None:
+                rows.append((env.observations[0].copy(), info["action_idx"], reward, env.observations[1].copy(), done))
+    per_sec = len(rows) / (time.perf_counter() - start)
+    states, actions, rewards, next_states, dones = zip(*rows)
+    arrays = (np.array(states), np.array(actions), np.array(rewards, dtype=np.float32), np.array(next_states), np.array(dones))
+    return arrays, per_sec
+
+
+def cmd_learner(args):
+    from agent import DQNAgent
+    from actor_learner import CHUNK_TRANSITIONS, LEARN_EVERY_PER_ACTOR, LEARNER_BATCH_SIZE
+    _seed_everything(args.seed)
+    (states, actions, rewards, next_states, dones), actor_rate = _actor_transitions(args.seconds, args.seed)
+    num_chunks = len(actions) // CHUNK_TRANSITIONS
+    print(f"one actor              : {actor_rate:9.0f} transitions/sec")
+    print(f"{'actors':>6} {'learn every':>11} {'learner transitions/s':>22} {'per-row learn()':>16} {'keeps up':>9}")
+    for num_actors in args.actors:
+        rates = []
+        for bulk in (True, False):
+            agent = DQNAgent(seed=args.seed, learn_every=LEARN_EVERY_PER_ACTOR * num_actors, batch_size=LEARNER_BATCH_SIZE)
+            agent.learn_batch(states, actions, rewards, next_states, dones) # Fill the buffer past one batch
+            start = time.perf_counter()
+            fed = 0
+            while time.perf_counter() - start < args.seconds:
+                chunk = slice((fed // CHUNK_TRANSITIONS % num_chunks) * CHUNK_TRANSITIONS, None)
+                chunk = slice(chunk.start, chunk.start + CHUNK_TRANSITIONS)
+                if bulk:
+                    agent.learn_batch(states[chunk], actions[chunk], rewards[chunk], next_states[chunk], dones[chunk])
+                else:
+                    for row in range(chunk.start, chunk.stop):
+                        agent.learn(states[row], int(actions[row]), float(rewards[row]), next_states[row], bool(dones[row]))
+                fed += CHUNK_TRANSITIONS
+            rates.append(fed / (time.perf_counter() - start))
+        keeps_up = "yes" if rates[0] >= num_actors * actor_rate else "no"
+        print(f"{num_actors:6d} {LEARN_EVERY_PER_ACTOR * num_actors:11d} {rates[0]:22.0f} {rates[1]:16.0f} {keeps_up:>9}")
+
+
+def cmd_select(args):
+    import numpy as np
+    from agent import DQNAgent, ACTION_MAP_AGENT
+    from batch_env import VectorizedBossEnv
+    _seed_everything(args.seed)
+    agent = DQNAgent(exploration_rate=0.1)
+    env = VectorizedBossEnv(args.rows, seed=args.seed)
+    env.reset()
+    states, masks = env.observe(), env.available_skills()
+    skill_keys = [[ACTION_MAP_AGENT[idx] for idx in np.flatnonzero(row)] for row in masks]
+    no_units = [[None] * env.grid_size for _ in range(env.grid_size)] # Targets are not timed
+
+    def one_at_a_time():
+        for row in range(args.rows):
+            agent.choose_action(states[row], skill_keys[row], no_units)
+    agent._get_heuristic_skill_params = lambda skill_key, grid_units: []
+    scalar_us = _time_us(one_at_a_time, max(1, args.calls // 20)) / args.rows
+    batch_us = _time_us(lambda: agent.choose_actions(states, masks), args.calls) / args.rows
+    agent.epsilon = 0.0 # Greedy: both paths must pick the same skill
+    scalar_greedy = [agent.choose_action(states[row], skill_keys[row], no_units)[2] for row in range(args.rows)]
+    greedy_match = np.mean(agent.choose_actions(states, masks) == scalar_greedy)
+    print(f"choose_action  (1 row)     : {scalar_us:8.2f} us/decision")
+    print(f"choose_actions ({args.rows} rows) : {batch_us:8.2f} us/decision  ({scalar_us / batch_us:.1f}x)")
+    print(f"greedy agreement           : {greedy_match:8.3f}")
+
+
+def cmd_scaling(args):
+    from headless_training import BossAssaultEnv
+    print(f"{'board':>9} {'units':>7} {'us/step':>9} {'us/restore':>11}")
+    for size in args.sizes:
+        random.seed(args.seed)
+        env = BossAssaultEnv(state_dicts=False, grid_size=size) # No agent: Boss.fallback_choose_action_ai
+        steps, unit_sum, elapsed = 0, 0, 0.0
+        snapshots = []
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline or steps == 0:
+            env.reset()
+            while not env.done:
+                start = time.perf_counter()
+                env.step()
+                elapsed += time.perf_counter() - start
+                steps += 1
+                unit_sum += env.game.board.unit_count()
+                if len(snapshots) < 64:
+                    snapshots.append(env.game.snapshot())
+        game = env.game
+
+        def restore_all():
+            for snap in snapshots:
+                game.restore(snap)
+        restore_us = _time_us(restore_all, max(1, args.restores // len(snapshots))) / len(snapshots)
+        print(f"{size:>4}x{size:<4} {unit_sum / steps:7.1f} {elapsed / steps * 1e6:9.1f} {restore_us:11.2f}")
+
+
+def _play_boss(env, num_episodes, choose_action_idx=None):
+    """Plays episodes with env's agent; returns (boss win rate, mean episode reward, ms/decision)."""
+    boss_wins, total_reward, decisions = 0, 0.0, 0
+    start = time.perf_counter()
+    for _ in range(num_episodes):
+        env.reset()
+        while not env.done:
+            env.step(choose_action_idx(env) if choose_action_idx else None)
+            decisions += 1
+        boss_wins += env.boss_won
+        total_reward += env.episode_reward
+    elapsed = time.perf_counter() - start
+    return boss_wins / num_episodes, total_reward / num_episodes, elapsed / max(1, decisions) * 1000
+
+
+def cmd_mcts(args):
+    from agent import DQNAgent, ACTION_MAP_AGENT
+    from headless_training import BossAssaultEnv
+    from mcts_boss import MCTSBoss
+
+    def random_skill(env):
+        available_keys = env.game.boss.get_available_skills_keys()
+        return random.choice([idx for idx, key in ACTION_MAP_AGENT.items() if key in available_keys])
+    _seed_everything(args.seed)
+    win_rate, mean_reward, ms = _play_boss(BossAssaultEnv(agent=DQNAgent(), state_dicts=False), args.episodes, random_skill)
+    print(f"random skill      : win rate {win_rate:.3f}  reward {mean_reward:8.2f}  {ms:7.2f} ms/decision")
+    for budget in args.budget_ms:
+        _seed_everything(args.seed)
+        boss = MCTSBoss(time_budget_ms=budget)
+        win_rate, mean_reward, ms = _play_boss(BossAssaultEnv(agent=boss, state_dicts=False), args.episodes)
+        print(f"MCTS {budget:6.1f} ms    : win rate {win_rate:.3f}  reward {mean_reward:8.2f}  {ms:7.2f} ms/decision")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tactics Grid benchmarks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_train = sub.add_parser("training", help="Headless vs window-driven training loop throughput.")
+    p_train.add_argument("--episodes", type=int, default=500)
+    p_train.add_argument("--seed", type=int, default=0)
+    p_train.add_argument("--skip-window", action="store_true")
+    p_train.set_defaults(func=cmd_training)
+
+    p_batch = sub.add_parser("batch", help="Vectorized vs scalar environment throughput.")
+    p_batch.add_argument("--envs", type=int, default=4096)
+    p_batch.add_argument("--episodes", type=int, default=100000)
+    p_batch.add_argument("--scalar-episodes", type=int, default=2000)
+    p_batch.add_argument("--seed", type=int, default=0)
+    p_batch.set_defaults(func=cmd_batch)
+
+    p_parity = sub.add_parser("parity", help="VectorizedBossEnv vs GameLogic rule parity on seeded games.")
+    p_parity.add_argument("--games", type=int, default=3000)
+    p_parity.add_argument("--grid-size", type=int, default=4)
+    p_parity.add_argument("--seed", type=int, default=0)
+    p_parity.set_defaults(func=cmd_parity)
+
+    p_encode = sub.add_parser("encode", help="Observation encoding cost.")
+    p_encode.add_argument("--calls", type=int, default=200000)
+    p_encode.add_argument("--seed", type=int, default=0)
+    p_encode.set_defaults(func=cmd_encode)
+
+    p_snapshot = sub.add_parser("snapshot", help="GameLogic branching cost.")
+    p_snapshot.add_argument("--calls", type=int, default=20000)
+    p_snapshot.add_argument("--seed", type=int, default=0)
+    p_snapshot.set_defaults(func=cmd_snapshot)
+
+    p_line = sub.add_parser("lineshot", help="Line-shot resolution cost.")
+    p_line.add_argument("--calls", type=int, default=100000)
+    p_line.add_argument("--seed", type=int, default=0)
+    p_line.set_defaults(func=cmd_lineshot)
+
+    p_replay = sub.add_parser("replay", help="Replay sampling and learn-step cost.")
+    p_replay.add_argument("--calls", type=int, default=5000)
+    p_replay.add_argument("--seed", type=int, default=0)
+    p_replay.set_defaults(func=cmd_replay)
+
+    p_storage = sub.add_parser("storage", help="Replay memory per transition and add / sample cost per storage mode.")
+    p_storage.add_argument("--episodes", type=int, default=300, help="Episodes of transitions to store.")
+    p_storage.add_argument("--capacity", type=int, default=10_000_000, help="Buffer size for the memory column.")
+    p_storage.add_argument("--calls", type=int, default=5000)
+    p_storage.add_argument("--seed", type=int, default=0)
+    p_storage.set_defaults(func=cmd_storage)
+
+    p_cadence = sub.add_parser("cadence", help="Training throughput against update cadence.")
+    p_cadence.add_argument("--episodes", type=int, default=2000)
+    p_cadence.add_argument("--cadences", nargs="+", default=["1x1x64", "4x1x64", "4x1x256", "8x2x256"],
+                           help="learn_every x gradient_steps x batch_size")
+    p_cadence.add_argument("--seed", type=int, default=0)
+    p_cadence.set_defaults(func=cmd_cadence)
+
+    p_learner = sub.add_parser("learner", help="actor_learner learner throughput against one actor's output.")
+    p_learner.add_argument("--actors", type=int, nargs="+", default=[1, 2, 4, 8])
+    p_learner.add_argument("--seconds", type=float, default=3.0, help="Time per measurement.")
+    p_learner.add_argument("--seed", type=int, default=0)
+    p_learner.set_defaults(func=cmd_learner)
+
+    p_select = sub.add_parser("select", help="Single vs batched action selection cost.")
+    p_select.add_argument("--rows", type=int, default=1024)
+    p_select.add_argument("--calls", type=int, default=200)
+    p_select.add_argument("--seed", type=int, default=0)
+    p_select.set_defaults(func=cmd_select)
+
+    p_scaling = sub.add_parser("scaling", help="Step and restore time against board size.")
+    p_scaling.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 16, 32, 64, 128, 256])
+    p_scaling.add_argument("--seconds", type=float, default=2.0, help="Play time per board size.")
+    p_scaling.add_argument("--restores", type=int, default=5000)
+    p_scaling.add_argument("--seed", type=int, default=0)
+    p_scaling.set_defaults(func=cmd_scaling)
+
+    p_mcts = sub.add_parser("mcts", help="MCTS boss strength and latency.")
+    p_mcts.add_argument("--episodes", type=int, default=100)
+    p_mcts.add_argument("--budget-ms", type=float, nargs="+", default=[5.0, 20.0])
+    p_mcts.add_argument("--seed", type=int, default=0)
+    p_mcts.set_defaults(func=cmd_mcts)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
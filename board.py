@@ -0,0 +1,285 @@
+# board.py
+"""
+Compact board store: one byte of unit-type code and one byte of HP per cell.
+
+GameLogic, Boss and DQNAgent read the Board directly (codes, HP, position lists), so the
+simulation never creates per-cell Unit objects. For the UI and older callers the board
+still behaves like the former grid_units list of lists: board[r][c] returns a UnitView
+(a Unit backed by the board cell) or None, and board[r][c] = None removes a unit.
+
+Every place / remove / lethal damage also updates per-type counts, per-row and per-column
+counts, per-line and per-type cell sets, so counting and targeting queries never rescan the
+grid. These sets are the sparse occupancy structure: on large boards (up to 256x256, see
+scaling.py) line shots, targeting, random placement and restore cost time in the number of
+units, not cells.
+"""
+import re
+
+from units import (Unit, EMPTY, UNIT_TYPE_CODES, UNIT_CODE_NAMES, UNIT_CODE_MAX_HP,
+                   UNIT_CODE_ATTACK, UNIT_CODE_ABBR)
+from seeding import GLOBAL_RANDOM
+
+# Boards with more cells than this sample empty cells by rejection and restore through the
+# occupancy sets; smaller ones keep the plain list / scan paths (same random draws as before).
+SPARSE_MIN_CELLS = 64
+_OCCUPIED_CELL = re.compile(rb"[^\x00]")
+
+
+class UnitView(Unit):
+    """Unit facade over one board cell; HP reads and writes go to the board."""
+    def __init__(self, board, r, c):
+        self._board = board
+        self._cell = r * board.size + c
+        code = board.types[self._cell]
+        super().__init__(UNIT_CODE_NAMES[code], UNIT_CODE_MAX_HP[code], board.hp[self._cell],
+                         UNIT_CODE_ATTACK[code], UNIT_CODE_ABBR[code], position=(r, c))
+
+    @property
+    def current_hp(self):
+        return self._board.hp[self._cell]
+
+    @current_hp.setter
+    def current_hp(self, value):
+        self._board.hp[self._cell] = max(0, min(value, 255))
+
+
+class _BoardRow:
+    __slots__ = ("_board", "_r")
+
+    def __init__(self, board, r):
+        self._board = board
+        self._r = r
+
+    def __getitem__(self, c):
+        return self._board.unit_at(self._r, c)
+
+    def __setitem__(self, c, unit):
+        if unit is None:
+            self._board.remove(self._r, c)
+        else:
+            self._board.place(self._r, c, UNIT_TYPE_CODES[unit.name], unit.current_hp)
+
+    def __len__(self):
+        return self._board.size
+
+    def __iter__(self):
+        return (self._board.unit_at(self._r, c) for c in range(self._board.size))
+
+
+class Board:
+    __slots__ = ("size", "num_cells", "types", "hp", "type_counts", "row_counts", "col_counts",
+                 "row_cells", "col_cells", "cells_by_type", "attack_total")
+
+    def __init__(self, size=4):
+        self.size = size
+        self.num_cells = size * size
+        self.types = bytearray(self.num_cells) # Unit type code per cell (EMPTY = 0)
+        self.hp = bytearray(self.num_cells)    # Current HP per cell
+        self._reset_indexes()
+
+    def _reset_indexes(self):
+        num_codes = len(UNIT_CODE_NAMES)
+        self.type_counts = [0] * num_codes                                 # [code]
+        self.row_counts = [[0] * self.size for _ in range(num_codes)]     # [code][r]
+        self.col_counts = [[0] * self.size for _ in range(num_codes)]     # [code][c]
+        self.row_cells = [set() for _ in range(self.size)]                 # [r] -> occupied cell indexes
+        self.col_cells = [set() for _ in range(self.size)]                 # [c] -> occupied cell indexes
+        self.cells_by_type = [set() for _ in range(num_codes)]             # [code] -> cell indexes
+        self.attack_total = 0
+
+    def _index_add(self, cell, code):
+        r, c = divmod(cell, self.size)
+        self.type_counts[code] += 1
+        self.row_counts[code][r] += 1
+        self.col_counts[code][c] += 1
+        self.row_cells[r].add(cell)
+        self.col_cells[c].add(cell)
+        self.cells_by_type[code].add(cell)
+        self.attack_total += UNIT_CODE_ATTACK[code]
+
+    def _index_remove(self, cell, code):
+        r, c = divmod(cell, self.size)
+        self.type_counts[code] -= 1
+        self.row_counts[code][r] -= 1
+        self.col_counts[code][c] -= 1
+        self.row_cells[r].discard(cell)
+        self.col_cells[c].discard(cell)
+        self.cells_by_type[code].discard(cell)
+        self.attack_total -= UNIT_CODE_ATTACK[code]
+
+    @classmethod
+    def from_grid(cls, grid_units):
+        """Builds a Board from a list-of-lists grid of Unit objects (or returns a Board as is)."""
+        if isinstance(grid_units, Board):
+            return grid_units
+        board = cls(len(grid_units))
+        for r, row in enumerate(grid_units):
+            for c, unit in enumerate(row):
+                if unit is not None:
+                    board.place(r, c, UNIT_TYPE_CODES[unit.name], unit.current_hp)
+        return board
+
+    def clear(self):
+        self.types[:] = bytes(self.num_cells)
+        self.hp[:] = bytes(self.num_cells)
+        self._reset_indexes()
+
+    # --- Snapshots (for search / undo) ---
+    def snapshot(self):
+        """Immutable copy of the cells: (types bytes, hp bytes)."""
+        return bytes(self.types), bytes(self.hp)
+
+    def restore(self, snapshot):
+        types, hp = snapshot
+        current = self.types
+        if current != types:
+            # Only cells whose unit type differs touch the indexes (a branch usually changes a few)
+            if self.num_cells > SPARSE_MIN_CELLS:
+                # Candidates: cells occupied now or in the snapshot (regex scan runs in C)
+                cells = set().union(*self.cells_by_type)
+                cells.update(match.start() for match in _OCCUPIED_CELL.finditer(types))
+                changes = [(cell, current[cell], types[cell]) for cell in cells]
+            else:
+                changes = [(cell, old_code, code) for cell, (old_code, code) in enumerate(zip(current, types))]
+            for cell, old_code, code in changes:
+                if old_code != code:
+                    if old_code:
+                        self._index_remove(cell, old_code)
+                    if code:
+                        self._index_add(cell, code)
+            current[:] = types
+        self.hp[:] = hp
+
+    # --- Cell access ---
+    def type_at(self, r, c):
+        return self.types[r * self.size + c]
+
+    def hp_at(self, r, c):
+        return self.hp[r * self.size + c]
+
+    def name_at(self, r, c):
+        return UNIT_CODE_NAMES[self.types[r * self.size + c]]
+
+    def is_empty(self, r, c):
+        return self.types[r * self.size + c] == EMPTY
+
+    def place(self, r, c, code, hp=None):
+        cell = r * self.size + c
+        old_code = self.types[cell]
+        if old_code:
+            self._index_remove(cell, old_code)
+        self.types[cell] = code
+        self.hp[cell] = UNIT_CODE_MAX_HP[code] if hp is None else hp
+        self._index_add(cell, code)
+
+    def remove(self, r, c):
+        cell = r * self.size + c
+        code = self.types[cell]
+        if code:
+            self._index_remove(cell, code)
+        self.types[cell] = EMPTY
+        self.hp[cell] = 0
+
+    def damage(self, r, c, amount):
+        """Applies damage to the unit at (r, c); removes it and returns True if it dies."""
+        cell = r * self.size + c
+        hp = self.hp[cell] - amount
+        if hp <= 0:
+            self._index_remove(cell, self.types[cell])
+            self.types[cell] = EMPTY
+            self.hp[cell] = 0
+            return True
+        self.hp[cell] = hp
+        return False
+
+    # --- Indexed queries (no grid scan; positions come back in row-major order) ---
+    def count(self, code):
+        return self.type_counts[code]
+
+    def unit_count(self):
+        return sum(self.type_counts)
+
+    def line_count(self, codes, line_idx, vertical=False):
+        """Number of units with a type in codes on row line_idx (or column if vertical)."""
+        counts = self.col_counts if vertical else self.row_counts
+        return sum(counts[code][line_idx] for code in codes)
+
+    def line_positions(self, line_idx, vertical=False, reverse=False):
+        """Occupied (r, c) of row line_idx (column if vertical), in index order (reversed if reverse)."""
+        size = self.size
+        cells = self.col_cells[line_idx] if vertical else self.row_cells[line_idx]
+        return [divmod(cell, size) for cell in sorted(cells, reverse=reverse)]
+
+    def best_line(self, codes, vertical=False):
+        """First row (column if vertical) holding the most units with a type in codes; 0 if none."""
+        size = self.size
+        cells = set().union(*[self.cells_by_type[code] for code in codes])
+        counts = {}
+        for cell in cells:
+            line = cell % size if vertical else cell // size
+            counts[line] = counts.get(line, 0) + 1
+        return min(counts, key=lambda line: (-counts[line], line)) if counts else 0
+
+    def occupied_positions(self):
+        size = self.size
+        cells = set().union(*self.cells_by_type)
+        return [divmod(cell, size) for cell in sorted(cells)]
+
+    def positions_of(self, code):
+        size = self.size
+        return [divmod(cell, size) for cell in sorted(self.cells_by_type[code])]
+
+    def total_attack(self):
+        return self.attack_total
+
+    def empty_positions(self):
+        size = self.size
+        return [divmod(cell, size) for cell, code in enumerate(self.types) if not code]
+
+    def _sample_by_rejection(self, free):
+        # Large boards that are at most half full: drawing cells until an empty one is cheaper
+        # than listing every empty cell
+        return self.num_cells > SPARSE_MIN_CELLS and free * 2 >= self.num_cells
+
+    def random_empty_position(self, rng=GLOBAL_RANDOM):
+        """Uniformly random empty (r, c), or None if the board is full."""
+        free = self.num_cells - self.unit_count()
+        if not free:
+            return None
+        if not self._sample_by_rejection(free):
+            return rng.choice(self.empty_positions())
+        types = self.types
+        while True:
+            cell = rng.randrange(self.num_cells)
+            if not types[cell]:
+                return divmod(cell, self.size)
+
+    def random_empty_positions(self, k, rng=GLOBAL_RANDOM):
+        """Up to k distinct empty (r, c) in random order (all of them if fewer are empty)."""
+        free = self.num_cells - self.unit_count()
+        if not self._sample_by_rejection(free):
+            empty_cells = self.empty_positions()
+            rng.shuffle(empty_cells)
+            return empty_cells[:k]
+        types = self.types
+        picked = {} # Insertion-ordered set
+        while len(picked) < min(k, free):
+            cell = rng.randrange(self.num_cells)
+            if not types[cell]:
+                picked[cell] = None
+        return [divmod(cell, self.size) for cell in picked]
+
+    # --- Unit views for the UI / legacy grid_units callers ---
+    def unit_at(self, r, c):
+        if self.types[r * self.size + c] == EMPTY:
+            return None
+        return UnitView(self, r, c)
+
+    def __getitem__(self, r):
+        return _BoardRow(self, r)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (_BoardRow(self, r) for r in range(self.size))
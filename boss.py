@@ -1,19 +1,23 @@
 # boss.py
-import random
+from board import Board
+from scaling import BASE_GRID_SIZE, scaled, shot_charges, ultimate_targets
+from seeding import GLOBAL_RANDOM
 
 class Boss:
-    def __init__(self, agent=None): 
-        self.max_hp = 60
+    def __init__(self, agent=None, grid_size=BASE_GRID_SIZE, rng=GLOBAL_RANDOM):
+        # HP, heal and skill reach scale with the board side (see scaling.py); 4x4 values shown
+        self.max_hp = scaled(60, grid_size)
         self.current_hp = self.max_hp
         self.max_rage = 3; self.current_rage = 0
         self.skills = { 
             "normal_attack": {"cd":0,"cd_timer":0,"rage_gain":1,"damage":1,"name":"Đánh Thường"},
-            "horizontal_shot": {"cd":2,"cd_timer":0,"rage_gain":1,"damage":1,"name":"Bắn Ngang"},
-            "vertical_shot": {"cd":2,"cd_timer":0,"rage_gain":1,"damage":1,"name":"Bắn Dọc"},
-            "heal": {"cd":3,"cd_timer":0,"rage_gain":0,"heal_amount":10,"name":"Hồi Máu"},
-            "ultimate": {"cd":0,"cd_timer":0,"rage_cost":3,"damage":2,"name":"Ultimate","unblockable":True}
+            "horizontal_shot": {"cd":2,"cd_timer":0,"rage_gain":1,"damage":1,"charges":shot_charges(grid_size),"name":"Bắn Ngang"},
+            "vertical_shot": {"cd":2,"cd_timer":0,"rage_gain":1,"damage":1,"charges":shot_charges(grid_size),"name":"Bắn Dọc"},
+            "heal": {"cd":3,"cd_timer":0,"rage_gain":0,"heal_amount":scaled(10, grid_size),"name":"Hồi Máu"},
+            "ultimate": {"cd":0,"cd_timer":0,"rage_cost":3,"damage":2,"targets":ultimate_targets(grid_size),"name":"Ultimate","unblockable":True}
         }
         self.last_skill_message = ""; self.agent = agent 
+        self.rng = rng # Random stream of the fallback AI (the game's; GLOBAL_RANDOM by default)
 
     def take_damage(self, amount): # ... (Giữ nguyên)
         self.current_hp -= amount
@@ -45,16 +49,17 @@ class Boss:
                 else: available.append(key)
         return available
 
-    def choose_action_by_agent(self, current_game_state_dict_for_q_table, grid_units_for_targeting):
+    def choose_action_by_agent(self, current_game_state_dict_for_q_table, grid_units_for_targeting, forced_action_idx=None, state_vector=None):
         if self.agent:
             available_keys = self.get_available_skills_keys()
             if not available_keys:
                 self.last_skill_message = "Boss has no available skills (QAgent)."
                 return None, {}, None # skill, params_dict, action_idx
 
-            discrete_state_tuple = self.agent._discretize_state(current_game_state_dict_for_q_table)
+            # state_vector: observation already encoded by the caller (skips the dict round-trip)
+            discrete_state_tuple = state_vector if state_vector is not None else self.agent._discretize_state(current_game_state_dict_for_q_table)
             chosen_skill_key, skill_params_dict, action_idx = self.agent.choose_action(
-                discrete_state_tuple, available_keys, grid_units_for_targeting
+                discrete_state_tuple, available_keys, grid_units_for_targeting, forced_action_idx
             )
 
             if chosen_skill_key:
@@ -81,7 +86,9 @@ class Boss:
             self.last_skill_message = "Boss has no available skills (fallback)."
             return None, {} # Return empty dict for params
 
-        player_unit_positions = [(r, c) for r in range(4) for c in range(4) if grid_units[r][c] is not None]
+        board = Board.from_grid(grid_units) # Accepts the Board or a legacy list-of-lists grid
+        rng = self.rng
+        player_unit_positions = board.occupied_positions()
         chosen_skill_key = ""
         # ... (rest of fallback AI logic to choose chosen_skill_key) ...
         if "ultimate" in available_skills and len(player_unit_positions) >= 3: chosen_skill_key = "ultimate"
@@ -89,11 +96,11 @@ class Boss:
         else:
             damage_skills = [s for s in available_skills if s not in ["heal", "ultimate"] and player_unit_positions]
             if not damage_skills and "normal_attack" in available_skills and player_unit_positions: damage_skills.append("normal_attack")
-            damage_skills = list(set(damage_skills))
-            if damage_skills: chosen_skill_key = random.choice(damage_skills)
+            damage_skills = list(dict.fromkeys(damage_skills)) # Ordered dedupe: set order varies with the hash seed
+            if damage_skills: chosen_skill_key = rng.choice(damage_skills)
             elif "heal" in available_skills and self.current_hp < self.max_hp: chosen_skill_key = "heal"
             elif "normal_attack" in available_skills and player_unit_positions: chosen_skill_key = "normal_attack"
-            elif available_skills: chosen_skill_key = random.choice(available_skills)
+            elif available_skills: chosen_skill_key = rng.choice(available_skills)
             else: self.last_skill_message = "Boss AI (fallback) could not decide."; return None, {}
 
 
@@ -103,24 +110,25 @@ class Boss:
         if chosen_skill_key == "normal_attack":
             temp_list_params = []
             if player_unit_positions:
-                target_pos = random.choice(player_unit_positions); temp_list_params = [target_pos]
+                target_pos = rng.choice(player_unit_positions); temp_list_params = [target_pos]
                 self.last_skill_message = f"Boss (fallback) uses {skill_name_display} on ({target_pos[0]},{target_pos[1]})."
             else: self.last_skill_message = f"Boss (fallback) tries {skill_name_display}, no targets."; return "normal_attack", {} 
             skill_params_val = temp_list_params # Assign list
         elif chosen_skill_key == "horizontal_shot":
-            skill_params_val["line_idx"] = random.randint(0, 3)
-            skill_params_val["direction"] = random.choice(["ltr", "rtl"])
+            skill_params_val["line_idx"] = rng.randint(0, board.size - 1)
+            skill_params_val["direction"] = rng.choice(["ltr", "rtl"])
             self.last_skill_message = f"Boss (fallback) uses {skill_name_display} on row {skill_params_val['line_idx']} ({skill_params_val['direction']})."
         elif chosen_skill_key == "vertical_shot":
-            skill_params_val["line_idx"] = random.randint(0, 3)
-            skill_params_val["direction"] = random.choice(["ttb", "btt"])
+            skill_params_val["line_idx"] = rng.randint(0, board.size - 1)
+            skill_params_val["direction"] = rng.choice(["ttb", "btt"])
             self.last_skill_message = f"Boss (fallback) uses {skill_name_display} on column {skill_params_val['line_idx']} ({skill_params_val['direction']})."
         elif chosen_skill_key == "ultimate":
             temp_list_params_ulti = []
+            num_targets = self.skills["ultimate"]["targets"]
             possible_targets = player_unit_positions[:] 
-            empty_cells = [(r,c) for r in range(4) for c in range(4) if grid_units[r][c] is None]
-            random.shuffle(possible_targets); random.shuffle(empty_cells)
-            temp_list_params_ulti = (possible_targets + empty_cells)[:6]
+            rng.shuffle(possible_targets)
+            empty_cells = board.random_empty_positions(num_targets, rng) # Samples instead of listing on large boards
+            temp_list_params_ulti = (possible_targets + empty_cells)[:num_targets]
             self.last_skill_message = f"Boss (fallback) uses {skill_name_display}!"
             skill_params_val = temp_list_params_ulti # Assign list
         elif chosen_skill_key == "heal":  
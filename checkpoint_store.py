@@ -0,0 +1,335 @@
+# checkpoint_store.py
+"""
+Content-addressed checkpoint store for training runs.
+
+A store is a directory:
+    manifest.json        index: one entry per checkpoint (name, episode, epsilon, update count,
+                         stats, kind and the hashes of its arrays)
+    objects/<sha>.npy    one array per tensor, named by the SHA-256 of its dtype, shape and bytes
+    objects/<sha>.pt     the rest of a full checkpoint (optimizer hyperparameters, counters)
+                         with its tensors replaced by ("__blob__", sha) references
+
+Identical tensors are stored once, e.g. a target network that was just synced with the policy
+network, or a final model that equals the last periodic checkpoint. Every file is written to a
+temporary name and renamed into place, and the manifest is rewritten the same way after the
+objects it points to, so a crash never leaves a manifest entry with missing objects.
+
+save_async copies the agent's tensors in the training thread, which takes microseconds, and
+leaves hashing and writing to a background thread. kind="weights" snapshots keep only the
+policy network and epsilon, which is enough to evaluate or play a checkpoint.
+
+Reading is lazy. entries() only reads the manifest. policy_arrays() memory-maps the policy
+weights (np.load(mmap_mode="r")), so browsing or evaluating a long history with policy() and
+policy_inference.NumpyPolicy reads only the arrays it uses, and never imports torch. Loading a
+full checkpoint back into a DQNAgent (load_into) or exporting it as a .pth file needs torch.
+
+    python checkpoint_store.py import Model/dqn_boss_episode_*.pth   # migrate .pth checkpoints
+    python checkpoint_store.py list
+    python checkpoint_store.py export episode_200000 --out Model/dqn_boss_agent.pth
+"""
+import io
+import os
+import re
+import sys
+import json
+import pickle
+import glob
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from policy_inference import NumpyPolicy, WEIGHT_NAMES
+from atomic_file import replace_file
+
+CHECKPOINT_DIR = os.path.join("Model", "checkpoints")
+MANIFEST_FILE = "manifest.json"
+OBJECTS_DIR = "objects"
+_BLOB = "__blob__" # Tag of a tensor reference inside a checkpoint skeleton
+
+
+def array_hash(array):
+    """SHA-256 of an array's dtype, shape and contents."""
+    digest = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(np.ascontiguousarray(array).data)
+    return digest.hexdigest()
+
+
+def _snapshot(obj):
+    """Deep copy of a checkpoint with every tensor detached, moved to the CPU and cloned."""
+    import torch
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, dict):
+        return {key: _snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_snapshot(value) for value in obj)
+    return obj
+
+
+class CheckpointStore:
+    """
+    Checkpoints of a run in one directory (see the module docstring). Saves go through one
+    background thread, in order. flush() waits for them and re-raises the first error.
+    """
+    def __init__(self, directory=CHECKPOINT_DIR, weights_only=False):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, OBJECTS_DIR)
+        self.manifest_file = os.path.join(directory, MANIFEST_FILE)
+        self.weights_only = weights_only # Default kind of save_async snapshots
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file) as manifest_file:
+                self._entries = {entry["name"]: entry for entry in json.load(manifest_file)["checkpoints"]}
+        self._executor = None
+        self._pending = []
+
+    # --- Writing ---
+
+    def save_async(self, agent, episode, stats=None, name=None, weights_only=None):
+        """
+        Queues a checkpoint of agent after `episode` episodes and returns at once. stats is a
+        JSON-able dict stored in the manifest (e.g. TrainingStatsLog.summary()).
+        """
+        weights_only = self.weights_only if weights_only is None else weights_only
+        if weights_only:
+            checkpoint = {'policy_net_state_dict': agent.policy_net.state_dict(), 'epsilon': agent.epsilon,
+                          'update_count': agent.update_count}
+        else:
+            checkpoint = agent._checkpoint()
+        checkpoint = _snapshot(checkpoint) # Training may change the tensors while the thread writes
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-store")
+        self._raise_failed()
+        self._pending.append(self._executor.submit(self.add, checkpoint, episode, stats, name))
+
+    def add(self, checkpoint, episode, stats=None, name=None):
+        """
+        Stores a checkpoint dict (DQNAgent._checkpoint() layout, or a weights-only subset) now.
+        An existing entry of the same name (default "episode_<episode>") is replaced.
+        """
+        import torch
+        name = name or f"episode_{episode}"
+
+        def strip(obj):
+            if isinstance(obj, torch.Tensor):
+                return (_BLOB, self._put_array(obj.detach().cpu().numpy()))
+            if isinstance(obj, dict):
+                return {key: strip(value) for key, value in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return type(obj)(strip(value) for value in obj)
+            return obj
+
+        full = 'optimizer_state_dict' in checkpoint
+        weights = {key.replace(".", "_"): strip(tensor)[1] for key, tensor in checkpoint['policy_net_state_dict'].items()}
+        entry = {"name": name, "episode": episode, "epsilon": float(checkpoint['epsilon']),
+                 "update_count": int(checkpoint.get('update_count', 0)), "kind": "full" if full else "weights",
+                 "stats": stats or {}, "weights": weights, "saved_at": time.time()}
+        if full:
+            skeleton = strip(checkpoint)
+            buffer = io.BytesIO()
+            torch.save(skeleton, buffer)
+            # Named by the pickled skeleton: torch.save output carries a per-save serialization id
+            digest = hashlib.sha256(pickle.dumps(skeleton, protocol=4)).hexdigest()
+            path = os.path.join(self.objects_dir, digest + ".pt")
+            if not os.path.exists(path):
+                replace_file(lambda out: out.write(buffer.getvalue()), path)
+            entry["skeleton"] = digest
+        with self._lock:
+            self._entries[name] = entry
+            self._write_manifest()
+        return entry
+
+    def _put_array(self, array):
+        digest = array_hash(array)
+        path = os.path.join(self.objects_dir, digest + ".npy")
+        if not os.path.exists(path): # Content-addressed: an existing object is the same array
+            replace_file(lambda out: np.save(out, array), path)
+        return digest
+
+    def _write_manifest(self):
+        entries = sorted(self._entries.values(), key=lambda entry: (entry["episode"], entry["name"]))
+        data = json.dumps({"checkpoints": entries}, indent=1).encode()
+        replace_file(lambda out: out.write(data), self.manifest_file)
+
+    def _raise_failed(self):
+        done = [future for future in self._pending if future.done()]
+        self._pending = [future for future in self._pending if not future.done()]
+        for future in done:
+            future.result() # Re-raises a failed background save
+
+    def flush(self):
+        """Waits until every queued save is on disk."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def remove(self, name):
+        """Drops an entry from the manifest (objects stay until gc())."""
+        with self._lock:
+            del self._entries[name]
+            self._write_manifest()
+
+    def gc(self):
+        """Deletes objects no manifest entry refers to; returns the bytes freed."""
+        self.flush()
+        with self._lock:
+            live = set()
+            for entry in self._entries.values():
+                live.update(entry["weights"].values())
+                if "skeleton" in entry:
+                    live.add(entry["skeleton"])
+                    live.update(self._skeleton_blobs(entry["skeleton"]))
+        freed = 0
+        for path in glob.glob(os.path.join(self.objects_dir, "*.*")):
+            if os.path.basename(path).split(".")[0] not in live:
+                freed += os.path.getsize(path)
+                os.remove(path)
+        return freed
+
+    # --- Reading ---
+
+    def entries(self):
+        """Manifest entries sorted by episode (no object is read)."""
+        with self._lock:
+            return sorted(self._entries.values(), key=lambda entry: (entry["episode"], entry["name"]))
+
+    def entry(self, name):
+        with self._lock:
+            return self._entries[name]
+
+    def object_bytes(self):
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(self.objects_dir, "*.*")))
+
+    def _array(self, digest, mmap_mode="r"):
+        return np.load(os.path.join(self.objects_dir, digest + ".npy"), mmap_mode=mmap_mode)
+
+    def policy_arrays(self, name):
+        """{WEIGHT_NAMES: read-only memory-mapped array} of a checkpoint's policy network."""
+        weights = self.entry(name)["weights"]
+        return {weight: self._array(weights[weight]) for weight in WEIGHT_NAMES}
+
+    def policy(self, name, **kwargs):
+        """NumpyPolicy of a checkpoint (torch-free; weights are read through the memory maps)."""
+        arrays = self.policy_arrays(name)
+        return NumpyPolicy(*(arrays[weight] for weight in WEIGHT_NAMES), **kwargs)
+
+    def _skeleton(self, digest):
+        import torch
+        return torch.load(os.path.join(self.objects_dir, digest + ".pt"))
+
+    def _skeleton_blobs(self, digest):
+        found = []
+
+        def walk(obj):
+            if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == _BLOB:
+                found.append(obj[1])
+            elif isinstance(obj, dict):
+                for value in obj.values():
+                    walk(value)
+            elif isinstance(obj, (list, tuple)):
+                for value in obj:
+                    walk(value)
+        walk(self._skeleton(digest))
+        return found
+
+    def checkpoint(self, name):
+        """The checkpoint dict of an entry, with torch tensors (DQNAgent._checkpoint() layout)."""
+        import torch
+        entry = self.entry(name)
+        if "skeleton" not in entry:
+            return {'policy_net_state_dict': {weight.replace("_", "."): torch.from_numpy(np.array(self._array(digest)))
+                                              for weight, digest in entry["weights"].items()},
+                    'epsilon': entry["epsilon"], 'update_count': entry["update_count"]}
+
+        def fill(obj):
+            if isinstance(obj, tuple) and len(obj) == 2 and obj[0] == _BLOB:
+                return torch.from_numpy(np.array(self._array(obj[1])))
+            if isinstance(obj, dict):
+                return {key: fill(value) for key, value in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return type(obj)(fill(value) for value in obj)
+            return obj
+        return fill(self._skeleton(entry["skeleton"]))
+
+    def load_into(self, agent, name):
+        """Restores a checkpoint into agent; weights-only entries set both networks and epsilon."""
+        checkpoint = self.checkpoint(name)
+        if 'optimizer_state_dict' in checkpoint:
+            agent._load_checkpoint(checkpoint)
+        else:
+            agent.policy_net.load_state_dict(checkpoint['policy_net_state_dict'])
+            agent.target_net.load_state_dict(checkpoint['policy_net_state_dict'])
+            agent.epsilon = checkpoint['epsilon']
+            agent.update_count = checkpoint['update_count']
+
+
+def episode_of(filepath):
+    """Episode number of an 'episode_N' checkpoint file name, or None (e.g. the final model)."""
+    match = re.search(r"episode_(\d+)", os.path.basename(filepath))
+    return int(match.group(1)) if match else None
+
+
+def _cmd_import(args):
+    import torch
+    store = CheckpointStore(args.store)
+    before = 0
+    for filepath in sorted(args.files, key=lambda filepath: (episode_of(filepath) is None, episode_of(filepath) or 0)):
+        checkpoint = torch.load(filepath, map_location="cpu")
+        if args.weights_only:
+            checkpoint = {key: checkpoint[key] for key in ('policy_net_state_dict', 'epsilon', 'update_count')}
+        name = os.path.splitext(os.path.basename(filepath))[0].replace("dqn_boss_", "")
+        store.add(checkpoint, episode_of(filepath) or 0, name=name) # Manifest episodes are ints; no number -> 0
+        before += os.path.getsize(filepath)
+    print(f"{len(args.files)} checkpoints: {before / 1e3:.0f} kB of .pth files -> "
+          f"{store.object_bytes() / 1e3:.0f} kB of objects in {args.store}")
+
+
+def _cmd_list(args):
+    store = CheckpointStore(args.store)
+    print(f"{'name':>22} {'episode':>8} {'epsilon':>8} {'updates':>9} {'kind':>7}  stats")
+    for entry in store.entries():
+        stats = " ".join(f"{key}={value}" for key, value in entry["stats"].items())
+        print(f"{entry['name']:>22} {entry['episode']:8d} {entry['epsilon']:8.4f} {entry['update_count']:9d} "
+              f"{entry['kind']:>7}  {stats}")
+    print(f"{len(store.entries())} checkpoints, {store.object_bytes() / 1e3:.0f} kB of objects")
+
+
+def _cmd_export(args):
+    from training_state import atomic_save
+    store = CheckpointStore(args.store)
+    atomic_save(store.checkpoint(args.name), args.out)
+    print(f"{args.name} written to {args.out}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Browse and migrate the content-addressed checkpoint store.")
+    parser.add_argument("--store", default=CHECKPOINT_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_import = sub.add_parser("import", help="Add .pth checkpoints (episode taken from 'episode_N' in the name).")
+    p_import.add_argument("files", nargs="+")
+    p_import.add_argument("--weights-only", action="store_true", help="Keep only the policy network and epsilon.")
+    p_import.set_defaults(func=_cmd_import)
+    p_list = sub.add_parser("list", help="Manifest entries (reads no checkpoint data).")
+    p_list.set_defaults(func=_cmd_list)
+    p_export = sub.add_parser("export", help="Write one checkpoint as a .pth file for DQNAgent.load.")
+    p_export.add_argument("name")
+    p_export.add_argument("--out", required=True)
+    p_export.set_defaults(func=_cmd_export)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
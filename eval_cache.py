@@ -0,0 +1,150 @@
+# eval_cache.py
+"""
+Persistent cache of evaluation episodes.
+
+A seeded evaluation episode is fully determined by the policy weights, the player strategy,
+the root seed, the episode index and the game configuration. The cache stores the outcome of
+every episode played (boss win, reward, boss turns) under a key hashing everything but the
+index:
+    weights   SHA-256 of the policy arrays (checkpoint_store.array_hash)
+    opponent  player_strategies id
+    seed      root seed of seeding.episode_seed
+    config    game_config(): rounds, grid size, PLAYER_UNIT_SPECS stock, kill rewards and unit stats,
+              placement limits and boss stats, plus EVAL_CACHE_VERSION
+
+Each key is one <key>.npz file in the cache directory with per-index arrays. A "played"
+mask marks the episodes it holds, so a later run with more episodes, another opponent or a
+new checkpoint only plays the missing (key, index) pairs. Renamed or copied checkpoints with
+the same weights hit the same entries. Code changes that alter play without changing the
+config (rules, rewards, player strategies) must bump EVAL_CACHE_VERSION.
+
+    python eval_cache.py info
+    python eval_cache.py clear
+"""
+import os
+import json
+import glob
+import hashlib
+import argparse
+
+import numpy as np
+
+from checkpoint_store import array_hash
+from atomic_file import replace_file
+from policy_inference import WEIGHT_NAMES
+from units import PLAYER_UNIT_SPECS, UNIT_TYPE_CODES, UNIT_CODE_MAX_HP, UNIT_CODE_ATTACK
+
+EVAL_CACHE_DIR = os.path.join("Model", "eval_cache")
+EVAL_CACHE_VERSION = 1 # Bump when rules, rewards or player strategies change how an episode plays
+RESULT_DTYPES = {"played": np.bool_, "boss_won": np.bool_, "reward": np.float64, "turns": np.int32}
+
+
+def game_config(max_rounds=9, grid_size=4):
+    """JSON-able description of everything in the game setup that changes an episode's outcome."""
+    from game_logic import GameLogic
+    game = GameLogic(grid_size=grid_size, max_rounds=max_rounds, state_dicts=False, action_log=False)
+    boss = game.boss
+    return {
+        "version": EVAL_CACHE_VERSION,
+        "max_rounds": max_rounds,
+        "grid_size": grid_size,
+        "player_units": {name: {"max_accumulation": spec["max_accumulation"],
+                                "kill_reward": spec["kill_reward"],
+                                "stock": game.player_max_accumulation[name],
+                                "max_hp": UNIT_CODE_MAX_HP[UNIT_TYPE_CODES[name]],
+                                "attack": UNIT_CODE_ATTACK[UNIT_TYPE_CODES[name]]}
+                         for name, spec in PLAYER_UNIT_SPECS.items()},
+        "regeneration": game.player_regeneration_per_round,
+        "units_per_round": [game.max_units_to_place_round_1, game.max_units_to_place_later_rounds],
+        "boss": {"max_hp": boss.max_hp, "max_rage": boss.max_rage,
+                 "skills": {key: {stat: value for stat, value in skill.items() if stat not in ("name", "cd_timer")}
+                            for key, skill in boss.skills.items()}},
+    }
+
+
+def weights_digest(weights):
+    """SHA-256 of a {WEIGHT_NAMES: array} policy (independent of where the checkpoint is stored)."""
+    digest = hashlib.sha256()
+    for name in WEIGHT_NAMES:
+        digest.update(f"{name}:{array_hash(np.asarray(weights[name]))};".encode())
+    return digest.hexdigest()
+
+
+def result_key(weights_sha, opponent, seed, config):
+    """Cache key of the episodes of one policy against one opponent under one root seed and config."""
+    fields = {"weights": weights_sha, "opponent": opponent, "seed": seed, "config": config}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def empty_results(length):
+    return {field: np.zeros(length, dtype=dtype) for field, dtype in RESULT_DTYPES.items()}
+
+
+class EvalCache:
+    """Directory of <key>.npz per-episode results (see the module docstring)."""
+    def __init__(self, directory=EVAL_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key, length=0):
+        """Per-episode result arrays of key, at least length long; "played" marks the cached episodes."""
+        results = empty_results(length)
+        path = self._path(key)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                cached = len(data["played"])
+                if cached > length:
+                    results = empty_results(cached)
+                for field in RESULT_DTYPES:
+                    results[field][:cached] = data[field]
+        return results
+
+    def save(self, key, results, meta=None):
+        """Writes the result arrays of key (atomically); meta is a JSON-able description for info."""
+        replace_file(lambda file: np.savez(file, meta=np.array(json.dumps(meta or {})), **results), self._path(key))
+
+    def keys(self):
+        return sorted(os.path.splitext(os.path.basename(path))[0] for path in glob.glob(self._path("*")))
+
+    def meta(self, key):
+        with np.load(self._path(key)) as data:
+            return json.loads(str(data["meta"])), int(data["played"].sum())
+
+    def clear(self):
+        for key in self.keys():
+            os.remove(self._path(key))
+
+
+def _cmd_info(args):
+    cache = EvalCache(args.cache)
+    total = 0
+    print(f"{'key':>16} {'episodes':>8}  checkpoint / opponent / seed")
+    for key in cache.keys():
+        meta, played = cache.meta(key)
+        total += played
+        print(f"{key[:16]:>16} {played:8d}  {meta.get('checkpoint')} / {meta.get('opponent')} / {meta.get('seed')}")
+    print(f"{len(cache.keys())} entries, {total} cached episodes in {args.cache}")
+
+
+def _cmd_clear(args):
+    cache = EvalCache(args.cache)
+    num_keys = len(cache.keys())
+    cache.clear()
+    print(f"{num_keys} entries removed from {args.cache}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the evaluation episode cache of tournament.py.")
+    parser.add_argument("--cache", default=EVAL_CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="Entries and cached episodes.").set_defaults(func=_cmd_info)
+    sub.add_parser("clear", help="Remove every entry.").set_defaults(func=_cmd_clear)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# events.py
+"""
+Typed game events.
+
+GameLogic emits one event per thing that happens (placement, hit, kill, shot charge used, ...)
+on its EventStream. Subscribers are plain callables taking the event. When nobody is
+subscribed the game skips building events entirely (it checks events.active first), so a
+training run with logging off pays one attribute check per action.
+
+ActionLogRecorder is the subscriber behind GameLogic.action_log: it renders each event to
+the same text lines the UI has always shown. Replay or analytics tools can subscribe to the
+same stream and keep the events themselves.
+"""
+from typing import NamedTuple, Optional
+
+
+# --- Episode / round flow ---
+class GameStarted(NamedTuple):
+    pass
+
+class RoundStarted(NamedTuple):
+    round: int
+
+class StockRegenerated(NamedTuple):
+    pass
+
+class UnitPlaced(NamedTuple):
+    unit: str
+    r: int
+    c: int
+    stock_left: int
+    placed_this_round: int
+
+class PlacementEnded(NamedTuple):
+    pass
+
+class GameOver(NamedTuple):
+    message: str
+
+class Message(NamedTuple):
+    text: str # Free-form text (UI notices)
+
+# --- Player attack ---
+class PlayerAttackStarted(NamedTuple):
+    pass
+
+class NoPlayerUnits(NamedTuple):
+    pass
+
+class UnitAttacked(NamedTuple):
+    unit: str
+    r: int
+    c: int
+    damage: int
+
+class BossDamaged(NamedTuple):
+    amount: int
+    hp: int
+
+class NoPlayerDamage(NamedTuple):
+    pass
+
+class BossDefeated(NamedTuple):
+    pass
+
+# --- Boss turn ---
+class BossTurnStarted(NamedTuple):
+    pass
+
+class BossAction(NamedTuple):
+    skill: Optional[str] # None if the boss did nothing
+    message: str
+
+class BossHealed(NamedTuple):
+    amount: int
+    hp: int
+
+class UnitHit(NamedTuple):
+    skill: str # "normal_attack" or "ultimate"
+    unit: str
+    r: int
+    c: int
+    damage: int
+
+class EmptyCellHit(NamedTuple):
+    r: int
+    c: int
+
+class LineShotStarted(NamedTuple):
+    skill: str
+    skill_name: str
+    line_idx: int
+    direction: str
+    charges: int
+
+class BeamBlocked(NamedTuple):
+    unit: str
+    r: int
+    c: int
+    hp: int
+
+class ShotChargeConsumed(NamedTuple):
+    unit: str
+    r: int
+    c: int
+    charges_left: int
+    blocked: bool # True if a Tank is absorbing the beam
+
+class UnitSurvived(NamedTuple):
+    unit: str
+    r: int
+    c: int
+    blocked: bool
+
+class UnitDestroyed(NamedTuple):
+    skill: str
+    unit: str
+    r: int
+    c: int
+    hits: Optional[int] = None # Charges a blocking Tank took before dying
+
+class UltimateStarted(NamedTuple):
+    targets: int
+
+class PlayerWiped(NamedTuple):
+    pass
+
+
+class EventStream:
+    __slots__ = ("subscribers", "active")
+
+    def __init__(self):
+        self.subscribers = []
+        self.active = False # Emitters check this before building an event
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        self.active = True
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+        self.active = bool(self.subscribers)
+
+    def emit(self, event):
+        for callback in self.subscribers:
+            callback(event)
+
+
+# --- Text rendering (action log) ---
+def _render_unit_destroyed(e):
+    if e.hits is not None:
+        return f"    - Tank {e.unit} destroyed after {e.hits} hits!"
+    if e.skill == "normal_attack":
+        return f"  - {e.unit} destroyed!"
+    return f"    - {e.unit} destroyed!"
+
+def _render_line_shot(e):
+    line_word = "row" if e.skill == "horizontal_shot" else "column"
+    return f"- {e.skill_name} ({e.charges} charges) on {line_word} {e.line_idx} dir {e.direction}:"
+
+def _render_unit_hit(e):
+    if e.skill == "ultimate":
+        return f"  - Hits ({e.r},{e.c}) by {e.unit} for {e.damage} damage."
+    return f"- Attacks {e.unit} at ({e.r},{e.c}) for {e.damage} damage."
+
+_RENDERERS = {
+    GameStarted: lambda e: "Game Started (New Episode).",
+    RoundStarted: lambda e: f"--- Round {e.round} ---",
+    StockRegenerated: lambda e: "Player unit stock regenerated.",
+    UnitPlaced: lambda e: f"Placed {e.unit} at ({e.r},{e.c}). Stock: {e.stock_left}. Placed: {e.placed_this_round}.",
+    PlacementEnded: lambda e: "Placement phase ended.",
+    GameOver: lambda e: e.message,
+    Message: lambda e: e.text,
+    PlayerAttackStarted: lambda e: "Player attacks:",
+    NoPlayerUnits: lambda e: "No player units on board to attack.",
+    UnitAttacked: lambda e: f"- {e.unit} ({e.r},{e.c}) deals {e.damage} damage.",
+    BossDamaged: lambda e: f"Boss takes {e.amount} total. HP: {e.hp}",
+    NoPlayerDamage: lambda e: "Player units dealt no damage.",
+    BossDefeated: lambda e: "Boss Defeated!",
+    BossTurnStarted: lambda e: "Boss's turn:",
+    BossAction: lambda e: e.message,
+    BossHealed: lambda e: None, # Already described by the BossAction message
+    UnitHit: _render_unit_hit,
+    EmptyCellHit: lambda e: f"  - Hits empty ({e.r},{e.c}).",
+    LineShotStarted: _render_line_shot,
+    BeamBlocked: lambda e: f"  - Beam reaches Tank {e.unit} at ({e.r},{e.c}). HP: {e.hp}",
+    ShotChargeConsumed: lambda e: (f"    - Tank takes 1 hit from charge. ({e.charges_left} charges left)" if e.blocked
+                                   else f"  - Beam hits {e.unit} at ({e.r},{e.c}) for 1 charge."),
+    UnitSurvived: lambda e: (f"    - Tank {e.unit} survives. Skill exhausted on Tank." if e.blocked
+                             else f"    - {e.unit} survives. Beam continues..."),
+    UnitDestroyed: _render_unit_destroyed,
+    UltimateStarted: lambda e: f"- Ultimate strikes {e.targets} locations:",
+    PlayerWiped: lambda e: "All player units destroyed by Boss this round!",
+}
+
+
+def render_event(event):
+    """Action-log text for an event, or None if the event has no log line."""
+    renderer = _RENDERERS.get(type(event))
+    return renderer(event) if renderer else None
+
+
+class ActionLogRecorder:
+    """Subscriber that keeps the rendered action log; GameStarted starts a new log."""
+    def __init__(self):
+        self.lines = []
+
+    def __call__(self, event):
+        if type(event) is GameStarted:
+            self.lines.clear()
+        text = render_event(event)
+        if text is not None:
+            self.lines.append(text)
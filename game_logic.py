@@ -1,42 +1,148 @@
 # game_logic.py
 import random
-from units import Unit, Tank, Knight, AD, PLAYER_UNIT_SPECS
+from typing import NamedTuple
+from units import PLAYER_UNIT_SPECS, UNIT_TYPE_CODES, UNIT_CODE_NAMES, UNIT_CODE_ATTACK
+from board import Board
 from boss import Boss
-from agent import get_game_state_for_q_table
+from state_encoding import get_game_state_for_q_table, ObservationWriter
+from line_tables import line_shot_table
+from scaling import check_grid_size, scaled, BASE_UNITS_ROUND_1, BASE_UNITS_LATER_ROUNDS
+from seeding import GLOBAL_RANDOM, python_rng
+from events import (EventStream, ActionLogRecorder, GameStarted, RoundStarted, StockRegenerated, UnitPlaced,
+                    PlacementEnded, GameOver, Message, PlayerAttackStarted, NoPlayerUnits, UnitAttacked,
+                    BossDamaged, NoPlayerDamage, BossDefeated, BossTurnStarted, BossAction, BossHealed, UnitHit,
+                    EmptyCellHit, LineShotStarted, BeamBlocked, ShotChargeConsumed, UnitSurvived,
+                    UnitDestroyed, UltimateStarted, PlayerWiped)
+
+# Skill index of each boss skill (same indexes as agent.ACTION_MAP_AGENT)
+BOSS_SKILL_INDEX = {"normal_attack": 0, "horizontal_shot": 1, "vertical_shot": 2, "heal": 3, "ultimate": 4}
+
+
+class GameSnapshot(NamedTuple):
+    """Everything the rules depend on; the agent, skill definitions and log are not included."""
+    board: tuple               # Board.snapshot(): (types bytes, hp bytes)
+    boss_hp: int
+    boss_rage: int
+    cooldowns: tuple           # cd_timer per boss skill, in boss.skills order
+    stock: tuple               # player_current_accumulation, in PLAYER_UNIT_SPECS order
+    current_round: int
+    units_placed_this_round: int
+    units_destroyed_this_round: int
+    game_phase: str
+
 
 class GameLogic:
-    def __init__(self, grid_size=4, max_rounds=9, agent_instance=None):
-        self.grid_size = grid_size
+    def __init__(self, grid_size=4, max_rounds=9, agent_instance=None, state_dicts=True, action_log=True,
+                 seed=None):
+        self.grid_size = check_grid_size(grid_size)
         self.max_rounds = max_rounds
-        self.grid_units = [[None for _ in range(grid_size)] for _ in range(grid_size)]
-        self.boss = Boss(agent=agent_instance)
+        # Random stream of the game's own draws (fallback boss AI, automated players reading
+        # game.rng): the global random module unless seeded (see seeding.py and reseed()).
+        self.rng = GLOBAL_RANDOM if seed is None else python_rng(seed)
+        self.board = Board(grid_size) # Compact unit-type / HP arrays; grid_units is a view of it
+        self.boss = Boss(agent=agent_instance, grid_size=grid_size, rng=self.rng)
         self.current_round = 0
-        self.player_max_accumulation = {name:spec["max_accumulation"] for name,spec in PLAYER_UNIT_SPECS.items()}
+        # Stock and placement limits scale with the board side (scaling.py); 4x4 keeps the spec values
+        self.player_max_accumulation = {name:scaled(spec["max_accumulation"], grid_size) for name,spec in PLAYER_UNIT_SPECS.items()}
         self.player_current_accumulation = {}
+        self.player_regeneration_per_round = scaled(1, grid_size) # Stock regained per type and round
         self.units_placed_this_round_count = 0
-        self.max_units_to_place_round_1 = 7
-        self.max_units_to_place_later_rounds = 2
+        self.max_units_to_place_round_1 = scaled(BASE_UNITS_ROUND_1, grid_size)
+        self.max_units_to_place_later_rounds = scaled(BASE_UNITS_LATER_ROUNDS, grid_size)
         self.game_phase = "INITIALIZING"
-        self.action_log = []
         self.units_destroyed_this_round_by_boss = 0
+        # Everything that happens is emitted as typed events (see events.py); action_log is the
+        # text rendering kept by an ActionLogRecorder subscriber. With action_log=False and no
+        # other subscribers no event (or log string) is built at all.
+        self.events = EventStream()
+        self._log_recorder = ActionLogRecorder()
+        self.action_log = self._log_recorder.lines
+        self.set_action_log(action_log)
+        # With state_dicts=False the phase methods return None instead of state dicts; callers
+        # encode observations themselves (see state_encoding.ObservationWriter).
+        self.state_dicts = state_dicts
+        # Observation the boss agent decided on in the last process_boss_attack (reused buffer)
+        self._decision_writer = ObservationWriter()
+        self.decision_observation = self._decision_writer.buffer
+        self._undo_stack = []
+        self._shot_lines = {} # (skill, line, direction) -> ordered line coords / cells
+        # Controllers that search over the live game (e.g. mcts_boss.MCTSBoss) get a reference to it
+        if hasattr(agent_instance, "attach_game"):
+            agent_instance.attach_game(self)
+
+    def reseed(self, seed):
+        """Gives the game its own random stream seeded from seed (int or SeedSequence)."""
+        self.rng = self.boss.rng = python_rng(seed)
+
+    def set_action_log(self, enabled):
+        if enabled and self._log_recorder not in self.events.subscribers:
+            self.events.subscribe(self._log_recorder)
+        elif not enabled:
+            self.events.unsubscribe(self._log_recorder)
+
+    def log_message(self, text):
+        if self.events.active: self.events.emit(Message(text))
+
+    # --- Snapshot / restore / undo (cheap branching for search and what-if analysis) ---
+    def snapshot(self):
+        boss = self.boss
+        stock = self.player_current_accumulation
+        return GameSnapshot(self.board.snapshot(), boss.current_hp, boss.current_rage,
+                            tuple([skill["cd_timer"] for skill in boss.skills.values()]),
+                            tuple([stock.get(name, 0) for name in PLAYER_UNIT_SPECS]),
+                            self.current_round, self.units_placed_this_round_count,
+                            self.units_destroyed_this_round_by_boss, self.game_phase)
+
+    def restore(self, snap):
+        """Puts the game back into a snapshot's state. Emits no events."""
+        self.board.restore(snap.board)
+        boss = self.boss
+        boss.current_hp = snap.boss_hp
+        boss.current_rage = snap.boss_rage
+        for skill, cd_timer in zip(boss.skills.values(), snap.cooldowns):
+            skill["cd_timer"] = cd_timer
+        self.player_current_accumulation = dict(zip(PLAYER_UNIT_SPECS, snap.stock))
+        self.current_round = snap.current_round
+        self.units_placed_this_round_count = snap.units_placed_this_round
+        self.units_destroyed_this_round_by_boss = snap.units_destroyed_this_round
+        self.game_phase = snap.game_phase
+
+    def push_undo(self):
+        self._undo_stack.append(self.snapshot())
+
+    def undo(self):
+        """Restores the state saved by the matching push_undo(); returns False if the stack is empty."""
+        if not self._undo_stack:
+            return False
+        self.restore(self._undo_stack.pop())
+        return True
+
+    def _state_dict(self):
+        return get_game_state_for_q_table(self) if self.state_dicts else None
+
+    @property
+    def grid_units(self):
+        # Legacy grid access for the UI: grid_units[r][c] is a UnitView or None
+        return self.board
 
     def start_new_game(self):
-        self.grid_units = [[None for _ in range(self.grid_size)] for _ in range(self.grid_size)]
+        self.board.clear()
         self.boss.current_hp = self.boss.max_hp
         self.boss.current_rage = 0
         for skill_key in self.boss.skills: self.boss.skills[skill_key]["cd_timer"] = 0
         self.current_round = 0
         self.player_current_accumulation = self.player_max_accumulation.copy()
-        self.action_log = ["Game Started (New Episode)."]
+        if self.events.active: self.events.emit(GameStarted())
         self._setup_new_round()
-        return get_game_state_for_q_table(self) 
+        return self._state_dict() 
 
     def _regenerate_player_accumulation(self):
         if self.current_round > 1:
             for unit_name in PLAYER_UNIT_SPECS:
                 if self.player_current_accumulation[unit_name] < self.player_max_accumulation[unit_name]:
-                    self.player_current_accumulation[unit_name] += 1
-            self.action_log.append(f"Player unit stock regenerated.")
+                    self.player_current_accumulation[unit_name] = min(self.player_current_accumulation[unit_name] + self.player_regeneration_per_round,
+                                                                      self.player_max_accumulation[unit_name])
+            if self.events.active: self.events.emit(StockRegenerated())
 
     def _setup_new_round(self):
         self.current_round += 1
@@ -45,7 +151,7 @@ class GameLogic:
         self.units_destroyed_this_round_by_boss = 0
         if self.current_round > 1:
             self._regenerate_player_accumulation()
-        self.action_log.append(f"--- Round {self.current_round} ---")
+        if self.events.active: self.events.emit(RoundStarted(self.current_round))
         self.game_phase = "PLACEMENT"
 
     def get_max_units_to_place_this_round(self):
@@ -61,49 +167,49 @@ class GameLogic:
             return False, f"Placement limit reached."
         if self.player_current_accumulation.get(unit_name_to_place, 0) <= 0:
             return False, f"No {unit_name_to_place}s left."
-        if self.grid_units[r][c] is not None:
+        if not self.board.is_empty(r, c):
             return False, "Cell is occupied."
 
-        unit_class = PLAYER_UNIT_SPECS[unit_name_to_place]["class"]
-        unit_instance = unit_class(position=(r,c))
-        self.grid_units[r][c] = unit_instance
+        self.board.place(r, c, UNIT_TYPE_CODES[unit_name_to_place])
         self.player_current_accumulation[unit_name_to_place] -= 1
         self.units_placed_this_round_count += 1
-        self.action_log.append(f"Placed {unit_instance.name} at ({r},{c}). Stock: {self.player_current_accumulation[unit_name_to_place]}. Placed: {self.units_placed_this_round_count}.")
-        return True, f"Placed {unit_instance.name}."
+        if self.events.active:
+            self.events.emit(UnitPlaced(unit_name_to_place, r, c, self.player_current_accumulation[unit_name_to_place],
+                                        self.units_placed_this_round_count))
+        return True, f"Placed {unit_name_to_place}."
 
     def end_placement_phase(self):
-        self.action_log.append("Placement phase ended.")
+        if self.events.active: self.events.emit(PlacementEnded())
         return self.process_player_attack()
 
     def process_player_attack(self):
         self.game_phase = "PLAYER_ATTACK"
-        total_player_damage = 0
-        current_log = ["Player attacks:"]
+        events = self.events
+        if events.active: events.emit(PlayerAttackStarted())
 
-        active_units = any(self.grid_units[r][c] for r in range(self.grid_size) for c in range(self.grid_size))
+        board = self.board
+        active_units = board.unit_count() > 0
         if not active_units and self.current_round > 0 :
-            current_log.append("No player units on board to attack.")
-            self.action_log.extend(current_log)
+            if events.active: events.emit(NoPlayerUnits())
             self.game_phase = "BOSS_ATTACK"
-            next_state_dict = get_game_state_for_q_table(self)
+            next_state_dict = self._state_dict()
             return "boss_turn", "No player units. Boss's turn.", 0, next_state_dict, 0, False
 
-        for r_idx in range(self.grid_size):
-            for c_idx in range(self.grid_size):
-                unit = self.grid_units[r_idx][c_idx]
-                if unit and unit.attack_power > 0:
-                    total_player_damage += unit.attack_power
-                    current_log.append(f"- {unit.name} ({r_idx},{c_idx}) deals {unit.attack_power} damage.")
+        if events.active:
+            for r_idx, c_idx in board.occupied_positions():
+                code = board.type_at(r_idx, c_idx)
+                attack_power = UNIT_CODE_ATTACK[code]
+                if attack_power > 0:
+                    events.emit(UnitAttacked(UNIT_CODE_NAMES[code], r_idx, c_idx, attack_power))
+        total_player_damage = board.total_attack() # Kept up to date by the board's indexes
         
         boss_died = False
         if total_player_damage > 0:
             boss_died = self.boss.take_damage(total_player_damage)
-            current_log.append(f"Boss takes {total_player_damage} total. HP: {self.boss.current_hp}")
+            if events.active: events.emit(BossDamaged(total_player_damage, self.boss.current_hp))
         elif active_units:
-            current_log.append("Player units dealt no damage.")
+            if events.active: events.emit(NoPlayerDamage())
 
-        self.action_log.extend(current_log)
         # This reward is for the overall state after player attack, reflecting damage taken by boss
         reward_for_boss = -(total_player_damage * 1.0) # Adjusted penalty
 
@@ -112,51 +218,63 @@ class GameLogic:
         message = "Boss's turn."
 
         if boss_died:
-            self.action_log.append("Boss Defeated!")
+            if events.active: events.emit(BossDefeated())
             self.game_phase = "GAME_OVER"
             reward_for_boss += -100 # Keep this strong negative for boss being defeated
             done = True
             status_code = "game_over_boss_defeated"
             message = "Boss Defeated!"
         
-        next_state_dict = get_game_state_for_q_table(self)
+        next_state_dict = self._state_dict()
         if not done: self.game_phase = "BOSS_ATTACK"
         return status_code, message, total_player_damage, next_state_dict, reward_for_boss, done
 
-    def process_boss_attack(self): 
+    def process_boss_attack(self, forced_action_idx=None, forced_action=None):
+        # forced_action_idx lets an external controller (e.g. headless_training.BossAssaultEnv.step)
+        # pick the agent's skill index; targets are still chosen by the agent's heuristic.
+        # forced_action=(skill_key, params) bypasses the agent entirely (search rollouts); the
+        # caller must pass a skill that is currently available.
         self.game_phase = "BOSS_ATTACK"
-        current_log = ["Boss's turn:"]
+        events = self.events
+        if events.active: events.emit(BossTurnStarted())
         animation_triggers = []
         self.units_destroyed_this_round_by_boss = 0
         reward_for_boss_action = 0 # This reward is for actions taken by the boss in *this* phase
 
-        current_state_dict_for_agent = get_game_state_for_q_table(self)
-        chosen_skill_key, skill_params_val, action_idx = self.boss.choose_action_by_agent(current_state_dict_for_agent, self.grid_units)
+        board = self.board
+        current_state_dict_for_agent = self._state_dict()
+        # The agent reads its observation straight from the game, not from the dict
+        if forced_action is not None:
+            chosen_skill_key, skill_params_val = forced_action
+            action_idx = BOSS_SKILL_INDEX[chosen_skill_key]
+            self.boss.last_skill_message = f"Boss uses {self.boss.skills[chosen_skill_key]['name']}."
+        else:
+            state_vector = self._decision_writer.write(self) if self.boss.agent else None
+            chosen_skill_key, skill_params_val, action_idx = self.boss.choose_action_by_agent(current_state_dict_for_agent, board, forced_action_idx, state_vector)
         
         if action_idx is None and self.boss.agent is not None:
             pass
 
         if not chosen_skill_key:
-            current_log.append(self.boss.last_skill_message or "Boss does nothing (no skill chosen or available).")
-            self.action_log.extend(current_log)
-            next_s_dict = get_game_state_for_q_table(self)
+            if events.active: events.emit(BossAction(None, self.boss.last_skill_message or "Boss does nothing (no skill chosen or available)."))
+            next_s_dict = self._state_dict()
             done = self.check_game_over_conditions_for_done()
             reward_for_boss_action += 0 # No reward if boss does nothing or chooses invalid skill
             if done and self.boss.current_hp > 0 and self.current_round >= self.max_rounds: reward_for_boss_action += 150 # Reward if boss wins by round limit
             if not done: self.game_phase="ROUND_END"
             return "round_end", self.boss.last_skill_message or "Boss nothing.", [], next_s_dict, reward_for_boss_action, done, current_state_dict_for_agent, action_idx
 
+        hp_before_skill = self.boss.current_hp
         if not self.boss.apply_skill_effect_and_cd(chosen_skill_key):
-            current_log.append(self.boss.last_skill_message)
-            self.action_log.extend(current_log)
-            next_s_dict = get_game_state_for_q_table(self)
+            if events.active: events.emit(BossAction(chosen_skill_key, self.boss.last_skill_message))
+            next_s_dict = self._state_dict()
             done = self.check_game_over_conditions_for_done()
             reward_for_boss_action += -2 # Penalty for choosing a skill that can't be used (e.g., not enough rage for ult)
             if done and self.boss.current_hp > 0 and self.current_round >= self.max_rounds: reward_for_boss_action += 150
             if not done: self.game_phase="ROUND_END"
             return "round_end", self.boss.last_skill_message, [], next_s_dict, reward_for_boss_action, done, current_state_dict_for_agent, action_idx
 
-        current_log.append(self.boss.last_skill_message)
+        if events.active: events.emit(BossAction(chosen_skill_key, self.boss.last_skill_message))
         skill_info = self.boss.skills[chosen_skill_key]
         damage_per_hit_instance = skill_info.get("damage", 0)
         is_unblockable = skill_info.get("unblockable", False)
@@ -164,16 +282,14 @@ class GameLogic:
         
         if chosen_skill_key == "normal_attack":
             if skill_params_val and skill_params_val[0][0] < self.grid_size and skill_params_val[0][1] < self.grid_size and \
-               self.grid_units[skill_params_val[0][0]][skill_params_val[0][1]]:
+               not board.is_empty(skill_params_val[0][0], skill_params_val[0][1]):
                 r,c = skill_params_val[0]
-                unit = self.grid_units[r][c]
-                unit_name = unit.name
-                current_log.append(f"- Attacks {unit.name} at ({r},{c}) for {damage_per_hit_instance} damage.")
-                if unit.take_damage(damage_per_hit_instance): 
+                unit_name = board.name_at(r, c)
+                if events.active: events.emit(UnitHit(chosen_skill_key, unit_name, r, c, damage_per_hit_instance))
+                if board.damage(r, c, damage_per_hit_instance):
                     reward_for_boss_action += self.get_kill_reward(unit_name)
-                    self.grid_units[r][c] = None
                     self.units_destroyed_this_round_by_boss+=1
-                    current_log.append(f"  - {unit.name} destroyed!")
+                    if events.active: events.emit(UnitDestroyed(chosen_skill_key, unit_name, r, c))
                 else:
                     reward_for_boss_action += (damage_per_hit_instance * 1.5)
                 actual_hit_coords_for_animation.append((r,c))
@@ -184,95 +300,99 @@ class GameLogic:
                 animation_triggers.append({"type": "normal_attack", "targets": actual_hit_coords_for_animation})
         
         elif chosen_skill_key == "horizontal_shot" or chosen_skill_key == "vertical_shot":
-            SHOT_INSTANCES = 4
-            damage_instances_left = SHOT_INSTANCES
+            shot_charges = skill_info["charges"]
             
             line_idx = skill_params_val.get("line_idx", 0)
             direction = skill_params_val.get("direction", None)
             
-            line_coords_ordered = []
             anim_type = chosen_skill_key
 
-            if chosen_skill_key == "horizontal_shot":
-                current_log.append(f"- Bắn Ngang (4 charges) on row {line_idx} dir {direction}:")
-                if direction == "rtl":
-                    for c_idx in range(self.grid_size - 1, -1, -1): line_coords_ordered.append((line_idx, c_idx))
-                else:
-                    for c_idx in range(self.grid_size): line_coords_ordered.append((line_idx, c_idx))
+            if events.active:
+                events.emit(LineShotStarted(chosen_skill_key, skill_info["name"], line_idx, direction, shot_charges))
+
+            # Without event subscribers the whole shot is one lookup in the precomputed line table
+            # (boards up to line_tables.MAX_TABLE_LENGTH); the charge-by-charge loop below is the
+            # reference, emits the per-charge events and handles larger boards.
+            table = None if events.active or is_unblockable else line_shot_table(self.grid_size, shot_charges, damage_per_hit_instance)
+            if table is not None:
+                line_coords_ordered, line_cells = self._shot_line(chosen_skill_key, line_idx, direction)
+                shot_reward, shot_kills, shot_hits = table.entries[table.pattern(board.types, board.hp, line_cells)]
+                for k, damage_dealt, _killed in shot_hits:
+                    r, c = line_coords_ordered[k]
+                    board.damage(r, c, damage_dealt)
+                    actual_hit_coords_for_animation.append((r, c))
+                reward_for_boss_action += shot_reward
+                self.units_destroyed_this_round_by_boss += shot_kills
             else:
-                current_log.append(f"- Bắn Dọc (4 charges) on column {line_idx} dir {direction}:")
-                if direction == "btt":
-                    for r_idx in range(self.grid_size - 1, -1, -1): line_coords_ordered.append((r_idx, line_idx))
-                else:
-                    for r_idx in range(self.grid_size): line_coords_ordered.append((r_idx, line_idx))
-
-            hit_at_least_one_target_in_line = False
-            for r, c in line_coords_ordered:
-                if damage_instances_left <= 0: break
-                unit_in_cell = self.grid_units[r][c]
-                if unit_in_cell:
-                    hit_at_least_one_target_in_line = True
-                    actual_hit_coords_for_animation.append((r,c))
+                damage_instances_left = shot_charges
+                hit_at_least_one_target_in_line = False
+                tank_code = UNIT_TYPE_CODES["Tank"]
+                # Charges only ever stop on units, so only the line's occupied cells are visited
+                line_units = board.line_positions(line_idx, vertical=chosen_skill_key == "vertical_shot",
+                                                  reverse=direction in ("rtl", "btt"))
+                for r, c in line_units:
+                    if damage_instances_left <= 0: break
+                    code_in_cell = board.type_at(r, c)
+                    if code_in_cell:
+                        hit_at_least_one_target_in_line = True
+                        actual_hit_coords_for_animation.append((r,c))
+                        unit_name_hit = UNIT_CODE_NAMES[code_in_cell]
                     
-                    if isinstance(unit_in_cell, Tank) and not is_unblockable:
-                        current_log.append(f"  - Beam reaches Tank {unit_in_cell.name} at ({r},{c}). HP: {unit_in_cell.current_hp}")
-                        hits_on_tank = 0
-                        while damage_instances_left > 0 and unit_in_cell.current_hp > 0:
-                            current_log.append(f"    - Tank takes 1 hit from charge. ({damage_instances_left-1} charges left)")
-                            unit_in_cell.take_damage(damage_per_hit_instance)
-                            reward_for_boss_action += (damage_per_hit_instance * 1.5)
-                            damage_instances_left -= 1
-                            hits_on_tank += 1
-                            if unit_in_cell.current_hp <= 0:
-                                current_log.append(f"    - Tank {unit_in_cell.name} destroyed after {hits_on_tank} hits!")
-                                reward_for_boss_action += self.get_kill_reward(unit_in_cell.name)
-                                self.grid_units[r][c] = None
+                        if code_in_cell == tank_code and not is_unblockable:
+                            if events.active: events.emit(BeamBlocked(unit_name_hit, r, c, board.hp_at(r, c)))
+                            hits_on_tank = 0
+                            tank_destroyed = False
+                            while damage_instances_left > 0:
+                                if events.active: events.emit(ShotChargeConsumed(unit_name_hit, r, c, damage_instances_left-1, True))
+                                tank_destroyed = board.damage(r, c, damage_per_hit_instance)
+                                reward_for_boss_action += (damage_per_hit_instance * 1.5)
+                                damage_instances_left -= 1
+                                hits_on_tank += 1
+                                if tank_destroyed:
+                                    if events.active: events.emit(UnitDestroyed(chosen_skill_key, unit_name_hit, r, c, hits_on_tank))
+                                    reward_for_boss_action += self.get_kill_reward(unit_name_hit)
+                                    self.units_destroyed_this_round_by_boss += 1
+                                    break
+                            if not tank_destroyed:
+                                if events.active: events.emit(UnitSurvived(unit_name_hit, r, c, True))
+                                damage_instances_left = 0                             
+                        else:
+                            if events.active: events.emit(ShotChargeConsumed(unit_name_hit, r, c, damage_instances_left-1, False))
+                            if board.damage(r, c, damage_per_hit_instance):
+                                reward_for_boss_action += self.get_kill_reward(unit_name_hit)
                                 self.units_destroyed_this_round_by_boss += 1
-                                break
-                        if unit_in_cell and unit_in_cell.current_hp > 0: 
-                            current_log.append(f"    - Tank {unit_in_cell.name} survives. Skill exhausted on Tank.")
-                            damage_instances_left = 0                             
-                    else:
-                        current_log.append(f"  - Beam hits {unit_in_cell.name} at ({r},{c}) for 1 charge.")
-                        unit_name_hit = unit_in_cell.name
-                        if unit_in_cell.take_damage(damage_per_hit_instance):
-                            reward_for_boss_action += self.get_kill_reward(unit_name_hit)
-                            self.grid_units[r][c] = None
-                            self.units_destroyed_this_round_by_boss += 1
-                            current_log.append(f"    - {unit_name_hit} destroyed!")
-                        else: 
-                            reward_for_boss_action += (damage_per_hit_instance * 1.5)
-                            current_log.append(f"    - {unit_name_hit} survives. Beam continues...")
-                        damage_instances_left -=1 
+                                if events.active: events.emit(UnitDestroyed(chosen_skill_key, unit_name_hit, r, c))
+                            else: 
+                                reward_for_boss_action += (damage_per_hit_instance * 1.5)
+                                if events.active: events.emit(UnitSurvived(unit_name_hit, r, c, False))
+                            damage_instances_left -=1 
             
-            if not hit_at_least_one_target_in_line:
-                reward_for_boss_action -= 3 # Stronger penalty for completely missing line shot
+                if not hit_at_least_one_target_in_line:
+                    reward_for_boss_action -= 3 # Stronger penalty for completely missing line shot
             
             if actual_hit_coords_for_animation: 
                 animation_triggers.append({"type": anim_type, "targets": actual_hit_coords_for_animation})
 
 
         elif chosen_skill_key == "ultimate":
-            current_log.append(f"- Ultimate strikes {len(skill_params_val)} locations:")
+            if events.active: events.emit(UltimateStarted(len(skill_params_val)))
             targets_hit_ulti = []
             unique_params = list(set(skill_params_val))
             units_hit_by_ulti_count = 0
             for r_target, c_target in unique_params:
-                unit = self.grid_units[r_target][c_target]
                 targets_hit_ulti.append((r_target,c_target))
-                if unit:
+                if not board.is_empty(r_target, c_target):
                     units_hit_by_ulti_count +=1
-                    unit_name_hit = unit.name
-                    current_log.append(f"  - Hits ({r_target},{c_target}) by {unit.name} for {damage_per_hit_instance} damage.")
-                    if unit.take_damage(damage_per_hit_instance): 
+                    unit_name_hit = board.name_at(r_target, c_target)
+                    if events.active: events.emit(UnitHit(chosen_skill_key, unit_name_hit, r_target, c_target, damage_per_hit_instance))
+                    if board.damage(r_target, c_target, damage_per_hit_instance):
                         reward_for_boss_action += self.get_kill_reward(unit_name_hit)
-                        self.grid_units[r_target][c_target]=None
                         self.units_destroyed_this_round_by_boss+=1
-                        current_log.append(f"    - {unit.name} destroyed!")
+                        if events.active: events.emit(UnitDestroyed(chosen_skill_key, unit_name_hit, r_target, c_target))
                     else:
                         reward_for_boss_action += (damage_per_hit_instance * 1.5)
                 else:
-                    current_log.append(f"  - Hits empty ({r_target},{c_target}).")
+                    if events.active: events.emit(EmptyCellHit(r_target, c_target))
             
             if units_hit_by_ulti_count == 0 and len(unique_params)>0:
                 reward_for_boss_action -= 5 # Stronger penalty if ultimate hits no units
@@ -283,22 +403,21 @@ class GameLogic:
                 animation_triggers.append({"type": "ultimate_hit", "targets": targets_hit_ulti})
         
         elif chosen_skill_key == "heal":
+            if events.active: events.emit(BossHealed(self.boss.current_hp - hp_before_skill, self.boss.current_hp))
             if self.boss.current_hp < self.boss.max_hp * 0.3 : reward_for_boss_action += 10 # Stronger reward for low HP heal
             elif self.boss.current_hp < self.boss.max_hp * 0.6: reward_for_boss_action += 5 # Stronger reward for medium HP heal
             elif self.boss.current_hp > self.boss.max_hp * 0.9: reward_for_boss_action -= 5 # Stronger penalty for high HP heal
             else: reward_for_boss_action += 1 # Small reward for reasonable heal
             animation_triggers.append({"type": "boss_heal"})
         
-        self.action_log.extend(current_log)
-        
-        next_state_dict_for_agent = get_game_state_for_q_table(self)
+        next_state_dict_for_agent = self._state_dict()
         done = False
         status_ui = "round_end"
         msg_ui = "Boss turn finished."
 
-        player_units_left = any(self.grid_units[r][c] for r in range(self.grid_size) for c in range(self.grid_size))
+        player_units_left = board.unit_count() > 0
         if not player_units_left and self.units_destroyed_this_round_by_boss > 0:
-            self.action_log.append("All player units destroyed by Boss this round!")
+            if events.active: events.emit(PlayerWiped())
             reward_for_boss_action += 150 # Huge positive reward for wiping out player board
             done = True
             self.game_phase = "GAME_OVER"
@@ -322,11 +441,29 @@ class GameLogic:
 
         return status_ui, msg_ui, animation_triggers, next_state_dict_for_agent, reward_for_boss_action, done, current_state_dict_for_agent, action_idx
 
+    def _shot_line(self, skill_key, line_idx, direction):
+        """(coords, flat cells) of a line shot in the order the charges travel (cached)."""
+        key = (skill_key, line_idx, direction)
+        line = self._shot_lines.get(key)
+        if line is None:
+            line_coords_ordered = []
+            if skill_key == "horizontal_shot":
+                if direction == "rtl":
+                    for c_idx in range(self.grid_size - 1, -1, -1): line_coords_ordered.append((line_idx, c_idx))
+                else:
+                    for c_idx in range(self.grid_size): line_coords_ordered.append((line_idx, c_idx))
+            else:
+                if direction == "btt":
+                    for r_idx in range(self.grid_size - 1, -1, -1): line_coords_ordered.append((r_idx, line_idx))
+                else:
+                    for r_idx in range(self.grid_size): line_coords_ordered.append((r_idx, line_idx))
+            line = (line_coords_ordered, [r * self.grid_size + c for r, c in line_coords_ordered])
+            self._shot_lines[key] = line
+        return line
+
     def get_kill_reward(self, unit_name):
-        if unit_name == "AD": return 7
-        if unit_name == "Knight": return 4
-        if unit_name == "Tank": return 3
-        return 0
+        spec = PLAYER_UNIT_SPECS.get(unit_name)
+        return spec["kill_reward"] if spec else 0
 
     def check_game_over_conditions_for_done(self):
         if self.current_round >= self.max_rounds and self.boss.current_hp > 0: return True
@@ -344,19 +481,19 @@ class GameLogic:
 
     def proceed_to_next_round(self):
         is_over, msg = self.check_game_over_conditions()
-        current_state_dict = get_game_state_for_q_table(self)
+        current_state_dict = self._state_dict()
         if is_over:
-            self.action_log.append(msg)
+            if self.events.active: self.events.emit(GameOver(msg))
             return "game_over", msg, current_state_dict
         
         if self.current_round >= self.max_rounds and self.boss.current_hp > 0:
             self.game_phase = "GAME_OVER"
             final_msg = f"Game Over: Boss survived {self.max_rounds} rounds!"
-            self.action_log.append(final_msg)
+            if self.events.active: self.events.emit(GameOver(final_msg))
             return "game_over", final_msg, current_state_dict
 
         self._setup_new_round()
-        return "new_round_placement", f"Starting Round {self.current_round}. Place units.", get_game_state_for_q_table(self)
+        return "new_round_placement", f"Starting Round {self.current_round}. Place units.", self._state_dict()
 
     def get_action_log(self, tail=0):
         if tail > 0 and len(self.action_log) > tail:
@@ -0,0 +1,477 @@
+# headless_training.py
+"""
+GUI-free training environment for the DQN boss.
+
+BossAssaultEnv wraps GameLogic with a reset()/step() API and its own automated player,
+so training no longer needs a TacticsGridWindow or a QApplication. The window can still be
+attached as an optional viewer (see WindowViewer / --viewer).
+
+Usage:
+    python headless_training.py --episodes 200000
+    python headless_training.py --episodes 2000 --viewer   # watch progress in the Qt window
+"""
+import os
+import sys
+import time
+import csv
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from game_logic import GameLogic
+from state_encoding import OBS_DIM, ObservationWriter, REPLAY_STORAGE_MODES
+from seeding import spawn, episode_seed
+from policy_inference import POLICY_WEIGHTS_FILE
+
+# --- Headless training configuration (mirrors main.py) ---
+NUM_EPISODES_TO_TRAIN = 200000
+SAVE_AGENT_EVERY_N_EPISODES = 5000
+MODEL_DIR = "Model"
+AGENT_MODEL_FILE = os.path.join(MODEL_DIR, "dqn_boss_agent.pth")
+LOG_STATS_EVERY_N_EPISODES = 500
+TRAINING_STATS_FILE = os.path.join(MODEL_DIR, "training_stats.csv")
+TRAINING_STATE_FILE = os.path.join(MODEL_DIR, "training_state.pth") # Resumable run (training_state.py)
+CHECKPOINT_DIR = os.path.join(MODEL_DIR, "checkpoints") # Periodic checkpoints (checkpoint_store.py)
+
+
+class RandomPlacementPlayer:
+    """
+    Automated player: places random unit types from stock onto random empty cells.
+    Same policy as TacticsGridWindow.execute_player_turn_for_training, without any UI.
+    Random draws come from game.rng, so a seeded game also seeds its player.
+    """
+    def place_units(self, game):
+        game.game_phase = "PLACEMENT" # Ensure game state is correct for internal logic
+        rng = game.rng
+
+        num_to_place = game.get_max_units_to_place_this_round()
+        placed_count = 0
+
+        # Filter available unit types (those with stock) and shuffle them
+        available_types = [utype for utype, count in game.player_current_accumulation.items() if count > 0]
+        rng.shuffle(available_types)
+
+        for _ in range(num_to_place):
+            if not game.can_place_more_units_this_round() or not available_types:
+                break # Stop if placement limit reached or no units left to place
+
+            unit_type = rng.choice(available_types)
+
+            if game.player_current_accumulation[unit_type] > 0:
+                empty_cell = game.board.random_empty_position(rng) # Sampled, not listed, on large boards
+                if empty_cell is not None:
+                    r_place, c_place = empty_cell
+                    success, _ = game.place_unit_from_stock(unit_type, r_place, c_place)
+                    if success:
+                        placed_count += 1
+                        if game.player_current_accumulation[unit_type] == 0 and unit_type in available_types:
+                            available_types.remove(unit_type)
+
+            # Refresh available types from stock if we ran out but still may place units
+            if not available_types and placed_count < num_to_place:
+                available_types = [utype for utype, count in game.player_current_accumulation.items() if count > 0]
+                if not available_types: break
+                rng.shuffle(available_types)
+        return placed_count
+
+
+class BossAssaultEnv:
+    """
+    Single-board environment seen from the boss's side.
+
+    reset() starts a game and plays the first player phase; the returned state dict is the
+    one the boss decides on. step() runs one boss turn, then (if the game continues) the
+    next round's player phase, and returns the boss transition:
+        next_state_dict, reward, done, info
+    next_state_dict / reward / done are exactly what run_training_loop feeds to agent.learn
+    (the state right after the boss attack). info["state"] is the state the boss acted on,
+    info["action_idx"] the action taken. Use env.done to know whether the episode is over
+    (the player can still defeat the boss during the following player phase).
+
+    Every step also encodes both observations of the transition into env.observations
+    (row 0: state acted on, row 1: state after the boss attack). With state_dicts=False the
+    game builds no state dicts at all and those rows are the only state output.
+
+    The text action log is off by default (action_log=True turns it on); subscribe to
+    env.game.events to consume the typed game events instead.
+
+    seed (int or SeedSequence) gives the game, its player and the agent their own random
+    streams (see seeding.py); reset(seed=...) reseeds them for one episode. Unseeded envs use
+    the global random state.
+    """
+    def __init__(self, agent=None, player=None, max_rounds=9, state_dicts=True, action_log=False, grid_size=4,
+                 seed=None):
+        self.agent = agent
+        self.game = GameLogic(grid_size=grid_size, max_rounds=max_rounds, agent_instance=agent,
+                              state_dicts=state_dicts, action_log=action_log)
+        if seed is not None:
+            self.seed(seed)
+        if agent and not agent.boss_skills_ref:
+            agent.boss_skills_ref = self.game.boss.skills
+        self.player = player if player is not None else RandomPlacementPlayer()
+        self.state = None # State dict for the boss's next decision
+        self.done = True
+        self.boss_won = None
+        self.episode_reward = 0
+        self.observations = np.zeros((2, OBS_DIM), dtype=np.float32)
+        self._obs_writer = ObservationWriter(self.observations)
+
+    def observe(self, out=None, row=None):
+        """Encodes the current game state (the boss's next decision) into out / out[row]."""
+        if out is None:
+            out = np.empty(OBS_DIM, dtype=np.float32)
+        ObservationWriter(out).write(self.game, 0 if row is None else row)
+        return out
+
+    def seed(self, seed):
+        """Reseeds the game (and player) stream and, if it supports reseed(), the agent's."""
+        game_seed, agent_seed = spawn(seed, 2)
+        self.game.reseed(game_seed)
+        if hasattr(self.agent, "reseed"):
+            self.agent.reseed(agent_seed)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed(seed)
+        self.game.start_new_game()
+        self.episode_reward = 0
+        self.boss_won = None
+        self.done = False
+        self._run_player_phase()
+        return self.state
+
+    def _run_player_phase(self):
+        self.player.place_units(self.game)
+        _status, _msg, _dmg, state_dict, reward, done = self.game.end_placement_phase()
+        self.episode_reward += reward
+        self.state = state_dict
+        if done: # Player defeated the boss during their attack phase
+            self._finish_episode()
+        return reward
+
+    def _finish_episode(self):
+        self.done = True
+        self.game.check_game_over_conditions() # Sets GAME_OVER phase on round limit / boss death
+        # Boss wins if it is still alive once the game is over (round limit or player wiped)
+        self.boss_won = self.game.boss.current_hp > 0
+
+    def step(self, action_idx=None):
+        """Runs one boss decision. action_idx=None lets the attached agent choose."""
+        if self.done:
+            raise RuntimeError("Episode is over; call reset() before step().")
+
+        self._obs_writer.write(self.game, 0)
+        results = self.game.process_boss_attack(action_idx)
+        self._obs_writer.write(self.game, 1)
+        status_code, _msg, _anim, next_state_dict, reward, done, state_acted_on, action_idx_taken = results
+        self.episode_reward += reward
+        info = {"state": state_acted_on, "action_idx": action_idx_taken,
+                "status": status_code, "player_reward": 0}
+
+        if done:
+            self._finish_episode()
+        else:
+            status_nr, _msg_nr, state_new_round = self.game.proceed_to_next_round()
+            # Like run_training_loop, re-check game over at the start of the new round: reaching
+            # the last round with the boss alive ends the episode before it is played.
+            if status_nr == "game_over" or self.game.check_game_over_conditions()[0]:
+                self.state = state_new_round
+                self._finish_episode()
+            else:
+                info["player_reward"] = self._run_player_phase()
+        return next_state_dict, reward, done, info
+
+
+class WindowViewer:
+    """Optional Qt viewer: mirrors the env's game into a TacticsGridWindow every few episodes."""
+    def __init__(self, env, refresh_every_n_episodes=50):
+        from PyQt5.QtWidgets import QApplication # Imported lazily: training never needs Qt
+        import main as gui
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        self.window = gui.TacticsGridWindow(agent_to_use=env.agent)
+        self.window.game = env.game # View the live headless game instead of the window's own
+        env.game.set_action_log(True) # The window shows the action log
+        self.window.is_fast_mode_training = True
+        self.window.show()
+        self.refresh_every_n_episodes = max(1, refresh_every_n_episodes)
+
+    def on_episode_end(self, episode, num_episodes, env):
+        if episode % self.refresh_every_n_episodes != 0:
+            return
+        self.window.current_episode_count = episode
+        self.window.update_all_ui_displays()
+        if hasattr(self.window, 'episode_label'):
+            self.window.episode_label.setText(f"Episode: {episode}/{num_episodes} | R: {env.game.current_round}")
+        self.app.processEvents()
+
+
+def _play_seeded_episodes(job):
+    """Worker body of run_seeded_rollouts: plays the given episode indexes of one seeded run."""
+    seed, episode_indexes, agent_factory, env_kwargs = job
+    env = BossAssaultEnv(agent=agent_factory() if agent_factory else None, state_dicts=False, **env_kwargs)
+    results = []
+    for index in episode_indexes:
+        env.reset(seed=episode_seed(seed, index))
+        steps = 0
+        while not env.done:
+            env.step()
+            steps += 1
+        results.append((env.episode_reward, bool(env.boss_won), steps))
+    return results
+
+
+def run_seeded_rollouts(num_episodes, seed, workers=1, agent_factory=None, **env_kwargs):
+    """
+    Plays num_episodes evaluation episodes (no learning) and returns (episode_reward,
+    boss_won, steps) per episode, in episode order. Episode i is seeded with
+    seeding.episode_seed(seed, i) and every worker process builds its own env and agent with
+    agent_factory (a picklable callable; None plays the fallback boss), so the results are
+    bit-identical for any number of workers.
+    """
+    workers = max(1, min(workers, num_episodes))
+    chunks = [list(range(num_episodes))[w::workers] for w in range(workers)]
+    jobs = [(seed, chunk, agent_factory, env_kwargs) for chunk in chunks]
+    if workers == 1:
+        chunk_results = [_play_seeded_episodes(jobs[0])]
+    else:
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            chunk_results = pool.map(_play_seeded_episodes, jobs)
+    results = [None] * num_episodes
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        for index, result in zip(chunk, chunk_result):
+            results[index] = result
+    return results
+
+
+class TrainingStatsLog:
+    """
+    Training statistics of run_training_loop: every log_every episodes, the average reward and
+    boss win rate over the last log_every episodes are printed and appended to the stats CSV.
+    echo (e.g. the window's log_message) also receives each printed line.
+    """
+    def __init__(self, stats_file=TRAINING_STATS_FILE, log_every=LOG_STATS_EVERY_N_EPISODES, verbose=True, echo=None):
+        self.stats_file = stats_file
+        self.log_every = log_every
+        self.verbose = verbose
+        self.echo = echo
+        self.episode = 0 # Finished episodes, including those before a resume
+        self.episode_rewards = [] # This session's episodes
+        self.boss_win_flags = []
+        self.recent_rewards = [] # Last log_every episodes (carried over by state_dict on resume)
+        self.recent_outcomes = [] # 1 for boss win, 0 for player win
+        self._csvfile = None
+        self._csv_writer = None
+        self._open_csv()
+
+    def _open_csv(self):
+        if self.stats_file:
+            file_exists = os.path.isfile(self.stats_file)
+            self._csvfile = open(self.stats_file, 'a', newline='')
+            self._csv_writer = csv.writer(self._csvfile)
+            if not file_exists:
+                self._csv_writer.writerow(['Episode', 'AvgReward', 'WinRate_Boss', 'Epsilon'])
+
+    def record(self, episode_reward, boss_won, epsilon, num_episodes):
+        """Records one finished episode; returns its 1-based episode number."""
+        self.episode += 1
+        self.episode_rewards.append(episode_reward)
+        self.boss_win_flags.append(1 if boss_won else 0)
+        self.recent_rewards.append(episode_reward)
+        self.recent_outcomes.append(1 if boss_won else 0)
+        if len(self.recent_outcomes) > self.log_every:
+            self.recent_rewards.pop(0)
+            self.recent_outcomes.pop(0)
+
+        episode = self.episode
+        if episode % self.log_every == 0:
+            log_every = self.log_every
+            avg_reward = sum(self.recent_rewards) / len(self.recent_rewards)
+            win_rate_boss = sum(self.recent_outcomes) / len(self.recent_outcomes) * 100 if self.recent_outcomes else 0
+            log_str = f"Ep {episode}/{num_episodes}. Avg Reward (last {log_every}): {avg_reward:.2f}. Win Rate (Boss): {win_rate_boss:.1f}%. Epsilon: {epsilon:.4f}"
+            if self.verbose:
+                print(log_str)
+            if self.echo:
+                self.echo(log_str)
+            if self._csv_writer:
+                self._csv_writer.writerow([episode, f"{avg_reward:.2f}", f"{win_rate_boss:.1f}", f"{epsilon:.4f}"])
+                self._csvfile.flush()
+        return episode
+
+    def summary(self):
+        """Average reward and boss win rate over the last log_every episodes (for checkpoint manifests)."""
+        if not self.recent_rewards:
+            return {"episode": self.episode}
+        return {"episode": self.episode, "avg_reward": round(sum(self.recent_rewards) / len(self.recent_rewards), 2),
+                "win_rate_boss": round(sum(self.recent_outcomes) / len(self.recent_outcomes) * 100, 1)}
+
+    def state_dict(self):
+        return {"episode": self.episode, "recent_rewards": list(self.recent_rewards),
+                "recent_outcomes": list(self.recent_outcomes)}
+
+    def load_state_dict(self, state):
+        """
+        Continues after state["episode"]. CSV rows logged after that episode (by a run that
+        stopped before its next training-state save) are dropped, so no episode appears twice.
+        """
+        self.episode = state["episode"]
+        self.recent_rewards = list(state["recent_rewards"])
+        self.recent_outcomes = list(state["recent_outcomes"])
+        if self._csvfile:
+            self._csvfile.close()
+            with open(self.stats_file, newline='') as csvfile:
+                rows = list(csv.reader(csvfile))
+            kept = rows[:1] + [row for row in rows[1:] if row and int(row[0]) <= self.episode]
+            if len(kept) < len(rows):
+                tmp_path = self.stats_file + ".tmp"
+                with open(tmp_path, 'w', newline='') as csvfile:
+                    csv.writer(csvfile).writerows(kept)
+                os.replace(tmp_path, self.stats_file)
+            self._open_csv()
+
+    def close(self):
+        if self._csvfile:
+            self._csvfile.close()
+            self._csvfile = None
+
+
+def run_headless_training(agent, num_episodes, env=None, viewer=None,
+                          stats_file=TRAINING_STATS_FILE, save_every=SAVE_AGENT_EVERY_N_EPISODES,
+                          log_every=LOG_STATS_EVERY_N_EPISODES, model_dir=MODEL_DIR,
+                          final_model_file=AGENT_MODEL_FILE, verbose=True, state_file=None,
+                          state_every=None, resume=False, trajectory_writer=None, checkpoints=None,
+                          policy_file=POLICY_WEIGHTS_FILE):
+    """
+    Headless equivalent of main.run_training_loop: same transitions, rewards, stats CSV and
+    checkpoints, but no window, no processEvents() and no label updates in the hot loop.
+    With state_file, the training state is saved every state_every episodes and at the end
+    (see training_state.py); with resume as well, the run first continues from that file if
+    it exists, and num_episodes counts from the start of the original run.
+    With a trajectory_writer (trajectory_store.TrajectoryWriter), every transition is also
+    stored on disk for offline training. With checkpoints (checkpoint_store.CheckpointStore),
+    the periodic checkpoints are saved there in the background instead of as .pth files.
+    The final model is also exported to policy_file for torch-free play (None: not exported).
+    Returns this session's (episode_rewards, boss_win_flags).
+    """
+    env = env if env is not None else BossAssaultEnv(agent=agent, state_dicts=False)
+    observations = env.observations
+    stats = TrainingStatsLog(stats_file, log_every, verbose)
+    start_episode = 0
+    if state_file:
+        from training_state import load_training_state, save_training_state, SAVE_TRAINING_STATE_EVERY_N_EPISODES
+        state_every = state_every or SAVE_TRAINING_STATE_EVERY_N_EPISODES
+        if resume:
+            start_episode = load_training_state(state_file, agent, stats, env.game)
+
+    try:
+        for e in range(start_episode, num_episodes):
+            env.reset()
+            while not env.done:
+                _next_state_dict, reward, done, info = env.step()
+                if info["action_idx"] is not None:
+                    # Observations were encoded by the env; copy them because the replay buffer keeps them
+                    agent.learn(observations[0].copy(), info["action_idx"], reward, observations[1].copy(), done)
+                    if trajectory_writer is not None:
+                        trajectory_writer.add(observations[0], info["action_idx"], reward, observations[1], done)
+            if trajectory_writer is not None:
+                trajectory_writer.end_episode()
+
+            stats.record(env.episode_reward, env.boss_won, agent.epsilon, num_episodes)
+
+            if viewer is not None:
+                viewer.on_episode_end(e + 1, num_episodes, env)
+
+            if save_every and (e + 1) % save_every == 0:
+                if checkpoints is not None:
+                    checkpoints.save_async(agent, e + 1, stats.summary())
+                else:
+                    agent.save(os.path.join(model_dir, f"dqn_boss_episode_{e+1}.pth"))
+
+            if state_file and ((e + 1) % state_every == 0 or e + 1 == num_episodes):
+                save_training_state(state_file, agent, e + 1, stats, env.game)
+    finally:
+        stats.close()
+        if trajectory_writer is not None:
+            trajectory_writer.commit()
+        if checkpoints is not None:
+            checkpoints.flush()
+
+    if final_model_file:
+        agent.save(final_model_file)
+        if verbose: print(f"Training finished. Agent saved to {final_model_file}")
+        if policy_file:
+            agent.export_policy(policy_file) # Keeps main.py play mode on the new weights
+    return stats.episode_rewards, stats.boss_win_flags
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the DQN boss without the Qt window.")
+    parser.add_argument("--episodes", type=int, default=NUM_EPISODES_TO_TRAIN)
+    parser.add_argument("--model", default=AGENT_MODEL_FILE, help="Final model path (also loaded with --resume-weights).")
+    parser.add_argument("--policy-out", default=POLICY_WEIGHTS_FILE,
+                        help="Also export the final policy here for torch-free play ('' = no export).")
+    parser.add_argument("--stats-file", default=TRAINING_STATS_FILE)
+    parser.add_argument("--save-every", type=int, default=SAVE_AGENT_EVERY_N_EPISODES)
+    parser.add_argument("--log-every", type=int, default=LOG_STATS_EVERY_N_EPISODES)
+    parser.add_argument("--resume-weights", action="store_true", help="Load --model before training.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the run saved in --state-file (weights, replay memory, RNGs, episode, stats).")
+    parser.add_argument("--state-file", default=TRAINING_STATE_FILE, help="Resumable training state file.")
+    parser.add_argument("--state-every", type=int, default=1000,
+                        help="Save the training state every N episodes (0 = only at the end).")
+    parser.add_argument("--viewer", action="store_true", help="Show the Qt window as a live viewer.")
+    parser.add_argument("--viewer-every", type=int, default=50, help="Refresh the viewer every N episodes.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed the env and agent streams (reproducible run).")
+    parser.add_argument("--prioritized-replay", action="store_true", help="Prioritized experience replay (sum-tree).")
+    parser.add_argument("--learn-every", type=int, default=1, help="Train every k boss decisions.")
+    parser.add_argument("--gradient-steps", type=int, default=1, help="Gradient steps per training call.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Transitions per gradient step.")
+    parser.add_argument("--replay-size", type=int, default=50000, help="Replay buffer capacity (transitions).")
+    parser.add_argument("--replay-storage", choices=REPLAY_STORAGE_MODES, default="float32",
+                        help="Replay observation storage: 85, 24 or 14 bytes per transition.")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR,
+                        help="Checkpoint store for the periodic checkpoints ('' = dqn_boss_episode_N.pth files).")
+    parser.add_argument("--weights-only-checkpoints", action="store_true",
+                        help="Periodic checkpoints keep only the policy network and epsilon.")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="Also append every transition to this trajectory store (trajectory_store.py).")
+    parser.add_argument("--record-storage", choices=REPLAY_STORAGE_MODES, default="uint8")
+    args = parser.parse_args(argv)
+
+    from agent import DQNAgent # torch is only needed to train; rollouts can use policy_inference.NumpyPolicy
+    env_seed, agent_seed = spawn(args.seed, 2) if args.seed is not None else (None, None)
+    agent = DQNAgent(seed=agent_seed, prioritized_replay=args.prioritized_replay, batch_size=args.batch_size,
+                     learn_every=args.learn_every, gradient_steps=args.gradient_steps,
+                     replay_buffer_size=args.replay_size, replay_storage=args.replay_storage)
+    if args.resume_weights and os.path.exists(args.model):
+        agent.load(args.model)
+
+    env = BossAssaultEnv(agent=agent, state_dicts=False, seed=env_seed)
+    viewer = WindowViewer(env, args.viewer_every) if args.viewer else None
+
+    writer = None
+    if args.record:
+        from trajectory_store import TrajectoryWriter
+        writer = TrajectoryWriter(args.record, args.record_storage, name="headless")
+
+    checkpoints = None
+    if args.checkpoint_dir:
+        from checkpoint_store import CheckpointStore
+        checkpoints = CheckpointStore(args.checkpoint_dir, weights_only=args.weights_only_checkpoints)
+
+    os.makedirs(os.path.dirname(args.model) or ".", exist_ok=True)
+    start = time.perf_counter()
+    rewards, _ = run_headless_training(agent, args.episodes, env=env, viewer=viewer,
+                          stats_file=args.stats_file, save_every=args.save_every,
+                          log_every=args.log_every, model_dir=os.path.dirname(args.model) or ".",
+                          final_model_file=args.model, state_file=args.state_file,
+                          state_every=args.state_every or args.episodes, resume=args.resume,
+                          trajectory_writer=writer, checkpoints=checkpoints, policy_file=args.policy_out)
+    if checkpoints is not None:
+        checkpoints.close()
+    elapsed = time.perf_counter() - start
+    print(f"{len(rewards)} episodes in {elapsed:.1f}s ({len(rewards) / max(elapsed, 1e-9):.1f} episodes/sec)")
+
+
+if __name__ == '__main__':
+    main()
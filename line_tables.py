@@ -0,0 +1,144 @@
+# line_tables.py
+"""
+Precomputed resolution tables for the boss's line shots (horizontal_shot / vertical_shot).
+
+A shot only depends on the cells of one line, read in shot order. Each cell is one of
+CELL_STATES states (empty, or a unit type with its HP), so a line of length L has
+CELL_STATES ** L patterns (2401 on the 4x4 board). LineShotTable resolves every pattern
+once with the GameLogic rules: charges travel along the line, a Tank absorbs charges
+until it dies or they run out, other units take one charge each, and a shot that hits
+nothing costs -3. One lookup then gives the hit cells, damage per cell, kills, surviving
+HP and the reward delta.
+
+Tables are built lazily per (length, charges, damage) and cached. Lines longer than
+MAX_TABLE_LENGTH are resolved charge by charge by the callers instead.
+"""
+import functools
+
+import numpy as np
+
+from units import (EMPTY, UNIT_TYPE_CODES, UNIT_CODE_NAMES, UNIT_CODE_KILL_REWARD, CELL_STATES,
+                   CELL_STATE_OFFSET, CELL_STATE_DECODE)
+
+MAX_TABLE_LENGTH = 6 # CELL_STATES ** 6 = 117649 patterns
+HIT_REWARD = 1.5           # Per damage point on a unit that survives the hit (or per Tank charge)
+MISS_PENALTY = -3          # Shot that hits no unit
+_TANK = UNIT_TYPE_CODES["Tank"]
+
+# CELL_STATE_OF[code * 256 + hp] -> cell state (lookup from the board's two byte arrays)
+CELL_STATE_OF = [0] * (len(UNIT_CODE_NAMES) * 256)
+for _state, (_code, _hp) in enumerate(CELL_STATE_DECODE):
+    if _code != EMPTY:
+        CELL_STATE_OF[_code * 256 + _hp] = _state
+
+
+def resolve_line_shot(states, charges, damage):
+    """
+    Reference charge-by-charge resolution of one shot over cell states in shot order.
+    Returns (states_after, hits, reward, kills) with hits = [(position, damage_dealt, killed)].
+    """
+    after = list(states)
+    hits = []
+    reward = 0.0
+    kills = 0
+    for pos, state in enumerate(states):
+        if charges <= 0:
+            break
+        if not state:
+            continue
+        code, hp = CELL_STATE_DECODE[state]
+        if code == _TANK:
+            taken = 0
+            while charges > 0 and hp > 0:
+                hp -= damage
+                reward += damage * HIT_REWARD
+                charges -= 1
+                taken += 1
+            killed = hp <= 0
+            if killed:
+                reward += UNIT_CODE_KILL_REWARD[code]
+                kills += 1
+            else:
+                charges = 0 # A surviving Tank exhausts the shot
+            dealt = taken * damage
+        else:
+            hp -= damage
+            killed = hp <= 0
+            if killed:
+                reward += UNIT_CODE_KILL_REWARD[code]
+                kills += 1
+            else:
+                reward += damage * HIT_REWARD
+            charges -= 1
+            dealt = damage
+        hits.append((pos, dealt, killed))
+        after[pos] = 0 if killed else CELL_STATE_OFFSET[code] + hp - 1
+    if not hits:
+        reward += MISS_PENALTY
+    return after, hits, reward, kills
+
+
+class LineShotTable:
+    """
+    Every shot outcome for lines of `length` cells. Pattern index: sum(state_k * CELL_STATES**k)
+    over the cells in shot order (k = 0 is the first cell the shot reaches).
+
+    entries[p] = (reward, kills, hits) for scalar callers, with hits = ((k, damage, killed), ...).
+    The NumPy arrays (states_after, reward, kills, hit_mask) serve batched callers.
+    """
+    def __init__(self, length, charges, damage=1):
+        self.length = length
+        self.charges = charges
+        self.damage = damage
+        self.powers = [CELL_STATES ** k for k in range(length)]
+        num_patterns = CELL_STATES ** length
+        self.entries = []
+        self.states_after = np.zeros((num_patterns, length), dtype=np.int8)
+        self.reward = np.zeros(num_patterns, dtype=np.float32)
+        self.kills = np.zeros(num_patterns, dtype=np.int8)
+        self.hit_mask = np.zeros(num_patterns, dtype=np.int64) # Bit k: the shot reached a unit at k
+        states = [0] * length
+        for p in range(num_patterns):
+            rest = p
+            for k in range(length):
+                rest, states[k] = divmod(rest, CELL_STATES)
+            after, hits, reward, kills = resolve_line_shot(states, charges, damage)
+            self.entries.append((reward, kills, tuple(hits)))
+            self.states_after[p] = after
+            self.reward[p] = reward
+            self.kills[p] = kills
+            self.hit_mask[p] = sum(1 << k for k, _dealt, _killed in hits)
+
+    def pattern(self, types, hp, cells):
+        """Pattern index of the board cells (flat indexes, shot order) from a Board's byte arrays."""
+        p = 0
+        for power, cell in zip(self.powers, cells):
+            code = types[cell]
+            if code:
+                p += CELL_STATE_OF[code * 256 + hp[cell]] * power
+        return p
+
+    def best_shot(self, board, vertical):
+        """
+        (line_idx, reverse, reward) of the shot with the highest immediate reward along the
+        board's rows (or columns if vertical), from table lookups only.
+        """
+        size = board.size
+        types, hp = board.types, board.hp
+        best = None
+        for line in range(size):
+            cells = [k * size + line for k in range(size)] if vertical else [line * size + k for k in range(size)]
+            for reverse in (0, 1):
+                ordered = cells[::-1] if reverse else cells
+                reward = self.entries[self.pattern(types, hp, ordered)][0]
+                if best is None or reward > best[2]:
+                    best = (line, reverse, reward)
+        return best
+
+
+@functools.lru_cache(maxsize=None)
+def line_shot_table(length, charges, damage=1):
+    """Cached LineShotTable, or None if lines of this length are too long to tabulate."""
+    if length > MAX_TABLE_LENGTH:
+        return None
+    return LineShotTable(length, charges, damage)
@@ -3,7 +3,6 @@ import sys
 import os
 import time
 import random
-import csv
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout,
                              QPushButton, QLabel, QVBoxLayout, QHBoxLayout,
                              QMessageBox, QFrame, QTextEdit,
@@ -13,15 +12,36 @@ from PyQt5.QtGui import QFont, QMovie, QPalette, QBrush, QPixmap
 
 from units import PLAYER_UNIT_SPECS
 from game_logic import GameLogic
-from agent import DQNAgent, get_game_state_for_q_table # Changed QLearningTableAgent to DQNAgent
+from state_encoding import get_game_state_for_q_table, encode_observation
+from headless_training import TrainingStatsLog
+# agent.DQNAgent (torch) is imported in main() only when training or playing from a .pth model
 
 # --- RL Agent Configuration ---
 TRAIN_MODE = False # Set to True to enable training
 NUM_EPISODES_TO_TRAIN = 200000
 SAVE_AGENT_EVERY_N_EPISODES = 5000
 AGENT_MODEL_FILE = "Model/dqn_boss_agent.pth" # Changed filename for DQN model
+POLICY_WEIGHTS_FILE = "Model/dqn_boss_policy.npz" # Exported policy (policy_inference.py export); play without torch
 LOG_STATS_EVERY_N_EPISODES = 500
 TRAINING_STATS_FILE = "Model/training_stats.csv" # CSV file to save training statistics
+RESUME_TRAINING = False # Continue the run saved in TRAINING_STATE_FILE instead of starting over
+TRAINING_STATE_FILE = "Model/training_state.pth" # Resumable training state (training_state.py)
+SAVE_TRAINING_STATE_EVERY_N_EPISODES = 1000
+CHECKPOINT_DIR = "Model/checkpoints" # Periodic checkpoints go to this checkpoint_store.py store in the background (None: .pth files)
+WEIGHTS_ONLY_CHECKPOINTS = False # Periodic checkpoints keep only the policy network and epsilon
+PRIORITIZED_REPLAY = False # Sample replay by TD-error priority (replay.PrioritizedReplayBuffer)
+LEARN_EVERY_N_STEPS = 1 # Train every k boss decisions...
+GRADIENT_STEPS_PER_LEARN = 1 # ...with this many gradient steps per training call
+REPLAY_BUFFER_SIZE = 50000 # Transitions kept for replay
+REPLAY_STORAGE = "float32" # "uint8" / "packed": compact observation codes, 24 / 14 instead of 85 bytes per transition
+
+# --- Boss controller for interactive play (not training) ---
+BOSS_CONTROLLER = "dqn" # "dqn" (trained agent), "qtable" (q_table.py lookup of the trained policy), "mcts" (mcts_boss.MCTSBoss search)
+                        # or "solver" (solver.TableBoss: exact end-game table, trained agent before the end game)
+QTABLE_FILE = "Model/dqn_boss_qtable.npz" # Built by python q_table.py build (rebuild after training)
+SOLVER_TABLE_FILE = "Model/solver_table.npz" # Built by python solver.py build
+MCTS_TIME_BUDGET_MS = 200 # Search time per boss decision
+MCTS_MAX_NODES = 50000
 
 class TacticsGridWindow(QMainWindow):
     def __init__(self, agent_to_use=None):
@@ -483,7 +503,7 @@ class TacticsGridWindow(QMainWindow):
         # In fast training mode, only log critical messages to the internal log.
         # Otherwise, log all messages.
         if not self.is_fast_mode_training:
-            self.game.action_log.append(message)
+            self.game.log_message(message)
         self.update_action_log_display()
 
     def on_grid_cell_clicked(self, r, c):
@@ -668,18 +688,20 @@ def run_training_loop(window, agent, num_episodes):
     """
     Main training loop for the DQN agent. Runs many episodes without UI delays.
     """
+    from training_state import load_training_state, save_training_state
+    checkpoints = None
+    if CHECKPOINT_DIR:
+        from checkpoint_store import CheckpointStore
+        checkpoints = CheckpointStore(CHECKPOINT_DIR, weights_only=WEIGHTS_ONLY_CHECKPOINTS)
     window.is_fast_mode_training = True # Enable fast mode (minimal UI updates)
-    all_episode_rewards = []
-    recent_outcomes = [] # Stores 1 for boss win, 0 for player win
-
-    # Open CSV file to log training statistics
-    file_exists = os.path.isfile(TRAINING_STATS_FILE)
-    with open(TRAINING_STATS_FILE, 'a', newline='') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        if not file_exists: # Write header if file is new
-            csv_writer.writerow(['Episode', 'AvgReward', 'WinRate_Boss', 'Epsilon'])
-
-        for e in range(num_episodes):
+    # Rolling stats, printed, echoed to the UI log and appended to the CSV every LOG_STATS_EVERY_N_EPISODES
+    stats = TrainingStatsLog(TRAINING_STATS_FILE, LOG_STATS_EVERY_N_EPISODES, echo=window.log_message)
+    start_episode = 0
+    if RESUME_TRAINING: # Continue the run saved in TRAINING_STATE_FILE (weights, replay memory, RNGs, episode, stats)
+        start_episode = load_training_state(TRAINING_STATE_FILE, agent, stats, window.game)
+
+    try:
+        for e in range(start_episode, num_episodes):
             window.current_episode_count = e + 1 # Update episode counter for UI label
             
             # Start a new game and get the initial state dictionary
@@ -722,9 +744,10 @@ def run_training_loop(window, agent, num_episodes):
 
                 # Agent learning step: current_state, action, reward, next_state, done
                 if action_idx_boss_took is not None and state_dict_boss_acted_on is not None:
-                    # Discretize state dictionaries into numpy arrays for the DQN
-                    current_state_vector = agent._discretize_state(state_dict_boss_acted_on)
-                    next_state_vector = agent._discretize_state(next_state_dict_after_boss)
+                    # The game already encoded the observation the boss acted on; encode the post-attack
+                    # state straight from the game instead of re-discretizing the dicts
+                    current_state_vector = window.game.decision_observation.copy()
+                    next_state_vector = encode_observation(window.game)
                     agent.learn(current_state_vector, action_idx_boss_took, reward_for_boss_this_action, next_state_vector, done_after_boss)
                 
                 if done_after_boss: # Game over condition detected during boss turn
@@ -760,53 +783,102 @@ def run_training_loop(window, agent, num_episodes):
                 print(f"WARNING: Episode {e+1} ended without definitive game over conditions being met. Defaulting to boss loss. Current Round: {window.game.current_round}, Boss HP: {window.game.boss.current_hp}")
                 boss_won_episode = False # Default to boss loss in unexpected scenario
 
-            all_episode_rewards.append(episode_reward)
-            recent_outcomes.append(1 if boss_won_episode else 0) # 1 if boss won, 0 if player won
-
-            # Keep only the last LOG_STATS_EVERY_N_EPISODES outcomes
-            if len(recent_outcomes) > LOG_STATS_EVERY_N_EPISODES:
-                recent_outcomes.pop(0)
+            stats.record(episode_reward, boss_won_episode, agent.epsilon, num_episodes)
 
-            # Log and save statistics periodically
-            if (e + 1) % LOG_STATS_EVERY_N_EPISODES == 0:
-                avg_reward = sum(all_episode_rewards[-LOG_STATS_EVERY_N_EPISODES:]) / len(all_episode_rewards[-LOG_STATS_EVERY_N_EPISODES:])
-                win_rate_boss = sum(recent_outcomes) / len(recent_outcomes) * 100 if recent_outcomes else 0
-                
-                log_str = f"Ep {e+1}/{num_episodes}. Avg Reward (last {LOG_STATS_EVERY_N_EPISODES}): {avg_reward:.2f}. Win Rate (Boss): {win_rate_boss:.1f}%. Epsilon: {agent.epsilon:.4f}"
-                print(log_str) # Print to console
-                window.log_message(log_str) # Also log to UI action log
-
-                # Write statistics to CSV
-                csv_writer.writerow([e + 1, f"{avg_reward:.2f}", f"{win_rate_boss:.1f}", f"{agent.epsilon:.4f}"])
-                csvfile.flush() # Ensure data is written immediately (optional)
-            
             # Save agent model periodically
             if (e + 1) % SAVE_AGENT_EVERY_N_EPISODES == 0:
-                agent.save(f"dqn_boss_episode_{e+1}.pth") # Save with episode number for checkpoints
+                if checkpoints is not None: # Copies the tensors; a background thread writes them
+                    checkpoints.save_async(agent, e + 1, stats.summary())
+                else:
+                    agent.save(f"dqn_boss_episode_{e+1}.pth") # Save with episode number for checkpoints
                 print(f"Agent saved at episode {e+1}")
                 # window.log_message(f"Agent saved at episode {e+1}") # Uncomment if want this in UI log
 
+            # Save the resumable training state periodically and after the last episode
+            if (e + 1) % SAVE_TRAINING_STATE_EVERY_N_EPISODES == 0 or e + 1 == num_episodes:
+                save_training_state(TRAINING_STATE_FILE, agent, e + 1, stats, window.game)
+    finally:
+        stats.close()
+        if checkpoints is not None:
+            checkpoints.close()
+
     # Training finished. Save final model.
     window.is_fast_mode_training = False
     agent.save(AGENT_MODEL_FILE)
+    agent.export_policy(POLICY_WEIGHTS_FILE) # Play mode loads the exported policy
     print(f"Training finished. Agent saved to {AGENT_MODEL_FILE}")
     # window.log_message(f"Training finished. Agent saved to {AGENT_MODEL_FILE}") # Uncomment if want this in UI log
 
 
-def main():
-    app = QApplication(sys.argv)
-    
+def policy_export_is_current():
+    """True if POLICY_WEIGHTS_FILE exists and is not older than AGENT_MODEL_FILE."""
+    if not os.path.exists(POLICY_WEIGHTS_FILE):
+        return False
+    if os.path.exists(AGENT_MODEL_FILE) and os.path.getmtime(POLICY_WEIGHTS_FILE) < os.path.getmtime(AGENT_MODEL_FILE):
+        print(f"{POLICY_WEIGHTS_FILE} is older than {AGENT_MODEL_FILE}; loading the model instead "
+              f"(python policy_inference.py export refreshes it)")
+        return False
+    return True
+
+
+def create_dqn_agent():
+    """The DQN boss: a fresh DQNAgent to train, or the trained policy to play against."""
+    if not TRAIN_MODE and policy_export_is_current():
+        # Play with the exported policy: NumPy forward pass, torch is not imported
+        from policy_inference import NumpyPolicy
+        dqn_agent = NumpyPolicy.load(POLICY_WEIGHTS_FILE, epsilon=0.0)
+        print(f"DQN policy loaded from {POLICY_WEIGHTS_FILE}")
+        return dqn_agent
+
     # Instantiate the DQNAgent
-    dqn_agent = DQNAgent()
+    from agent import DQNAgent
+    dqn_agent = DQNAgent(prioritized_replay=PRIORITIZED_REPLAY, learn_every=LEARN_EVERY_N_STEPS,
+                         gradient_steps=GRADIENT_STEPS_PER_LEARN, replay_buffer_size=REPLAY_BUFFER_SIZE,
+                         replay_storage=REPLAY_STORAGE)
 
     # Load agent model if not in training mode and file exists
     if not TRAIN_MODE and os.path.exists(AGENT_MODEL_FILE):
         dqn_agent.load(AGENT_MODEL_FILE)
         dqn_agent.epsilon = 0.0 # No exploration when playing against a trained agent
         print(f"DQN Agent model loaded from {AGENT_MODEL_FILE}")
+    return dqn_agent
+
+
+def main():
+    app = QApplication(sys.argv)
+
+    # The DQN is only needed to train it or to play a controller built on it (not for "mcts")
+    dqn_agent = create_dqn_agent() if TRAIN_MODE or BOSS_CONTROLLER != "mcts" else None
+
+    boss_controller = dqn_agent
+    if BOSS_CONTROLLER == "qtable" and not TRAIN_MODE:
+        from q_table import QTablePolicy
+        if not os.path.exists(QTABLE_FILE):
+            print(f"No policy table at {QTABLE_FILE} (python q_table.py build): the boss uses the DQN directly")
+        else:
+            table_policy = QTablePolicy.load(QTABLE_FILE, epsilon=0.0)
+            if table_policy.matches_policy(dqn_agent):
+                boss_controller = table_policy
+                print(f"Boss uses the materialized policy table {QTABLE_FILE}")
+            else:
+                print(f"{QTABLE_FILE} was built from another network than the trained agent "
+                      f"(rebuild it with python q_table.py build): the boss uses the DQN directly")
+    if BOSS_CONTROLLER == "solver" and not TRAIN_MODE:
+        from solver import SolverTable, TableBoss
+        table = None
+        if os.path.exists(SOLVER_TABLE_FILE):
+            table = SolverTable(SOLVER_TABLE_FILE)
+            print(f"Boss plays the solved end-game table {SOLVER_TABLE_FILE} ({len(table)} states), DQN otherwise")
+        else:
+            print(f"No solver table at {SOLVER_TABLE_FILE} (python solver.py build): the boss solves its last decision on the spot, DQN otherwise")
+        boss_controller = TableBoss(table, fallback=dqn_agent)
+    if BOSS_CONTROLLER == "mcts" and not TRAIN_MODE:
+        from mcts_boss import MCTSBoss
+        boss_controller = MCTSBoss(time_budget_ms=MCTS_TIME_BUDGET_MS, max_nodes=MCTS_MAX_NODES)
+        print(f"Boss uses MCTS search ({MCTS_TIME_BUDGET_MS} ms per decision)")
 
     # Create and show the game window, passing the agent instance
-    window = TacticsGridWindow(agent_to_use=dqn_agent)
+    window = TacticsGridWindow(agent_to_use=boss_controller)
     window.show()
 
     if TRAIN_MODE:
@@ -0,0 +1,295 @@
+# mcts_boss.py
+"""
+Monte Carlo tree search boss controller.
+
+MCTSBoss plugs into Boss.choose_action_by_agent like DQNAgent does (pass it as the
+GameLogic's agent_instance). For every boss decision it searches over skills *and* concrete
+targets (normal-attack cell, row/column + direction, ultimate cell sets) by replaying the
+game on a private GameLogic through snapshot/restore:
+
+    - the tree is open-loop: nodes are boss action sequences, and the player's random
+      placements between boss turns are re-sampled on every iteration (chance outcomes);
+    - children are selected by UCB1 among the actions legal in the sampled state;
+    - leaves are evaluated by a rollout (random available skill + heuristic targets) for
+      up to rollout_rounds rounds;
+    - the value is the boss's summed reward (same rewards as training, including the
+      player's attack damage).
+
+Search stops at time_budget_ms, max_nodes or max_iterations, whichever comes first. A search
+without a time budget (time_budget_ms=None, max_iterations set) and with a seeded rng is
+reproducible. The subtree under the
+chosen action is kept as the next decision's root (the next round of the same game).
+Search draws come from the controller's rng (MCTSBoss(seed=...) or reseed()). Unseeded, that
+is the global random module, whose state is saved and restored around the search so that
+searching does not change the live game's random sequence.
+"""
+import math
+import time
+
+from game_logic import GameLogic, BOSS_SKILL_INDEX
+from headless_training import RandomPlacementPlayer
+from targeting import heuristic_skill_params
+from units import UNIT_CODE_MAX_HP, UNIT_CODE_KILL_REWARD
+from seeding import GLOBAL_RANDOM, python_rng
+
+SHOT_DIRECTIONS = {"horizontal_shot": ("ltr", "rtl"), "vertical_shot": ("ttb", "btt")}
+
+
+class _Node:
+    __slots__ = ("children", "visits", "value_sum")
+
+    def __init__(self):
+        self.children = {} # action key -> _Node
+        self.visits = 0
+        self.value_sum = 0.0
+
+
+def _action_params(action):
+    """Converts a hashable search action (skill_key, target key) into process_boss_attack params."""
+    skill_key, target = action
+    if skill_key in SHOT_DIRECTIONS:
+        return {"line_idx": target[0], "direction": target[1]}
+    if skill_key == "heal":
+        return {}
+    return list(target) # normal_attack: [(r, c)] or []; ultimate: list of cells
+
+
+def legal_actions(game, only_skill=None):
+    """
+    Search actions for the current boss decision: (skill_key, target key) pairs.
+    Line shots are only aimed at lines holding units (any line if the board is empty);
+    ultimate candidates are a few ranked cell sets instead of every combination of targets.
+    """
+    board = game.board
+    occupied = board.occupied_positions()
+    actions = []
+    for skill_key in game.boss.get_available_skills_keys():
+        if only_skill is not None and skill_key != only_skill:
+            continue
+        if skill_key == "normal_attack":
+            actions.extend((skill_key, (pos,)) for pos in occupied)
+            if not occupied:
+                actions.append((skill_key, ()))
+        elif skill_key in SHOT_DIRECTIONS:
+            axis = 1 if skill_key == "vertical_shot" else 0
+            lines = sorted({pos[axis] for pos in occupied}) or [0] # Only lines holding units
+            actions.extend((skill_key, (idx, direction)) for idx in lines for direction in SHOT_DIRECTIONS[skill_key])
+        elif skill_key == "heal":
+            actions.append((skill_key, ()))
+        elif skill_key == "ultimate":
+            ultimate = game.boss.skills["ultimate"]
+            actions.extend((skill_key, cells)
+                           for cells in _ultimate_candidates(board, occupied, ultimate["targets"], ultimate["damage"]))
+    return actions
+
+
+def _ultimate_candidates(board, occupied, targets, damage):
+    if len(occupied) <= targets:
+        return [tuple(occupied)]
+    def killable_first(pos):
+        code = board.type_at(*pos)
+        return (board.hp_at(*pos) > damage, -UNIT_CODE_KILL_REWARD[code])
+    def most_valuable(pos):
+        return -UNIT_CODE_KILL_REWARD[board.type_at(*pos)]
+    def most_damaged(pos):
+        code = board.type_at(*pos)
+        return (board.hp_at(*pos) - UNIT_CODE_MAX_HP[code], -UNIT_CODE_KILL_REWARD[code])
+    candidates = []
+    for key in (killable_first, most_valuable, most_damaged):
+        cells = tuple(sorted(sorted(occupied, key=key)[:targets]))
+        if cells not in candidates:
+            candidates.append(cells)
+    return candidates
+
+
+def _count_nodes(root):
+    count, stack = 0, [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children.values())
+    return count
+
+
+class MCTSBoss:
+    def __init__(self, time_budget_ms=100, max_nodes=20000, exploration=10.0, rollout_rounds=3,
+                 player=None, seed=None, max_iterations=None):
+        if time_budget_ms is None and max_iterations is None:
+            raise ValueError("MCTSBoss needs a time_budget_ms or a max_iterations limit.")
+        self.time_budget_ms = time_budget_ms
+        self.max_nodes = max_nodes
+        self.max_iterations = max_iterations
+        self.exploration = exploration # UCB1 constant, in reward units (turn rewards are ~±10)
+        self.rollout_rounds = rollout_rounds # None: roll out to the end of the game
+        self.player = player if player is not None else RandomPlacementPlayer()
+        self.boss_skills_ref = None # Set by the UI / env like for DQNAgent (unused)
+        self.epsilon = 0.0
+        self.game = None
+        self._sim = None
+        self._root = None
+        self._root_round = None
+        self._node_count = 0
+        self.last_search = {} # Stats of the last decision: iterations, nodes, elapsed_ms, reused
+        self.rng = GLOBAL_RANDOM if seed is None else python_rng(seed)
+
+    def attach_game(self, game):
+        """Called by GameLogic when this controller is its agent."""
+        self.game = game
+        self._sim = GameLogic(grid_size=game.grid_size, max_rounds=game.max_rounds,
+                              state_dicts=False, action_log=False)
+        self._sim.rng = self._sim.boss.rng = self.rng # Simulated player placements use the search stream
+        self._root = None
+
+    def reseed(self, seed):
+        """Switches the search to its own random stream seeded from seed (int or SeedSequence)."""
+        self.rng = python_rng(seed)
+        if self._sim is not None:
+            self._sim.rng = self._sim.boss.rng = self.rng
+
+    # --- Agent interface used by Boss.choose_action_by_agent ---
+    def _discretize_state(self, game_state_dict):
+        return None # The search reads the live game, not an observation
+
+    def choose_action(self, state_vector, available_skill_keys, grid_units_for_targeting, forced_action_idx=None):
+        if self.game is None:
+            raise RuntimeError("MCTSBoss must be the agent_instance of a GameLogic (attach_game).")
+        only_skill = None
+        if forced_action_idx is not None:
+            only_skill = next((key for key, idx in BOSS_SKILL_INDEX.items() if idx == forced_action_idx), None)
+            if only_skill not in available_skill_keys:
+                return None, [], None
+        action = self.search(only_skill)
+        if action is None:
+            return None, [], None
+        return action[0], _action_params(action), BOSS_SKILL_INDEX[action[0]]
+
+    def learn(self, *args):
+        pass # Nothing to learn; lets training loops run with this controller
+
+    # --- Search ---
+    def _reuse_root(self):
+        # The subtree under last decision's action is valid for the next round of the same game
+        if self._root is not None and self.game.current_round == self._root_round + 1:
+            self._node_count = _count_nodes(self._root)
+            return True
+        self._root = _Node()
+        self._node_count = 1
+        return False
+
+    def search(self, only_skill=None):
+        game = self.game
+        reused = self._reuse_root()
+        root = self._root
+        root_snapshot = game.snapshot()
+        root_actions = legal_actions(game, only_skill)
+        if not root_actions:
+            return None
+
+        rng = self.rng
+        rng_state = rng.getstate() if rng is GLOBAL_RANDOM else None
+        start = time.perf_counter()
+        deadline = start + self.time_budget_ms / 1000.0 if self.time_budget_ms is not None else None
+        max_iterations = self.max_iterations
+        iterations = 0
+        try:
+            while True:
+                self._iterate(root, root_snapshot, root_actions)
+                iterations += 1
+                if self._node_count >= self.max_nodes or iterations == max_iterations \
+                        or (deadline is not None and time.perf_counter() >= deadline):
+                    break
+        finally:
+            if rng_state is not None:
+                rng.setstate(rng_state)
+
+        best_action = max(root_actions, key=lambda a: (root.children[a].visits, root.children[a].value_sum)
+                          if a in root.children else (-1, 0.0))
+        self.last_search = {"iterations": iterations, "nodes": self._node_count, "reused": reused,
+                            "elapsed_ms": (time.perf_counter() - start) * 1000.0}
+        self._root = root.children.get(best_action)
+        self._root_round = game.current_round
+        return best_action
+
+    def _iterate(self, root, root_snapshot, root_actions):
+        sim = self._sim
+        sim.restore(root_snapshot)
+        node = root
+        path = [root]
+        rewards = []
+        done = False
+        actions = root_actions
+        while not done:
+            untried = [a for a in actions if a not in node.children]
+            if untried and self._node_count < self.max_nodes:
+                action = self.rng.choice(untried)
+                child = node.children[action] = _Node()
+                self._node_count += 1
+                expanded = True
+            else:
+                action = self._select(node, actions)
+                if action is None: # Every legal action is unexplored but the node cap is reached
+                    break
+                child = node.children[action]
+                expanded = False
+            reward, done = self._step(sim, action)
+            rewards.append(reward)
+            path.append(child)
+            node = child
+            if expanded or done:
+                break
+            actions = legal_actions(sim)
+
+        rollout_return = 0.0 if done else self._rollout(sim)
+        # Each node's value is the return from the moment its action is taken
+        value = rollout_return
+        for depth in range(len(path) - 1, 0, -1):
+            value += rewards[depth - 1]
+            path[depth].visits += 1
+            path[depth].value_sum += value
+        root.visits += 1
+
+    def _select(self, node, actions):
+        log_visits = math.log(node.visits + 1)
+        best, best_score = None, -math.inf
+        for action in actions:
+            child = node.children.get(action)
+            if child is None or child.visits == 0:
+                continue
+            score = child.value_sum / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if score > best_score:
+                best, best_score = action, score
+        return best
+
+    def _step(self, sim, action):
+        """One boss action, then (if the game goes on) the next round's player phase."""
+        results = sim.process_boss_attack(forced_action=(action[0], _action_params(action)))
+        reward, done = results[4], results[5]
+        if done:
+            return reward, True
+        status, _msg, _state = sim.proceed_to_next_round()
+        if status == "game_over" or sim.check_game_over_conditions()[0]:
+            return reward, True
+        self.player.place_units(sim)
+        player_results = sim.end_placement_phase()
+        return reward + player_results[4], player_results[5]
+
+    def _rollout(self, sim):
+        total = 0.0
+        rounds = 0
+        while self.rollout_rounds is None or rounds < self.rollout_rounds:
+            skill_key = self.rng.choice(sim.boss.get_available_skills_keys())
+            params = heuristic_skill_params(skill_key, sim.board, self.rng)
+            results = sim.process_boss_attack(forced_action=(skill_key, params))
+            total += results[4]
+            rounds += 1
+            if results[5]:
+                break
+            status, _msg, _state = sim.proceed_to_next_round()
+            if status == "game_over" or sim.check_game_over_conditions()[0]:
+                break
+            self.player.place_units(sim)
+            player_results = sim.end_placement_phase()
+            total += player_results[4]
+            if player_results[5]:
+                break
+        return total
@@ -0,0 +1,146 @@
+# player_strategies.py
+"""
+Automated player strategies for evaluating boss policies (torch-free).
+
+Every strategy has the place_units(game) contract of RandomPlacementPlayer and draws its
+random choices (tie breaks, fallback cells) from game.rng only, so a seeded episode plays
+the same placements for every boss it faces.
+
+- random:       RandomPlacementPlayer, the training opponent
+- attack_first: rule cascade in the style of Boss.fallback_choose_action_ai: most attack
+                per placement (AD, then Knight, then Tank) on random empty cells
+- spread:       AD/Knights on the lines holding the fewest of them (the boss's line shots
+                and targeting go for the line with the most), Tanks on the lines holding the
+                most, where they absorb line shots
+- tank_wall:    scripted formation: Tanks on the outer columns, damage units in between
+- diagonal:     scripted formation: damage units on the diagonals, one per row and column
+- stack:        scripted formation: everything packed row by row from the top-left corner
+
+    player = make_player("spread")
+"""
+from units import UNIT_TYPE_CODES, UNIT_CODE_ATTACK
+from headless_training import RandomPlacementPlayer
+
+ATTACK_ORDER = sorted(UNIT_TYPE_CODES, key=lambda name: -UNIT_CODE_ATTACK[UNIT_TYPE_CODES[name]]) # AD, Knight, Tank
+SOFT_CODES = (UNIT_TYPE_CODES["AD"], UNIT_TYPE_CODES["Knight"]) # What the boss's line shots aim at
+TANK = "Tank"
+
+
+def _in_stock(game, names):
+    return [name for name in names if game.player_current_accumulation.get(name, 0) > 0]
+
+
+class _PlacementPlayer:
+    """Places units one at a time: next_unit() picks the type, cell_for() the empty cell."""
+    def place_units(self, game):
+        game.game_phase = "PLACEMENT" # Ensure game state is correct for internal logic
+        placed_count = 0
+        while game.can_place_more_units_this_round():
+            unit_type = self.next_unit(game)
+            cell = self.cell_for(game, unit_type) if unit_type is not None else None
+            if cell is None:
+                break # Nothing left in stock or the board is full
+            success, _ = game.place_unit_from_stock(unit_type, *cell)
+            if not success:
+                break
+            placed_count += 1
+        return placed_count
+
+    def next_unit(self, game):
+        available = _in_stock(game, ATTACK_ORDER)
+        return available[0] if available else None
+
+    def cell_for(self, game, unit_type):
+        return game.board.random_empty_position(game.rng)
+
+
+class AttackFirstPlayer(_PlacementPlayer):
+    """Highest-attack unit in stock on a random empty cell (see the module docstring)."""
+
+
+class SpreadPlayer(_PlacementPlayer):
+    """Damage units on the least crowded lines, Tanks shielding the most crowded ones."""
+    def next_unit(self, game):
+        available = _in_stock(game, ATTACK_ORDER)
+        if not available:
+            return None
+        # A Tank first once two damage units share a line without a Tank on it
+        if TANK in available and self._exposed_line(game.board):
+            return TANK
+        return available[0]
+
+    @staticmethod
+    def _exposed_line(board):
+        tank_code = UNIT_TYPE_CODES[TANK]
+        for vertical in (False, True):
+            for line in range(board.size):
+                if board.line_count(SOFT_CODES, line, vertical) >= 2 and not board.line_count((tank_code,), line, vertical):
+                    return True
+        return False
+
+    def cell_for(self, game, unit_type):
+        board = game.board
+        empty_cells = board.empty_positions()
+        if not empty_cells:
+            return None
+        sign = -1 if unit_type == TANK else 1 # Tanks go where the damage units are
+        def crowding(cell):
+            r, c = cell
+            return sign * (board.line_count(SOFT_CODES, r) + board.line_count(SOFT_CODES, c, vertical=True))
+        best = min(map(crowding, empty_cells))
+        return game.rng.choice([cell for cell in empty_cells if crowding(cell) == best])
+
+
+class FormationPlayer(_PlacementPlayer):
+    """
+    Scripted formation: layout(size) returns (tank_cells, soft_cells), the cells Tanks and
+    AD/Knights take, in order. Units go on the first empty cell of their list, or on a random
+    empty cell once it is full.
+    """
+    def __init__(self, layout):
+        self.layout = layout
+        self._cells = {} # size -> (tank_cells, soft_cells)
+
+    def cell_for(self, game, unit_type):
+        board = game.board
+        if board.size not in self._cells:
+            self._cells[board.size] = self.layout(board.size)
+        tank_cells, soft_cells = self._cells[board.size]
+        for r, c in tank_cells if unit_type == TANK else soft_cells:
+            if board.is_empty(r, c):
+                return r, c
+        return board.random_empty_position(game.rng)
+
+
+def tank_wall_layout(size):
+    tank_cells = [(r, c) for r in range(size) for c in (0, size - 1)]
+    soft_cells = [(r, c) for r in range(size) for c in range(1, size - 1)]
+    return tank_cells, soft_cells
+
+
+def diagonal_layout(size):
+    soft_cells = [(i, i) for i in range(size)] + [(i, size - 1 - i) for i in range(size) if i != size - 1 - i]
+    tank_cells = [(r, c) for r in range(size) for c in range(size) if (r, c) not in soft_cells]
+    return tank_cells, soft_cells
+
+
+def stack_layout(size):
+    cells = [(r, c) for r in range(size) for c in range(size)]
+    return cells, cells
+
+
+PLAYER_STRATEGIES = {
+    "random": RandomPlacementPlayer,
+    "attack_first": AttackFirstPlayer,
+    "spread": SpreadPlayer,
+    "tank_wall": lambda: FormationPlayer(tank_wall_layout),
+    "diagonal": lambda: FormationPlayer(diagonal_layout),
+    "stack": lambda: FormationPlayer(stack_layout),
+}
+
+
+def make_player(strategy_id):
+    """New player for a PLAYER_STRATEGIES id."""
+    if strategy_id not in PLAYER_STRATEGIES:
+        raise ValueError(f"Unknown player strategy {strategy_id!r}; expected one of {', '.join(PLAYER_STRATEGIES)}.")
+    return PLAYER_STRATEGIES[strategy_id]()
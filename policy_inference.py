@@ -0,0 +1,173 @@
+# policy_inference.py
+"""
+Torch-free inference for the trained DQN boss.
+
+DQNAgent.export_policy writes the policy network's weights (the 9 -> 128 -> 5 MLP of
+agent.DQN) to a small .npz file. NumpyPolicy loads that file and runs the forward pass with
+NumPy only, so play sessions and inference workers do not need torch. It has the same
+choose_action contract as DQNAgent (masked epsilon-greedy skill, heuristic targets), so it
+can be passed anywhere a boss agent is expected (GameLogic(agent_instance=...), Boss,
+BossAssaultEnv).
+
+    python policy_inference.py export --model Model/dqn_boss_agent.pth   # needs torch
+    python policy_inference.py bench --policy Model/dqn_boss_policy.npz
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from game_logic import BOSS_SKILL_INDEX
+from state_encoding import OBS_DIM, encode_state_dict
+from targeting import heuristic_skill_params
+from seeding import GLOBAL_RANDOM, python_rng
+
+POLICY_WEIGHTS_FILE = os.path.join("Model", "dqn_boss_policy.npz")
+AGENT_MODEL_FILE = os.path.join("Model", "dqn_boss_agent.pth")
+
+SKILL_KEYS = list(BOSS_SKILL_INDEX) # Index order of agent.ACTION_MAP_AGENT
+NUM_ACTIONS = len(SKILL_KEYS)
+# Array names in the .npz file: agent.DQN state_dict keys with "." replaced by "_"
+WEIGHT_NAMES = ("fc1_weight", "fc1_bias", "fc2_weight", "fc2_bias")
+_ZERO = np.float32(0.0) # ReLU floor; a float32 scalar keeps np.maximum off the casting path
+
+
+class NumpyPolicy:
+    """
+    NumPy forward pass of the policy network: q = relu(s @ W1.T + b1) @ W2.T + b2.
+    Weights are stored transposed and contiguous, and single-state decisions reuse
+    preallocated hidden / output buffers (a few microseconds per decision).
+    """
+    def __init__(self, fc1_weight, fc1_bias, fc2_weight, fc2_bias, epsilon=0.0, seed=None):
+        self.set_weights(fc1_weight, fc1_bias, fc2_weight, fc2_bias)
+        self.epsilon = epsilon
+        self.boss_skills_ref = None # Filled in by BossAssaultEnv, like DQNAgent's
+        self.rng = GLOBAL_RANDOM
+        if seed is not None:
+            self.reseed(seed)
+
+    def set_weights(self, fc1_weight, fc1_bias, fc2_weight, fc2_bias):
+        """Replaces the network weights (arrays laid out as in the torch state_dict)."""
+        self.w1 = np.ascontiguousarray(np.asarray(fc1_weight, dtype=np.float32).T) # (OBS_DIM, hidden)
+        self.b1 = np.array(fc1_bias, dtype=np.float32)
+        self.w2 = np.ascontiguousarray(np.asarray(fc2_weight, dtype=np.float32).T) # (hidden, NUM_ACTIONS)
+        self.b2 = np.array(fc2_bias, dtype=np.float32)
+        if self.w1.shape[0] != OBS_DIM or self.w2.shape[1] != NUM_ACTIONS:
+            raise ValueError(f"Expected a {OBS_DIM} -> hidden -> {NUM_ACTIONS} network, got "
+                             f"{self.w1.shape[0]} -> {self.w1.shape[1]} -> {self.w2.shape[1]}.")
+        self._hidden = np.empty(self.w1.shape[1], dtype=np.float32)
+        self._q = np.empty(NUM_ACTIONS, dtype=np.float32)
+
+    def weights(self):
+        """{WEIGHT_NAMES: array} in the torch state_dict layout (as set_weights takes them)."""
+        return dict(zip(WEIGHT_NAMES, (self.w1.T, self.b1, self.w2.T, self.b2)))
+
+    @classmethod
+    def load(cls, filepath=POLICY_WEIGHTS_FILE, **kwargs):
+        with np.load(filepath) as weights:
+            return cls(*(weights[name] for name in WEIGHT_NAMES), **kwargs)
+
+    def reseed(self, seed):
+        """Switches exploration and targeting to an own random stream seeded from seed."""
+        self.rng = python_rng(seed)
+
+    def _discretize_state(self, game_state_dict):
+        return encode_state_dict(game_state_dict)
+
+    def q_values(self, state_vector):
+        """(NUM_ACTIONS,) Q-values of one observation; the array is reused by the next call."""
+        hidden = np.dot(state_vector, self.w1, out=self._hidden)
+        hidden += self.b1
+        np.maximum(hidden, _ZERO, out=hidden)
+        q = np.dot(hidden, self.w2, out=self._q)
+        q += self.b2
+        return q
+
+    def batch_q_values(self, state_matrix):
+        """(N, NUM_ACTIONS) Q-values of an (N, OBS_DIM) observation matrix."""
+        hidden = np.asarray(state_matrix, dtype=np.float32) @ self.w1
+        hidden += self.b1
+        np.maximum(hidden, 0.0, out=hidden)
+        q = hidden @ self.w2
+        q += self.b2
+        return q
+
+    def greedy_action(self, state_vector, available_indices):
+        """Highest-Q action among available_indices (first one on ties, as torch.argmax)."""
+        # Five values: a Python max over a list beats masking and argmax on arrays this small
+        q = self.q_values(state_vector).tolist()
+        return max(available_indices, key=q.__getitem__)
+
+    def greedy_actions(self, state_matrix, available_mask):
+        """Batched greedy_action: one index per row of state_matrix, as DQNAgent.greedy_actions."""
+        q = self.batch_q_values(state_matrix)
+        q[~np.asarray(available_mask, dtype=bool)] = -np.inf
+        return q.argmax(axis=1)
+
+    def choose_action(self, state_vector, available_skill_keys, grid_units_for_targeting, forced_action_idx=None):
+        """Same contract and random draws as DQNAgent.choose_action."""
+        available_action_indices = [idx for idx, sk_key in enumerate(SKILL_KEYS) if sk_key in available_skill_keys]
+        if not available_action_indices:
+            return None, [], None
+
+        if forced_action_idx is not None:
+            if forced_action_idx not in available_action_indices:
+                return None, [], None
+            action_idx = forced_action_idx
+        elif (np.random.rand() if self.rng is GLOBAL_RANDOM else self.rng.random()) <= self.epsilon:
+            action_idx = self.rng.choice(available_action_indices)
+        else:
+            action_idx = self.greedy_action(state_vector, available_action_indices)
+
+        chosen_skill_key = SKILL_KEYS[action_idx]
+        skill_params = heuristic_skill_params(chosen_skill_key, grid_units_for_targeting, self.rng)
+        return chosen_skill_key, skill_params, action_idx
+
+
+def export_checkpoint(model_file=AGENT_MODEL_FILE, out_file=POLICY_WEIGHTS_FILE):
+    """Exports the policy network of a DQNAgent .pth checkpoint (imports torch)."""
+    from agent import DQNAgent
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(f"No DQN Agent model found at {model_file}.")
+    agent = DQNAgent()
+    agent.load(model_file)
+    agent.export_policy(out_file)
+    return out_file
+
+
+def _bench(policy, calls, seed=0):
+    rng = np.random.default_rng(seed)
+    states = rng.random((calls, OBS_DIM), dtype=np.float32)
+    available = list(range(NUM_ACTIONS))
+    start = time.perf_counter()
+    for state in states:
+        policy.greedy_action(state, available)
+    single_us = (time.perf_counter() - start) / calls * 1e6
+    start = time.perf_counter()
+    policy.greedy_actions(states, np.ones((calls, NUM_ACTIONS), dtype=bool))
+    batch_us = (time.perf_counter() - start) / calls * 1e6
+    print(f"single-state decision : {single_us:8.2f} us")
+    print(f"batched ({calls} rows) : {batch_us:8.3f} us/decision")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and time the torch-free boss policy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Write the policy weights of a .pth checkpoint to .npz.")
+    p_export.add_argument("--model", default=AGENT_MODEL_FILE)
+    p_export.add_argument("--out", default=POLICY_WEIGHTS_FILE)
+    p_bench = sub.add_parser("bench", help="Microseconds per greedy decision.")
+    p_bench.add_argument("--policy", default=POLICY_WEIGHTS_FILE)
+    p_bench.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print(f"Policy weights written to {export_checkpoint(args.model, args.out)}")
+    else:
+        _bench(NumpyPolicy.load(args.policy), args.calls)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
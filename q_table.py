@@ -0,0 +1,292 @@
+# q_table.py
+"""
+Materialized greedy policy of the trained DQN over the discretized state lattice.
+
+The boss decides on 9 features that are all small integers before normalization: HP,
+rage, the three cooldowns, the Tank / Knight / AD counts and the round. StateLattice
+enumerates every combination the rules can reach at a boss decision and packs it into a
+dense index. Cooldowns are at most cd - 1, because they tick down at round start before the
+boss acts. Each unit count is at most the units of that type the player could have drawn
+from stock by that round. The counts together are at most the placements allowed so far
+and the board size.
+
+Skill availability is itself a function of those features (cooldown == 0, rage >= cost), so
+the network's masked greedy skill at each lattice point is exact. The table stores that
+skill as one uint8 per state instead of five Q-values. QTablePolicy answers with one array
+index and falls back to the network for states outside the lattice (e.g. hand-built states).
+
+The table file records the eval_cache.weights_digest of the policy it was built from;
+matches_policy() tells whether a table still belongs to the current network (rebuild it after
+training).
+
+    python q_table.py build                 # Model/dqn_boss_policy.npz -> Model/dqn_boss_qtable.npz
+    python q_table.py check --episodes 2000 # coverage, agreement with the network, us/decision
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from game_logic import GameLogic
+from units import PLAYER_UNIT_SPECS
+from state_encoding import OBS_DIM, RAGE_BINS, CD_STATES_PER_SKILL, NUM_TANK_BINS, NUM_KNIGHT_BINS, NUM_AD_BINS, ROUND_BINS
+from policy_inference import NumpyPolicy, POLICY_WEIGHTS_FILE, WEIGHT_NAMES, SKILL_KEYS, NUM_ACTIONS
+from eval_cache import weights_digest
+
+QTABLE_FILE = os.path.join("Model", "dqn_boss_qtable.npz")
+BUILD_CHUNK_STATES = 1 << 17 # Lattice points per forward pass while building
+
+
+class StateLattice:
+    """
+    Dense packing of the boss decision states of a grid_size board:
+        index = combo * inner + (((hp * R + rage) * H + cd_h) * V + cd_v) * C + cd_heal
+    combo numbers the reachable (round, tanks, knights, ads) tuples; inner is the number of
+    (hp, rage, cooldown) points.
+    """
+    def __init__(self, grid_size=4, max_rounds=9):
+        game = GameLogic(grid_size, max_rounds, state_dicts=False, action_log=False)
+        boss = game.boss
+        self.grid_size = grid_size
+        self.max_rounds = max_rounds
+        self.max_hp = boss.max_hp
+        # Values per feature: hp 0..max_hp, rage 0..max_rage, cooldowns 0..cd-1
+        self.dims = (boss.max_hp + 1, boss.max_rage + 1, boss.skills["horizontal_shot"]["cd"],
+                     boss.skills["vertical_shot"]["cd"], boss.skills["heal"]["cd"])
+        self.inner = int(np.prod(self.dims))
+        self.ultimate_rage_cost = boss.skills["ultimate"]["rage_cost"]
+
+        # Units of each type the player can have drawn from stock by round r
+        regen = game.player_regeneration_per_round
+        start_stock = [game.player_max_accumulation[name] for name in PLAYER_UNIT_SPECS]
+        max_counts = [stock + regen * (max_rounds - 1) for stock in start_stock]
+        self.combo_index = np.full((max_rounds + 1, *(count + 1 for count in max_counts)), -1, dtype=np.int32)
+        combos = []
+        for rnd in range(1, max_rounds + 1):
+            drawn = [stock + regen * (rnd - 1) for stock in start_stock]
+            placed = min(game.max_units_to_place_round_1 + game.max_units_to_place_later_rounds * (rnd - 1),
+                         grid_size * grid_size)
+            for tanks in range(drawn[0] + 1):
+                for knights in range(drawn[1] + 1):
+                    for ads in range(min(drawn[2], placed - tanks - knights) + 1):
+                        self.combo_index[rnd, tanks, knights, ads] = len(combos)
+                        combos.append((rnd, tanks, knights, ads))
+        self.combos = np.array(combos, dtype=np.int64).reshape(-1, 4)
+        self.size = len(self.combos) * self.inner
+
+        # Feature i of an observation times _scales[i] is the integer feature (see ObservationWriter)
+        self._scales = np.array([self.max_hp, RAGE_BINS - 1, CD_STATES_PER_SKILL["horizontal_shot"] - 1,
+                                 CD_STATES_PER_SKILL["vertical_shot"] - 1, CD_STATES_PER_SKILL["heal"] - 1,
+                                 NUM_TANK_BINS - 1, NUM_KNIGHT_BINS - 1, NUM_AD_BINS - 1, ROUND_BINS - 1],
+                                dtype=np.float64)
+        self._scale_list = self._scales.tolist()
+        self._combo_lists = self.combo_index.tolist()
+
+    def observations(self, start, stop):
+        """(stop - start, OBS_DIM) float32 observations of lattice indices start..stop-1."""
+        index = np.arange(start, stop, dtype=np.int64)
+        combo, rest = np.divmod(index, self.inner)
+        features = np.empty((len(index), OBS_DIM), dtype=np.float64)
+        for column in (4, 3, 2, 1, 0): # cd_heal, cd_v, cd_h, rage, hp
+            rest, features[:, column] = np.divmod(rest, self.dims[column])
+        rnd, tanks, knights, ads = self.combos[combo].T
+        features[:, 5], features[:, 6], features[:, 7] = tanks, knights, ads
+        features[:, 8] = np.maximum(0, rnd - 1)
+        # Same double-precision division then float32 rounding as ObservationWriter
+        return (features / self._scales).astype(np.float32)
+
+    def available_mask(self, start, stop):
+        """(stop - start, NUM_ACTIONS) skill availability, Boss.get_available_skills_keys' rule."""
+        index = np.arange(start, stop, dtype=np.int64)
+        rest = index % self.inner
+        rest, cd_heal = np.divmod(rest, self.dims[4])
+        rest, cd_v = np.divmod(rest, self.dims[3])
+        rest, cd_h = np.divmod(rest, self.dims[2])
+        rage = rest % self.dims[1]
+        mask = np.ones((len(index), NUM_ACTIONS), dtype=bool)
+        mask[:, SKILL_KEYS.index("horizontal_shot")] = cd_h == 0
+        mask[:, SKILL_KEYS.index("vertical_shot")] = cd_v == 0
+        mask[:, SKILL_KEYS.index("heal")] = cd_heal == 0
+        mask[:, SKILL_KEYS.index("ultimate")] = rage >= self.ultimate_rage_cost
+        return mask
+
+    def index_of(self, state_vector):
+        """Lattice index of one observation, or -1 if it is not a lattice point."""
+        # Python floats and nested lists: cheaper than NumPy ops for 9 values
+        hp, rage, cd_h, cd_v, cd_heal, tanks, knights, ads, rnd = state_vector.tolist()
+        s_hp, s_rage, s_h, s_v, s_heal, s_tank, s_knight, s_ad, s_round = self._scale_list
+        hp, rage, cd_h, cd_v, cd_heal = (int(hp * s_hp + 0.5), int(rage * s_rage + 0.5), int(cd_h * s_h + 0.5),
+                                         int(cd_v * s_v + 0.5), int(cd_heal * s_heal + 0.5))
+        hp_dim, rage_dim, h_dim, v_dim, heal_dim = self.dims
+        if not (0 <= hp < hp_dim and 0 <= rage < rage_dim and 0 <= cd_h < h_dim and 0 <= cd_v < v_dim
+                and 0 <= cd_heal < heal_dim):
+            return -1
+        rnd, tanks, knights, ads = (int(rnd * s_round + 0.5) + 1, int(tanks * s_tank + 0.5),
+                                    int(knights * s_knight + 0.5), int(ads * s_ad + 0.5))
+        if min(tanks, knights, ads) < 0: # Negative list indexes would wrap around
+            return -1
+        try:
+            combo = self._combo_lists[rnd][tanks][knights][ads]
+        except IndexError:
+            return -1
+        if combo < 0:
+            return -1
+        return combo * self.inner + (((hp * rage_dim + rage) * h_dim + cd_h) * v_dim + cd_v) * heal_dim + cd_heal
+
+    def indices_of(self, state_matrix):
+        """Vectorized index_of for an (N, OBS_DIM) observation matrix."""
+        features = np.rint(np.asarray(state_matrix, dtype=np.float64) * self._scales).astype(np.int64)
+        features[:, 8] += 1 # Round
+        inner = np.zeros(len(features), dtype=np.int64)
+        valid = np.ones(len(features), dtype=bool)
+        for column, dim in enumerate(self.dims):
+            valid &= (features[:, column] >= 0) & (features[:, column] < dim)
+            inner = inner * dim + features[:, column]
+        counts = features[:, [8, 5, 6, 7]]
+        valid &= ((counts >= 0) & (counts < self.combo_index.shape)).all(axis=1)
+        combo = np.full(len(features), -1, dtype=np.int64)
+        combo[valid] = self.combo_index[tuple(counts[valid].T)]
+        return np.where(combo >= 0, combo * self.inner + inner, -1)
+
+
+def build_table(policy, grid_size=4, max_rounds=9, chunk=BUILD_CHUNK_STATES):
+    """Greedy skill (uint8) of policy at every lattice point; returns (lattice, actions)."""
+    lattice = StateLattice(grid_size, max_rounds)
+    actions = np.empty(lattice.size, dtype=np.uint8)
+    for start in range(0, lattice.size, chunk):
+        stop = min(start + chunk, lattice.size)
+        actions[start:stop] = policy.greedy_actions(lattice.observations(start, stop), lattice.available_mask(start, stop))
+    return lattice, actions
+
+
+class QTablePolicy(NumpyPolicy):
+    """NumpyPolicy whose greedy skill comes from the materialized table (network off-lattice)."""
+    def __init__(self, weights, lattice, actions, source_digest=None, **kwargs):
+        super().__init__(*weights, **kwargs)
+        self.lattice = lattice
+        self.actions = actions
+        self.source_digest = source_digest # weights_digest of the policy the table was built from
+        self.table_hits = 0
+        self.table_misses = 0
+
+    @classmethod
+    def load(cls, filepath=QTABLE_FILE, **kwargs):
+        with np.load(filepath) as data:
+            lattice = StateLattice(int(data["grid_size"]), int(data["max_rounds"]))
+            weights = [data[name] for name in WEIGHT_NAMES]
+            return cls(weights, lattice, data["actions"], str(data["source_digest"]), **kwargs)
+
+    def matches_policy(self, policy):
+        """True if the table was built from policy (a NumpyPolicy or DQNAgent)."""
+        return self.source_digest == policy_digest(policy)
+
+    def greedy_action(self, state_vector, available_indices):
+        index = self.lattice.index_of(state_vector)
+        if index >= 0:
+            self.table_hits += 1
+            return int(self.actions[index])
+        self.table_misses += 1
+        return super().greedy_action(state_vector, available_indices)
+
+    def greedy_actions(self, state_matrix, available_mask):
+        indices = self.lattice.indices_of(state_matrix)
+        on_lattice = indices >= 0
+        actions = np.empty(len(indices), dtype=np.int64)
+        actions[on_lattice] = self.actions[indices[on_lattice]]
+        if not on_lattice.all():
+            off = ~on_lattice
+            actions[off] = super().greedy_actions(np.asarray(state_matrix)[off], np.asarray(available_mask)[off])
+        return actions
+
+
+def policy_digest(policy):
+    """weights_digest of the network of a NumpyPolicy or a DQNAgent."""
+    if isinstance(policy, NumpyPolicy):
+        return weights_digest(policy.weights())
+    from actor_learner import policy_weights
+    return weights_digest(policy_weights(policy))
+
+
+def save_table(filepath, policy, lattice, actions):
+    weights = policy.weights()
+    np.savez_compressed(filepath, actions=actions, grid_size=lattice.grid_size, max_rounds=lattice.max_rounds,
+                        source_digest=np.array(weights_digest(weights)), **weights)
+
+
+def check_table(table_policy, num_episodes, seed=0):
+    """
+    Plays num_episodes seeded episodes with table_policy and compares every decision with the
+    network's greedy skill, one state at a time and batched. Returns (decisions, coverage,
+    agreement, (us_table, us_network) per single decision, the same for batched decisions).
+    """
+    from headless_training import BossAssaultEnv
+    env = BossAssaultEnv(agent=table_policy, state_dicts=False, seed=seed)
+    states, available = [], []
+    for e in range(num_episodes):
+        env.reset()
+        while not env.done:
+            available.append([idx for idx, key in enumerate(SKILL_KEYS) if key in env.game.boss.get_available_skills_keys()])
+            states.append(env.observe())
+            env.step()
+    decisions = len(states)
+    table_policy.table_hits = table_policy.table_misses = 0
+    start = time.perf_counter()
+    table_actions = [table_policy.greedy_action(state, avail) for state, avail in zip(states, available)]
+    us_table = (time.perf_counter() - start) / decisions * 1e6
+    coverage = table_policy.table_hits / decisions
+    start = time.perf_counter()
+    network_actions = [NumpyPolicy.greedy_action(table_policy, state, avail) for state, avail in zip(states, available)]
+    us_network = (time.perf_counter() - start) / decisions * 1e6
+    agreement = np.mean(np.array(table_actions) == np.array(network_actions))
+    # Batched: one index computation / one forward pass for all decisions
+    state_matrix = np.array(states)
+    mask = np.zeros((decisions, NUM_ACTIONS), dtype=bool)
+    for row, avail in enumerate(available):
+        mask[row, avail] = True
+    start = time.perf_counter()
+    batch_actions = table_policy.greedy_actions(state_matrix, mask)
+    us_table_batch = (time.perf_counter() - start) / decisions * 1e6
+    start = time.perf_counter()
+    NumpyPolicy.greedy_actions(table_policy, state_matrix, mask)
+    us_network_batch = (time.perf_counter() - start) / decisions * 1e6
+    agreement = min(agreement, np.mean(batch_actions == np.array(network_actions)))
+    return decisions, coverage, agreement, (us_table, us_network), (us_table_batch, us_network_batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize the DQN boss policy into a lookup table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Evaluate the policy over the state lattice.")
+    p_build.add_argument("--policy", default=POLICY_WEIGHTS_FILE, help="Exported policy (policy_inference.py export).")
+    p_build.add_argument("--out", default=QTABLE_FILE)
+    p_build.add_argument("--grid-size", type=int, default=4)
+    p_build.add_argument("--max-rounds", type=int, default=9)
+    p_check = sub.add_parser("check", help="Coverage, agreement and speed on seeded episodes.")
+    p_check.add_argument("--table", default=QTABLE_FILE)
+    p_check.add_argument("--episodes", type=int, default=2000)
+    p_check.add_argument("--epsilon", type=float, default=0.05, help="Exploration while playing (widens coverage).")
+    p_check.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        policy = NumpyPolicy.load(args.policy)
+        start = time.perf_counter()
+        lattice, actions = build_table(policy, args.grid_size, args.max_rounds)
+        elapsed = time.perf_counter() - start
+        save_table(args.out, policy, lattice, actions)
+        print(f"{lattice.size} states ({len(lattice.combos)} round/unit combos x {lattice.inner}) in {elapsed:.1f}s")
+        print(f"table: {actions.nbytes / 2 ** 20:.1f} MiB in memory, {os.path.getsize(args.out) / 2 ** 20:.2f} MiB on disk "
+              f"(Q-values would be {lattice.size * NUM_ACTIONS * 4 / 2 ** 20:.0f} MiB)")
+        print("skill counts: " + ", ".join(f"{key} {n}" for key, n in zip(SKILL_KEYS, np.bincount(actions, minlength=NUM_ACTIONS))))
+    else:
+        table_policy = QTablePolicy.load(args.table, epsilon=args.epsilon, seed=args.seed)
+        decisions, coverage, agreement, single_us, batch_us = check_table(table_policy, args.episodes, args.seed)
+        print(f"{decisions} decisions: {coverage * 100:.2f}% on the lattice, {agreement * 100:.2f}% agreement with the network")
+        print(f"greedy decision, one state : {single_us[0]:.2f} us (table) vs {single_us[1]:.2f} us (NumPy network)")
+        print(f"greedy decision, batched   : {batch_us[0]:.3f} us (table) vs {batch_us[1]:.3f} us (NumPy network)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,283 @@
+# replay.py
+"""
+Replay memory for the DQN boss (torch-free).
+
+ReplayBuffer keeps transitions in preallocated contiguous NumPy arrays used as a ring
+buffer: adding a transition writes one row in place (add_batch writes N rows with one
+vectorized write per field), and sampling gathers a batch with one vectorized take per
+field into preallocated batch arrays. The batch arrays can be wrapped with torch.from_numpy
+without copying.
+
+With a codec (state_encoding.ObservationCodec), states are stored as integer codes (9 uint8
+levels, or one bit-packed uint32) and decoded to float32 only for sampled batches; actions are
+stored as uint8. That is 24 or 14 bytes per transition instead of 85, so buffers of 10M+
+transitions fit in RAM. Decoding is exact: batches are the same as with float32 storage.
+
+PrioritizedReplayBuffer adds proportional prioritized sampling (Schaul et al.): a SumTree over
+the rows gives O(log n) insert, priority update and sampling, sampled batches come with
+importance-sampling weights, and priorities are updated from the learner's TD errors.
+"""
+import numpy as np
+
+from seeding import GLOBAL_RANDOM
+
+
+class ReplayBuffer:
+    """
+    Fixed-capacity transition store: states / next_states (capacity, obs_dim) float32,
+    actions int64, rewards float32, dones bool. Once full, each add overwrites the oldest row.
+    With a codec, states / next_states hold the codec's codes and actions are uint8.
+    """
+    def __init__(self, capacity, obs_dim, batch_size=64, rng=GLOBAL_RANDOM, codec=None):
+        self.capacity = capacity
+        self.obs_dim = obs_dim
+        self.rng = rng
+        self.codec = codec
+        if codec is None:
+            state_shape, state_dtype, action_dtype = (obs_dim,), np.float32, np.int64
+        else:
+            state_shape, state_dtype, action_dtype = codec.shape, codec.dtype, np.uint8
+        self.states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+        self.actions = np.zeros(capacity, dtype=action_dtype)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, *state_shape), dtype=state_dtype)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.next_row = 0 # Row the next add writes (the oldest row once the buffer is full)
+        self._allocate_batch(batch_size)
+
+    def _allocate_batch(self, batch_size):
+        if batch_size == getattr(self, "_batch_size", None):
+            return
+        self._batch_size = batch_size
+        self._batch = (np.empty((batch_size, self.obs_dim), dtype=np.float32), np.empty(batch_size, dtype=np.int64),
+                       np.empty(batch_size, dtype=np.float32), np.empty((batch_size, self.obs_dim), dtype=np.float32),
+                       np.empty(batch_size, dtype=bool))
+        self._rows = np.empty(batch_size, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    def bytes_per_transition(self):
+        """Storage bytes of one transition (all fields)."""
+        return sum(field.itemsize * int(np.prod(field.shape[1:]))
+                   for field in (self.states, self.actions, self.rewards, self.next_states, self.dones))
+
+    def nbytes(self):
+        """Bytes of the preallocated storage at full capacity."""
+        return int(self.capacity * self.bytes_per_transition())
+
+    def add(self, state, action, reward, next_state, done):
+        row = self.next_row
+        codec = self.codec
+        self.states[row] = state if codec is None else codec.encode(state)
+        self.actions[row] = action
+        self.rewards[row] = reward
+        self.next_states[row] = next_state if codec is None else codec.encode(next_state)
+        self.dones[row] = done
+        self.next_row = (row + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        return row
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Adds N transitions in order with one vectorized write per field (states as (N, obs_dim)
+        arrays). Same final contents as N add() calls; returns the rows written.
+        """
+        count = len(actions)
+        if count > self.capacity: # Only the newest capacity transitions survive
+            skip = count - self.capacity
+            self.next_row = (self.next_row + skip) % self.capacity
+            self.size = min(self.capacity, self.size + skip)
+            states, actions, rewards, next_states, dones = (field[skip:] for field in
+                                                            (states, actions, rewards, next_states, dones))
+            count = self.capacity
+        rows = (self.next_row + np.arange(count)) % self.capacity
+        codec = self.codec
+        self.states[rows] = states if codec is None else codec.encode_batch(states)
+        self.actions[rows] = actions
+        self.rewards[rows] = rewards
+        self.next_states[rows] = next_states if codec is None else codec.encode_batch(next_states)
+        self.dones[rows] = dones
+        self.next_row = (self.next_row + count) % self.capacity
+        self.size = min(self.capacity, self.size + count)
+        return rows
+
+    def rows(self, positions):
+        """Array rows of positions counted from the oldest stored transition (0 = oldest)."""
+        start = self.next_row if self.size == self.capacity else 0
+        self._allocate_batch(len(positions))
+        out = self._rows
+        out[:] = positions
+        out += start
+        out %= self.capacity
+        return out
+
+    def sample_positions(self, batch_size):
+        # Same draws as random.sample over a deque of the stored transitions (oldest first)
+        return self.rng.sample(range(self.size), batch_size)
+
+    def gather(self, rows):
+        """
+        (states, actions, rewards, next_states, dones) of the given rows, written into reused
+        batch arrays: they stay valid until the next gather / sample.
+        """
+        self._allocate_batch(len(rows))
+        states, actions, rewards, next_states, dones = self._batch
+        if self.codec is None:
+            np.take(self.states, rows, axis=0, out=states)
+            np.take(self.actions, rows, out=actions)
+            np.take(self.next_states, rows, axis=0, out=next_states)
+        else: # Decode only the sampled rows
+            self.codec.decode(self.states[rows], out=states)
+            actions[:] = self.actions[rows]
+            self.codec.decode(self.next_states[rows], out=next_states)
+        np.take(self.rewards, rows, out=rewards)
+        np.take(self.dones, rows, out=dones)
+        return self._batch
+
+    def sample(self, batch_size):
+        """Uniform batch without replacement; returns (rows, batch) with batch as in gather()."""
+        rows = self.rows(self.sample_positions(batch_size))
+        return rows, self.gather(rows)
+
+    def state_dict(self):
+        """Stored transitions and ring position (array views: save or copy them before the next add)."""
+        size = self.size
+        return {"capacity": self.capacity, "size": size, "next_row": self.next_row,
+                "states": self.states[:size], "actions": self.actions[:size], "rewards": self.rewards[:size],
+                "next_states": self.next_states[:size], "dones": self.dones[:size]}
+
+    def load_state_dict(self, state):
+        if (state["capacity"] != self.capacity or np.shape(state["states"])[1:] != self.states.shape[1:]
+                or np.asarray(state["states"]).dtype != self.states.dtype):
+            raise ValueError(f"Replay state of capacity {state['capacity']} and {np.asarray(state['states']).dtype} "
+                             f"states does not fit a buffer of capacity {self.capacity} and "
+                             f"{self.states.dtype} states of shape {self.states.shape[1:]}.")
+        size = self.size = int(state["size"])
+        self.next_row = int(state["next_row"])
+        for field in ("states", "actions", "rewards", "next_states", "dones"):
+            getattr(self, field)[:size] = state[field]
+
+
+class SumTree:
+    """
+    Sum tree over capacity leaves. Each node holds the sum of its FANOUT children; levels[0]
+    is the root and levels[-1] the (zero-padded) leaves. A 16-way tree needs 4 levels for
+    50k rows, so updates and prefix-sum searches do a few array ops per level for a whole
+    batch at once: O(log n) per row with little per-call overhead.
+    """
+    FANOUT = 16
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        fanout = self.FANOUT
+        self.depth = 1
+        while fanout ** self.depth < capacity:
+            self.depth += 1
+        self.levels = [np.zeros(fanout ** d, dtype=np.float64) for d in range(self.depth + 1)]
+        # (nodes, FANOUT) views of each level below the root: row i holds node i's children
+        self._children = [level.reshape(-1, fanout) for level in self.levels[1:]]
+        self._prefix = np.triu(np.ones((fanout, fanout))) # block @ _prefix: running sums over children
+
+    def total(self):
+        return self.levels[0][0]
+
+    def get(self, rows):
+        return self.levels[-1][rows]
+
+    def update(self, rows, values):
+        """Sets the leaves of rows to values and recomputes their ancestors (duplicates allowed)."""
+        index = np.asarray(rows, dtype=np.int64)
+        self.levels[-1][index] = values
+        # Parents are recomputed from all their children, so duplicate indexes write the same sum
+        for depth in range(self.depth - 1, -1, -1):
+            index = index // self.FANOUT
+            self.levels[depth][index] = self._children[depth][index].sum(axis=1)
+
+    def find(self, prefix_sums):
+        """Leaf row of each prefix sum: the first row whose cumulative value exceeds it."""
+        remaining = np.array(prefix_sums, dtype=np.float64)
+        batch = np.arange(len(remaining))
+        index = np.zeros(len(remaining), dtype=np.int64)
+        last_child = self.FANOUT - 1
+        for children in self._children:
+            block = children[index]
+            cumulative = block @ self._prefix # Faster than np.cumsum on (batch, 16) blocks
+            child = np.minimum((cumulative <= remaining[:, None]).sum(axis=1), last_child)
+            remaining -= cumulative[batch, child] - block[batch, child] # Sum of the children before it
+            index = index * self.FANOUT + child
+        return np.minimum(index, self.capacity - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Proportional prioritized replay: row i is sampled with probability p_i^alpha / sum p^alpha,
+    p_i = |TD error| + epsilon. New transitions get the largest priority seen so far, so each
+    is replayed at least once soon after it is added. Importance-sampling weights
+    (N * P(i))^-beta / max weight correct the bias; beta anneals linearly from beta to 1
+    over beta_steps samples.
+    """
+    def __init__(self, capacity, obs_dim, batch_size=64, rng=GLOBAL_RANDOM, codec=None,
+                 alpha=0.6, beta=0.4, beta_steps=100000, epsilon=1e-3):
+        super().__init__(capacity, obs_dim, batch_size, rng, codec)
+        self.alpha = alpha
+        self.beta_start = beta
+        self.beta_steps = beta_steps
+        self.epsilon = epsilon
+        self.tree = SumTree(capacity)
+        self.max_priority = 1.0 # Largest p^alpha so far
+        self.samples_drawn = 0
+
+    def add(self, state, action, reward, next_state, done):
+        row = super().add(state, action, reward, next_state, done)
+        self.tree.update([row], [self.max_priority])
+        return row
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        rows = super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(rows, np.full(len(rows), self.max_priority))
+        return rows
+
+    def bytes_per_transition(self):
+        """Storage bytes of one transition, including its share of the sum tree."""
+        return super().bytes_per_transition() + sum(level.nbytes for level in self.tree.levels) / self.capacity
+
+    def beta(self):
+        progress = min(1.0, self.samples_drawn / self.beta_steps) if self.beta_steps else 1.0
+        return self.beta_start + (1.0 - self.beta_start) * progress
+
+    def sample(self, batch_size):
+        """
+        Stratified proportional batch: one prefix sum per equal slice of the total priority.
+        Returns (rows, batch, weights) with batch as in gather() and float32 IS weights.
+        """
+        tree = self.tree
+        total = tree.total()
+        offsets = np.array([self.rng.random() for _ in range(batch_size)])
+        rows = tree.find((np.arange(batch_size) + offsets) * (total / batch_size))
+        rows = np.minimum(rows, self.size - 1) # Guard against float round-off past the last row
+        probabilities = tree.get(rows) / total
+        weights = (self.size * probabilities) ** -self.beta()
+        weights = (weights / weights.max()).astype(np.float32)
+        self.samples_drawn += 1
+        return rows, self.gather(rows), weights
+
+    def state_dict(self):
+        state = super().state_dict()
+        state.update(priorities=self.tree.get(np.arange(self.size)), max_priority=self.max_priority,
+                     samples_drawn=self.samples_drawn)
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree = SumTree(self.capacity)
+        self.tree.update(np.arange(self.size), state["priorities"])
+        self.max_priority = float(state["max_priority"])
+        self.samples_drawn = int(state["samples_drawn"])
+
+    def update_priorities(self, rows, td_errors):
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.tree.update(rows, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
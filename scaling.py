@@ -0,0 +1,37 @@
+# scaling.py
+"""
+Board-size scaling rules.
+
+The game was designed on the 4x4 board. Boards from 4x4 up to 256x256 scale the player's
+stock and placement limits, the boss's HP and heal, and the reach of the boss skills
+(line-shot charges, ultimate targets) linearly with the board side: a g x g board gets
+g / 4 times the 4x4 values. Unit counts therefore grow with the side while cells grow with
+its square, so large boards stay sparse. On the 4x4 board every value is the original one.
+"""
+BASE_GRID_SIZE = 4 # Board the base values below were designed for
+MIN_GRID_SIZE = 4
+MAX_GRID_SIZE = 256
+
+BASE_SHOT_CHARGES = 4      # Charges per line shot
+BASE_ULTIMATE_TARGETS = 6  # Cells hit by the ultimate
+BASE_UNITS_ROUND_1 = 7     # Placements allowed in round 1
+BASE_UNITS_LATER_ROUNDS = 2
+
+
+def check_grid_size(grid_size):
+    if not MIN_GRID_SIZE <= grid_size <= MAX_GRID_SIZE:
+        raise ValueError(f"grid_size must be between {MIN_GRID_SIZE} and {MAX_GRID_SIZE}, got {grid_size}.")
+    return grid_size
+
+
+def scaled(base, grid_size):
+    """base (a 4x4 value) scaled linearly with the board side; at least 1."""
+    return max(1, base * grid_size // BASE_GRID_SIZE)
+
+
+def shot_charges(grid_size):
+    return scaled(BASE_SHOT_CHARGES, grid_size)
+
+
+def ultimate_targets(grid_size):
+    return scaled(BASE_ULTIMATE_TARGETS, grid_size)
@@ -0,0 +1,69 @@
+# seeding.py
+"""
+Explicit random streams for reproducible (parallel) rollouts.
+
+Every GameLogic, environment and agent can own a random.Random instead of sharing the
+global random module. Streams are derived from numpy SeedSequences, so any number of
+independent streams can be spawned from one root seed:
+
+    game_seed, agent_seed = spawn(seed, 2)
+    rng = python_rng(game_seed)
+
+episode_seed(seed, i) is the stream of episode i. It does not depend on which worker plays
+the episode or in what order, so a fixed-seed run is bit-identical for any number of
+workers (see headless_training.run_seeded_rollouts).
+
+Objects built without a seed use GLOBAL_RANDOM, i.e. the global random module, as before.
+"""
+import random
+
+import numpy as np
+
+
+class _GlobalRandom:
+    """The global random module's stream behind a random.Random-like object (pickles by reference)."""
+    randint = staticmethod(random.randint)
+    randrange = staticmethod(random.randrange)
+    choice = staticmethod(random.choice)
+    shuffle = staticmethod(random.shuffle)
+    sample = staticmethod(random.sample)
+    getstate = staticmethod(random.getstate)
+    setstate = staticmethod(random.setstate)
+    random = staticmethod(random.random) # Last: shadows the module name inside the class body
+
+    def __reduce__(self):
+        return "GLOBAL_RANDOM" # Copies and pickles resolve to the same shared object
+
+
+GLOBAL_RANDOM = _GlobalRandom()
+
+
+def seed_sequence(seed=None):
+    """seed (int, sequence of ints, SeedSequence or None for fresh entropy) as a SeedSequence."""
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def spawn(seed, n):
+    """n independent child SeedSequences of seed."""
+    return seed_sequence(seed).spawn(n)
+
+
+def episode_seed(seed, index):
+    """SeedSequence of episode index under root seed; equal to the index-th child of spawn()."""
+    root = seed_sequence(seed)
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (index,),
+                                  pool_size=root.pool_size)
+
+
+def int_seed(seed, bits=64):
+    """Plain integer seed drawn from a SeedSequence (for random.Random / torch.manual_seed)."""
+    words = seed_sequence(seed).generate_state(bits // 32, np.uint32)
+    return sum(int(word) << (32 * i) for i, word in enumerate(words))
+
+
+def python_rng(seed):
+    return random.Random(int_seed(seed))
+
+
+def numpy_rng(seed):
+    return np.random.default_rng(seed_sequence(seed))
@@ -0,0 +1,432 @@
+# solver.py
+"""
+Exact expectimax solver for the boss's side of the game.
+
+The player is the training player (headless_training.RandomPlacementPlayer): every placement
+picks a unit type uniformly among those with stock left, then an empty cell uniformly. The
+solver enumerates those placements exactly (chance nodes) and maximizes the boss's summed
+reward over its actions (decision nodes). It uses the same rules and rewards as training,
+because every transition runs on a private GameLogic through snapshot/restore.
+
+    - States are keyed canonically: the board is reduced under row / column mirroring
+      (4 symmetries), and the rest of the state is packed into a second integer.
+    - A transposition table caches decision and chance values.
+    - Decision nodes try every action that hits as many units as its skill allows. That is
+      a normal attack on any unit, a line shot on any row/column holding units (plus one
+      empty line if all are empty), heal, and an ultimate on any set of min(6, units)
+      units. Actions that only differ by hitting other empty cells lead to the same state
+      and are tried once.
+
+Solving from round 1 is out of reach: each chance layer multiplies the work by ~10^3. The
+table builder therefore solves the last few boss decisions (decisions_left, default 2)
+of states sampled from real games. The on-disk table (npz) stores per canonical state the
+optimal value of each skill and the optimal concrete action:
+
+    python solver.py build --games 300 --decisions-left 2 --out Model/solver_table.npz
+    python solver.py grade --table Model/solver_table.npz --model Model/dqn_boss_agent.pth
+
+TableBoss plays from the table with one dict lookup per decision. States that are not in
+the table are solved on the spot when few decisions are left, or handled by a fallback agent.
+"""
+import os
+import sys
+import random
+import argparse
+import itertools
+
+import numpy as np
+
+from game_logic import GameLogic, GameSnapshot, BOSS_SKILL_INDEX
+from units import PLAYER_UNIT_SPECS, CELL_STATES, CELL_STATE_OFFSET, CELL_STATE_DECODE
+from targeting import heuristic_skill_params
+
+SKILL_KEYS = list(BOSS_SKILL_INDEX) # Index order of BOSS_SKILL_INDEX / agent.ACTION_MAP_AGENT
+NUM_SKILLS = len(SKILL_KEYS)
+MISS_TARGET = 0xFFFF # Target code of a normal attack with no unit to hit
+SHOT_DIRECTIONS = {"horizontal_shot": ("ltr", "rtl"), "vertical_shot": ("ttb", "btt")}
+SOLVER_TABLE_FILE = os.path.join("Model", "solver_table.npz")
+
+
+class StateCodec:
+    """
+    Packs a GameSnapshot into a canonical (hi, lo) pair of uint64-sized ints and back.
+    lo is the board in base CELL_STATES; hi packs round, boss HP / rage / cooldowns, stock
+    and a chance-node flag. Symmetry transform t: bit 0 mirrors rows, bit 1 mirrors columns.
+    """
+    def __init__(self, grid_size=4, boss=None, max_rounds=9):
+        if CELL_STATES ** (grid_size * grid_size) >= 2 ** 64:
+            raise ValueError(f"A {grid_size}x{grid_size} board does not fit the solver's 64-bit board key.")
+        boss = boss if boss is not None else GameLogic(grid_size=grid_size).boss
+        self.grid_size = grid_size
+        self.num_cells = grid_size * grid_size
+        last = grid_size - 1
+        # cell_maps[t][i] = cell that lands on cell i under transform t (transforms are involutions)
+        self.cell_maps = []
+        for t in range(4):
+            self.cell_maps.append([(last - r if t & 1 else r) * grid_size + (last - c if t & 2 else c)
+                                   for r in range(grid_size) for c in range(grid_size)])
+        self.radixes = ([max_rounds + 1, boss.max_hp + 1, boss.max_rage + 1]
+                        + [skill["cd"] + 1 for skill in boss.skills.values()]
+                        + [spec["max_accumulation"] + 1 for spec in PLAYER_UNIT_SPECS.values()] + [2])
+        self._powers = [CELL_STATES ** i for i in range(self.num_cells)]
+
+    def board_states(self, board_snapshot):
+        types, hp = board_snapshot
+        return [CELL_STATE_OFFSET[t] + h - 1 if t else 0 for t, h in zip(types, hp)]
+
+    def encode(self, snap, chance=False):
+        """Returns (hi, lo, t): canonical key and the transform that maps snap onto it."""
+        states = self.board_states(snap.board)
+        best_lo, best_t = None, 0
+        powers = self._powers
+        for t, cell_map in enumerate(self.cell_maps):
+            lo = 0
+            for i, src in enumerate(cell_map):
+                state = states[src]
+                if state:
+                    lo += state * powers[i]
+            if best_lo is None or lo < best_lo:
+                best_lo, best_t = lo, t
+        fields = ([snap.current_round, snap.boss_hp, snap.boss_rage] + list(snap.cooldowns)
+                  + list(snap.stock) + [1 if chance else 0])
+        hi = 0
+        for value, radix in zip(fields, self.radixes):
+            hi = hi * radix + value
+        return hi, best_lo, best_t
+
+    def decode(self, hi, lo):
+        """GameSnapshot of a decision key (canonical orientation, boss to move)."""
+        fields = []
+        for radix in reversed(self.radixes):
+            hi, value = divmod(hi, radix)
+            fields.append(value)
+        fields.reverse()
+        current_round, boss_hp, boss_rage = fields[:3]
+        cooldowns = tuple(fields[3:8])
+        stock = tuple(fields[8:8 + len(PLAYER_UNIT_SPECS)])
+        types, hp = bytearray(self.num_cells), bytearray(self.num_cells)
+        for i in range(self.num_cells):
+            lo, state = divmod(lo, CELL_STATES)
+            types[i], hp[i] = CELL_STATE_DECODE[state]
+        return GameSnapshot((bytes(types), bytes(hp)), boss_hp, boss_rage, cooldowns, stock,
+                            current_round, 0, 0, "BOSS_ATTACK")
+
+    # --- Actions as (skill index, target code), mapped through symmetry transforms ---
+    def transform_action(self, skill_idx, target, t):
+        if not t:
+            return target
+        skill_key = SKILL_KEYS[skill_idx]
+        last = self.grid_size - 1
+        if skill_key == "normal_attack":
+            return target if target == MISS_TARGET else self.cell_maps[t][target]
+        if skill_key in SHOT_DIRECTIONS:
+            line, reverse = divmod(target, 2)
+            line_flip, dir_flip = (t & 1, t & 2) if skill_key == "horizontal_shot" else (t & 2, t & 1)
+            return (last - line if line_flip else line) * 2 + (reverse ^ (1 if dir_flip else 0))
+        if skill_key == "ultimate":
+            cell_map = self.cell_maps[t]
+            return sum(1 << cell_map[cell] for cell in range(self.num_cells) if target >> cell & 1)
+        return target
+
+    def action_params(self, skill_idx, target):
+        """process_boss_attack params of an encoded action."""
+        skill_key = SKILL_KEYS[skill_idx]
+        size = self.grid_size
+        if skill_key == "normal_attack":
+            return [] if target == MISS_TARGET else [divmod(target, size)]
+        if skill_key in SHOT_DIRECTIONS:
+            line, reverse = divmod(target, 2)
+            return {"line_idx": line, "direction": SHOT_DIRECTIONS[skill_key][reverse]}
+        if skill_key == "ultimate":
+            return [divmod(cell, size) for cell in range(self.num_cells) if target >> cell & 1]
+        return {}
+
+
+def decisions_left(current_round, max_rounds):
+    """Boss decisions still to come in a game whose boss is about to act in current_round."""
+    return max_rounds - current_round
+
+
+class ExactSolver:
+    def __init__(self, grid_size=4, max_rounds=9):
+        self.sim = GameLogic(grid_size=grid_size, max_rounds=max_rounds, state_dicts=False, action_log=False)
+        self.codec = StateCodec(grid_size, self.sim.boss, max_rounds)
+        self.max_rounds = max_rounds
+        # Transposition tables: decision key -> (value, q per skill, best skill, best target)
+        # in canonical orientation; chance key -> expected value
+        self.decisions = {}
+        self.chances = {}
+
+    def _actions(self, snap):
+        """Encoded (skill index, target) actions for the decision state currently in self.sim."""
+        board = self.sim.board
+        size = board.size
+        occupied = sorted(set().union(*board.cells_by_type))
+        actions = []
+        for skill_key in self.sim.boss.get_available_skills_keys():
+            skill_idx = BOSS_SKILL_INDEX[skill_key]
+            if skill_key == "normal_attack":
+                actions.extend((skill_idx, cell) for cell in occupied)
+                if not occupied:
+                    actions.append((skill_idx, MISS_TARGET))
+            elif skill_key in SHOT_DIRECTIONS:
+                occupancy = board.col_cells if skill_key == "vertical_shot" else board.row_cells
+                lines = [idx for idx in range(size) if occupancy[idx]]
+                if len(lines) < size:
+                    lines.append(next(idx for idx in range(size) if not occupancy[idx])) # All empty lines are alike
+                actions.extend((skill_idx, line * 2 + reverse) for line in lines for reverse in (0, 1))
+            elif skill_key == "ultimate":
+                targets = min(self.sim.boss.skills["ultimate"]["targets"], len(occupied))
+                actions.extend((skill_idx, sum(1 << cell for cell in cells))
+                               for cells in itertools.combinations(occupied, targets))
+            else:
+                actions.append((skill_idx, 0))
+        return actions
+
+    def solve(self, snap):
+        """Optimal expected boss return from a decision state (boss to move). Returns the table entry."""
+        hi, lo, t = self.codec.encode(snap)
+        entry = self.decisions.get((hi, lo))
+        if entry is not None:
+            return entry
+        sim = self.sim
+        sim.restore(snap)
+        q = [float("nan")] * NUM_SKILLS
+        best_value, best_action = -float("inf"), None
+        results = {} # Post-action chance key -> value (actions with identical outcomes are solved once)
+        for skill_idx, target in self._actions(snap):
+            sim.restore(snap)
+            outcome = sim.process_boss_attack(forced_action=(SKILL_KEYS[skill_idx], self.codec.action_params(skill_idx, target)))
+            value, done = outcome[4], outcome[5]
+            if not done:
+                status, _msg, _state = sim.proceed_to_next_round()
+                done = status == "game_over" or sim.check_game_over_conditions()[0]
+            if not done:
+                after = sim.snapshot()
+                chance_key = self.codec.encode(after, chance=True)[:2]
+                if chance_key not in results:
+                    results[chance_key] = self._chance_value(after, chance_key)
+                value += results[chance_key]
+            if not value <= q[skill_idx]: # Also replaces NaN
+                q[skill_idx] = value
+            if value > best_value:
+                best_value, best_action = value, (skill_idx, target)
+        skill_idx, target = best_action
+        entry = (best_value, q, skill_idx, self.codec.transform_action(skill_idx, target, t))
+        self.decisions[(hi, lo)] = entry
+        return entry
+
+    def _chance_value(self, snap, chance_key):
+        value = self.chances.get(chance_key)
+        if value is not None:
+            return value
+        sim = self.sim
+        outcomes = {} # Canonical post-placement key -> [probability, snapshot]
+        self._enumerate_placements(snap, 1.0, outcomes)
+        value = 0.0
+        for probability, placed in outcomes.values():
+            sim.restore(placed)
+            player = sim.end_placement_phase()
+            outcome_value = player[4]
+            if not player[5]:
+                outcome_value += self.solve(sim.snapshot())[0]
+            value += probability * outcome_value
+        self.chances[chance_key] = value
+        return value
+
+    def _enumerate_placements(self, snap, probability, outcomes):
+        """All placement sequences of RandomPlacementPlayer from snap, merged by resulting state."""
+        sim = self.sim
+        sim.restore(snap)
+        types = [name for name, count in sim.player_current_accumulation.items() if count > 0]
+        empty_cells = sim.board.empty_positions()
+        if not sim.can_place_more_units_this_round() or not types or not empty_cells:
+            key = self.codec.encode(snap)[:2]
+            if key in outcomes:
+                outcomes[key][0] += probability
+            else:
+                outcomes[key] = [probability, snap]
+            return
+        p = probability / (len(types) * len(empty_cells))
+        for name in types:
+            for r, c in empty_cells:
+                sim.restore(snap)
+                sim.place_unit_from_stock(name, r, c)
+                self._enumerate_placements(sim.snapshot(), p, outcomes)
+
+    # --- On-disk table ---
+    def save(self, path):
+        keys = list(self.decisions)
+        entries = [self.decisions[key] for key in keys]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            key_hi=np.array([key[0] for key in keys], dtype=np.uint64),
+            key_lo=np.array([key[1] for key in keys], dtype=np.uint64),
+            q=np.array([entry[1] for entry in entries], dtype=np.float32).reshape(-1, NUM_SKILLS),
+            best_skill=np.array([entry[2] for entry in entries], dtype=np.uint8),
+            best_target=np.array([entry[3] for entry in entries], dtype=np.uint16),
+            meta=np.array([self.codec.grid_size, self.max_rounds], dtype=np.int64))
+
+
+class SolverTable:
+    """Read-only solved table: canonical key -> (q per skill, best skill, best target in canonical frame)."""
+    def __init__(self, path=SOLVER_TABLE_FILE):
+        data = np.load(path)
+        grid_size, self.max_rounds = (int(v) for v in data["meta"])
+        self.codec = StateCodec(grid_size, max_rounds=self.max_rounds)
+        self.q = data["q"]
+        self.best_skill = data["best_skill"]
+        self.best_target = data["best_target"]
+        self.key_hi = data["key_hi"]
+        self.key_lo = data["key_lo"]
+        self.index = {(int(hi), int(lo)): i for i, (hi, lo) in enumerate(zip(self.key_hi, self.key_lo))}
+
+    def __len__(self):
+        return len(self.index)
+
+    def lookup(self, snap):
+        """(row index, transform) of a decision state, or (None, t) if it is not in the table."""
+        hi, lo, t = self.codec.encode(snap)
+        return self.index.get((hi, lo)), t
+
+    def best_action(self, row, t):
+        skill_idx = int(self.best_skill[row])
+        return skill_idx, self.codec.transform_action(skill_idx, int(self.best_target[row]), t)
+
+
+class TableBoss:
+    """
+    Boss controller playing the solved table (plug in as GameLogic's agent_instance).
+    On a table miss with at most online_decisions_left decisions to go the state is solved
+    on the spot (and cached); otherwise the fallback agent decides (random skill with
+    heuristic targets if there is none).
+    """
+    def __init__(self, table=None, fallback=None, online_decisions_left=1):
+        self.table = table
+        self.fallback = fallback
+        self.online_decisions_left = online_decisions_left
+        self.boss_skills_ref = None
+        self.epsilon = 0.0
+        self.game = None
+        self.solver = None
+        self.stats = {"table": 0, "solved": 0, "fallback": 0}
+
+    def attach_game(self, game):
+        self.game = game
+        self.solver = ExactSolver(game.grid_size, game.max_rounds)
+        if hasattr(self.fallback, "attach_game"):
+            self.fallback.attach_game(game)
+
+    def _discretize_state(self, game_state_dict):
+        return self.fallback._discretize_state(game_state_dict) if self.fallback else None
+
+    def choose_action(self, state_vector, available_skill_keys, grid_units_for_targeting, forced_action_idx=None):
+        game = self.game
+        if forced_action_idx is None:
+            snap = game.snapshot()
+            row, t = self.table.lookup(snap) if self.table is not None else (None, 0)
+            if row is not None:
+                skill_idx, target = self.table.best_action(row, t)
+                self.stats["table"] += 1
+                return SKILL_KEYS[skill_idx], self.solver.codec.action_params(skill_idx, target), skill_idx
+            if decisions_left(game.current_round, game.max_rounds) <= self.online_decisions_left:
+                _value, _q, skill_idx, target = self.solver.solve(snap)
+                _hi, _lo, t = self.solver.codec.encode(snap)
+                target = self.solver.codec.transform_action(skill_idx, target, t)
+                self.stats["solved"] += 1
+                return SKILL_KEYS[skill_idx], self.solver.codec.action_params(skill_idx, target), skill_idx
+        self.stats["fallback"] += 1
+        if self.fallback is not None:
+            return self.fallback.choose_action(state_vector, available_skill_keys, grid_units_for_targeting, forced_action_idx)
+        skill_key = SKILL_KEYS[forced_action_idx] if forced_action_idx is not None else random.choice(available_skill_keys)
+        if skill_key not in available_skill_keys:
+            return None, [], None
+        return skill_key, heuristic_skill_params(skill_key, grid_units_for_targeting), BOSS_SKILL_INDEX[skill_key]
+
+    def learn(self, *args):
+        pass
+
+
+# --- Table building / grading ---
+def sample_decision_states(num_games, max_decisions_left, seed=0):
+    """Decision states (boss to move) with at most max_decisions_left decisions left, from random games."""
+    from headless_training import BossAssaultEnv
+    env = BossAssaultEnv(state_dicts=False, seed=seed)
+    game = env.game
+    states = []
+    for _ in range(num_games):
+        env.reset()
+        while not env.done:
+            if decisions_left(game.current_round, game.max_rounds) <= max_decisions_left:
+                states.append(game.snapshot())
+            env.step()
+    return states
+
+
+def build_table(num_games, max_decisions_left=2, out=SOLVER_TABLE_FILE, seed=0, verbose=True):
+    solver = ExactSolver()
+    states = sample_decision_states(num_games, max_decisions_left, seed)
+    for i, snap in enumerate(states):
+        solver.solve(snap)
+        if verbose and (i + 1) % 50 == 0:
+            print(f"Solved {i + 1}/{len(states)} sampled states; table has {len(solver.decisions)} decision states")
+    solver.save(out)
+    if verbose:
+        print(f"Saved {len(solver.decisions)} solved decision states to {out}")
+    return solver
+
+
+def grade_agent(agent, table):
+    """
+    Grades an agent's skill choice on every table state. Regret is the optimal value minus
+    the optimal value of the agent's skill (its targets are taken as optimal too).
+    Returns {"states", "optimal_rate", "mean_regret"}.
+    """
+    from state_encoding import encode_observation
+    game = GameLogic(grid_size=table.codec.grid_size, max_rounds=table.max_rounds, state_dicts=False, action_log=False)
+    saved_epsilon = getattr(agent, "epsilon", 0.0)
+    agent.epsilon = 0.0
+    regrets = []
+    optimal = 0
+    try:
+        for row, (hi, lo) in enumerate(zip(table.key_hi, table.key_lo)):
+            game.restore(table.codec.decode(int(hi), int(lo)))
+            available = game.boss.get_available_skills_keys()
+            skill_key, _params, skill_idx = agent.choose_action(encode_observation(game), available, game.board)
+            q = table.q[row]
+            regret = float(np.nanmax(q) - q[skill_idx]) if skill_idx is not None else float(np.nanmax(q))
+            regrets.append(regret)
+            optimal += regret <= 1e-6
+    finally:
+        agent.epsilon = saved_epsilon
+    return {"states": len(regrets), "optimal_rate": optimal / max(1, len(regrets)),
+            "mean_regret": float(np.mean(regrets)) if regrets else 0.0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exact boss solver: build the solved table or grade an agent.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Solve sampled end-game states and write the table.")
+    p_build.add_argument("--games", type=int, default=300)
+    p_build.add_argument("--decisions-left", type=int, default=2)
+    p_build.add_argument("--out", default=SOLVER_TABLE_FILE)
+    p_build.add_argument("--seed", type=int, default=0)
+    p_grade = sub.add_parser("grade", help="Grade a DQN checkpoint against the table.")
+    p_grade.add_argument("--table", default=SOLVER_TABLE_FILE)
+    p_grade.add_argument("--model", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_table(args.games, args.decisions_left, args.out, args.seed)
+    else:
+        from agent import DQNAgent
+        agent = DQNAgent()
+        agent.load(args.model)
+        result = grade_agent(agent, SolverTable(args.table))
+        print(f"{result['states']} states: optimal skill {result['optimal_rate'] * 100:.1f}%, "
+              f"mean regret {result['mean_regret']:.3f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
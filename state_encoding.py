@@ -0,0 +1,256 @@
+# state_encoding.py
+"""
+Observation encoding for the boss agent (torch-free).
+
+The agent sees 9 normalized features:
+    (hp, rage, cd_hshot, cd_vshot, cd_heal, tanks, knights, ads, round)
+
+get_game_state_for_q_table builds the legacy state dict. ObservationWriter / encode_observation
+write the same features straight from a live GameLogic (boss attributes and the board's
+unit counts) into a preallocated float32 buffer or a row of a batch matrix, without building
+the dict or a new array.
+"""
+import numpy as np
+
+from units import UNIT_TYPE_CODES
+
+# --- State Discretization Parameters ---
+HP_BINS = 5
+RAGE_BINS = 4
+CD_STATES_PER_SKILL = {"horizontal_shot": 3, "vertical_shot": 3, "heal": 4}
+NUM_TANK_BINS = 4
+NUM_KNIGHT_BINS = 4
+NUM_AD_BINS = 5
+ROUND_BINS = 9
+
+OBS_DIM = 9
+
+# Denominators of the normalized features (same order as the observation vector)
+_RAGE_DIV = RAGE_BINS - 1
+_CD_HSHOT_DIV = CD_STATES_PER_SKILL["horizontal_shot"] - 1
+_CD_VSHOT_DIV = CD_STATES_PER_SKILL["vertical_shot"] - 1
+_CD_HEAL_DIV = CD_STATES_PER_SKILL["heal"] - 1
+_TANK_DIV = NUM_TANK_BINS - 1
+_KNIGHT_DIV = NUM_KNIGHT_BINS - 1
+_AD_DIV = NUM_AD_BINS - 1
+_ROUND_DIV = ROUND_BINS - 1
+_TANK, _KNIGHT, _AD = UNIT_TYPE_CODES["Tank"], UNIT_TYPE_CODES["Knight"], UNIT_TYPE_CODES["AD"]
+
+
+def _flat_view(buffer):
+    if buffer.dtype != np.float32 or not buffer.flags.c_contiguous:
+        raise ValueError("Observation buffer must be a C-contiguous float32 array.")
+    return memoryview(buffer).cast('B').cast('f')
+
+
+class ObservationWriter:
+    """
+    Writes observations into a fixed float32 buffer: a 1-D array of OBS_DIM values or a
+    (rows, OBS_DIM) batch matrix. Writes go through a cached flat memoryview, so encoding a
+    state allocates nothing.
+    """
+    __slots__ = ("buffer", "_flat")
+
+    def __init__(self, buffer=None):
+        if buffer is None:
+            buffer = np.zeros(OBS_DIM, dtype=np.float32)
+        if buffer.shape[-1] != OBS_DIM:
+            raise ValueError(f"Observation buffer last dimension must be {OBS_DIM}, got {buffer.shape}.")
+        self.buffer = buffer
+        self._flat = _flat_view(buffer)
+
+    def __reduce__(self):
+        # memoryviews cannot be pickled / deep-copied; rebuild the view over the (copied) buffer
+        return self.__class__, (self.buffer,)
+
+    def write(self, game, row=0):
+        """Encodes the live game state of a GameLogic into buffer (or buffer[row])."""
+        boss = game.boss
+        skills = boss.skills
+        counts = game.board.type_counts
+        max_hp = boss.max_hp
+        out = self._flat
+        base = row * OBS_DIM
+        out[base] = boss.current_hp / max_hp if max_hp > 0 else 0.0
+        out[base + 1] = boss.current_rage / _RAGE_DIV
+        out[base + 2] = skills["horizontal_shot"]["cd_timer"] / _CD_HSHOT_DIV
+        out[base + 3] = skills["vertical_shot"]["cd_timer"] / _CD_VSHOT_DIV
+        out[base + 4] = skills["heal"]["cd_timer"] / _CD_HEAL_DIV
+        out[base + 5] = counts[_TANK] / _TANK_DIV
+        out[base + 6] = counts[_KNIGHT] / _KNIGHT_DIV
+        out[base + 7] = counts[_AD] / _AD_DIV
+        out[base + 8] = max(0, game.current_round - 1) / _ROUND_DIV
+        return self.buffer
+
+    def write_state_dict(self, game_state_dict, row=0):
+        """Encodes a get_game_state_for_q_table dict (legacy callers) into buffer (or buffer[row])."""
+        max_hp = game_state_dict.get("boss_max_hp", 50) # Default to 50 if not found for safety
+        cooldowns = game_state_dict["skill_cooldowns"]
+        counts = game_state_dict["unit_counts"]
+        out = self._flat
+        base = row * OBS_DIM
+        out[base] = game_state_dict["boss_hp"] / max_hp if max_hp > 0 else 0.0
+        out[base + 1] = game_state_dict["boss_rage"] / _RAGE_DIV
+        out[base + 2] = cooldowns["horizontal_shot"] / _CD_HSHOT_DIV
+        out[base + 3] = cooldowns["vertical_shot"] / _CD_VSHOT_DIV
+        out[base + 4] = cooldowns["heal"] / _CD_HEAL_DIV
+        out[base + 5] = counts["Tank"] / _TANK_DIV
+        out[base + 6] = counts["Knight"] / _KNIGHT_DIV
+        out[base + 7] = counts["AD"] / _AD_DIV
+        out[base + 8] = max(0, game_state_dict["current_round"] - 1) / _ROUND_DIV
+        return self.buffer
+
+
+def encode_observation(game, out=None, row=None):
+    """
+    One-off encoding of a GameLogic into out (1-D) or out[row] (2-D); allocates out if None.
+    Hot loops should keep an ObservationWriter instead.
+    """
+    if out is None:
+        out = np.empty(OBS_DIM, dtype=np.float32)
+    ObservationWriter(out).write(game, 0 if row is None else row)
+    return out
+
+
+def encode_state_dict(game_state_dict, out=None, row=None):
+    if out is None:
+        out = np.empty(OBS_DIM, dtype=np.float32)
+    ObservationWriter(out).write_state_dict(game_state_dict, 0 if row is None else row)
+    return out
+
+
+def get_game_state_for_q_table(game_logic_instance):
+    boss=game_logic_instance.boss
+    board=game_logic_instance.board
+
+    state_dict={}
+    state_dict["boss_hp"]=boss.current_hp
+    state_dict["boss_max_hp"]=boss.max_hp
+    state_dict["boss_rage"]=boss.current_rage
+    state_dict["skill_cooldowns"]={
+        "horizontal_shot":boss.skills["horizontal_shot"]["cd_timer"],
+        "vertical_shot":boss.skills["vertical_shot"]["cd_timer"],
+        "heal":boss.skills["heal"]["cd_timer"],
+    }
+
+    unit_counts={name:board.count(code) for name,code in UNIT_TYPE_CODES.items()}
+    state_dict["unit_counts"]=unit_counts
+
+    state_dict["current_round"]=game_logic_instance.current_round
+    return state_dict
+
+
+# Integer denominators of the features without HP (ObservationWriter's divisors); HP is divided by max_hp
+FEATURE_SCALES = (_RAGE_DIV, _CD_HSHOT_DIV, _CD_VSHOT_DIV, _CD_HEAL_DIV, _TANK_DIV, _KNIGHT_DIV, _AD_DIV, _ROUND_DIV)
+
+
+class ObservationCodec:
+    """
+    Lossless integer codes of observations, for compact replay storage. Every feature is an
+    integer level divided by a fixed denominator (feature i = level_i / scales[i]), so an
+    observation is stored as its 9 levels: one uint8 each, or, with packed=True, bit fields
+    of one uint32 (uint64 if the levels need more than 32 bits).
+    Decoding looks the float32 value of each level up in a table built with the same
+    double-precision division as ObservationWriter, so decode(encode(s)) == s bit for bit.
+    """
+    def __init__(self, max_levels, scales, packed=False):
+        self.max_levels = tuple(int(level) for level in max_levels)
+        self.scales = np.array(scales, dtype=np.float64)
+        self.packed = packed
+        if len(self.max_levels) != OBS_DIM or len(self.scales) != OBS_DIM:
+            raise ValueError(f"ObservationCodec needs {OBS_DIM} max levels and scales.")
+        # values[i, level] = float32(level / scales[i]), as written by ObservationWriter
+        levels = np.arange(max(self.max_levels) + 1, dtype=np.float64)
+        self.values = (levels[None, :] / self.scales[:, None]).astype(np.float32)
+        self._flat_values = self.values.ravel()
+        self._offsets = np.arange(OBS_DIM, dtype=np.int64) * self.values.shape[1]
+        self._scale_list = self.scales.tolist()
+        self._value_lists = [row[:max_level + 1] for row, max_level in zip(self.values.tolist(), self.max_levels)]
+        if packed:
+            self.bits = np.array([max(1, level.bit_length()) for level in self.max_levels], dtype=np.int64)
+            self.shifts = np.concatenate(([0], np.cumsum(self.bits)[:-1]))
+            self.masks = (1 << self.bits) - 1
+            self._shift_list = self.shifts.tolist()
+            self.dtype = np.dtype(np.uint32 if self.bits.sum() <= 32 else np.uint64)
+            if self.bits.sum() > 63: # Decoded through int64
+                raise ValueError(f"Observation levels need {self.bits.sum()} bits; packing holds at most 63.")
+            self.shape = ()
+        else:
+            if max(self.max_levels) > np.iinfo(np.uint8).max:
+                raise ValueError(f"Observation levels up to {max(self.max_levels)} do not fit in uint8.")
+            self.dtype = np.dtype(np.uint8)
+            self.shape = (OBS_DIM,)
+
+    @classmethod
+    def for_game(cls, grid_size=4, max_rounds=9, packed=False):
+        """Codec covering every observation of a grid_size board with max_rounds rounds."""
+        from game_logic import GameLogic # Imports this module
+        game = GameLogic(grid_size, max_rounds, state_dicts=False, action_log=False)
+        boss = game.boss
+        skills = boss.skills
+        # Units of each type the player can have drawn from stock by the last round (see q_table.StateLattice)
+        regen = game.player_regeneration_per_round
+        max_counts = [min(stock + regen * (max_rounds - 1), grid_size * grid_size)
+                      for stock in game.player_max_accumulation.values()]
+        # Cooldowns reach cd right after a skill is used (the post-action next_state)
+        max_levels = (boss.max_hp, boss.max_rage, skills["horizontal_shot"]["cd"], skills["vertical_shot"]["cd"],
+                      skills["heal"]["cd"], *max_counts, max_rounds)
+        return cls(max_levels, (boss.max_hp, *FEATURE_SCALES), packed)
+
+    @property
+    def bytes_per_observation(self):
+        return self.dtype.itemsize * (OBS_DIM if not self.packed else 1)
+
+    def encode(self, state):
+        """Code of one observation; ValueError if a feature is not one of the codec's levels."""
+        # Python floats and lists: cheaper than NumPy ops for 9 values, and add() encodes every transition
+        features = state.tolist() if isinstance(state, np.ndarray) else list(state)
+        levels = [int(feature * scale + 0.5) for feature, scale in zip(features, self._scale_list)]
+        for feature, level, max_level, values in zip(features, levels, self.max_levels, self._value_lists):
+            if not (0 <= level <= max_level and values[level] == feature):
+                raise ValueError(f"Observation {features} is not representable by this codec; use float32 "
+                                 "replay storage or a codec built for this game configuration.")
+        if self.packed:
+            return sum(level << shift for level, shift in zip(levels, self._shift_list))
+        return levels
+
+    def encode_batch(self, states):
+        """Codes of (N, OBS_DIM) observations in one vectorized pass (same codes and checks as encode)."""
+        states = np.asarray(states, dtype=np.float32)
+        levels = np.floor(states * self.scales + 0.5).astype(np.int64)
+        in_range = (levels >= 0) & (levels <= self.max_levels)
+        exact = self.values[np.arange(OBS_DIM), np.where(in_range, levels, 0)] == states
+        if not (in_range & exact).all():
+            bad = states[~(in_range & exact).all(axis=1)][0].tolist()
+            raise ValueError(f"Observation {bad} is not representable by this codec; use float32 "
+                             "replay storage or a codec built for this game configuration.")
+        if self.packed:
+            return (levels << self.shifts).sum(axis=1).astype(self.dtype)
+        return levels.astype(np.uint8)
+
+    def decode(self, codes, out=None):
+        """(N, OBS_DIM) float32 observations of N codes (written into out if given)."""
+        if self.packed:
+            levels = (np.asarray(codes, dtype=np.int64)[:, None] >> self.shifts) & self.masks
+        else:
+            levels = codes.astype(np.int64)
+        levels += self._offsets # Index into the flattened value table
+        if out is None:
+            out = np.empty((len(levels), OBS_DIM), dtype=np.float32)
+        np.take(self._flat_values, levels, out=out)
+        return out
+
+
+REPLAY_STORAGE_MODES = ("float32", "uint8", "packed")
+
+
+def replay_codec(storage):
+    """
+    Codec of a replay storage mode: None for "float32", the default 4x4, 9-round game's codec
+    for "uint8" / "packed"; an ObservationCodec (for other configurations) is returned as is.
+    """
+    if isinstance(storage, ObservationCodec) or storage is None:
+        return storage
+    if storage not in REPLAY_STORAGE_MODES:
+        raise ValueError(f"Unknown replay storage {storage!r}; expected one of {REPLAY_STORAGE_MODES}.")
+    return None if storage == "float32" else ObservationCodec.for_game(packed=storage == "packed")
@@ -0,0 +1,51 @@
+# targeting.py
+"""
+Heuristic target selection for boss skills (torch-free).
+
+Used by DQNAgent once it has picked a skill, and by search / rollout code that needs the
+same targeting without a network.
+"""
+from board import Board
+from units import UNIT_TYPE_CODES
+from scaling import ultimate_targets
+from seeding import GLOBAL_RANDOM
+
+
+def heuristic_skill_params(skill_key, grid_units, rng=GLOBAL_RANDOM):
+    """
+    Heuristic skill parameters (targets, directions) for skill_key on the given board:
+    normal attack / ultimate return a list of (r, c) targets, line shots a
+    {"line_idx", "direction"} dict, heal an empty dict. Random choices come from rng.
+    """
+    board = Board.from_grid(grid_units) # Reads the board's indexes; no grid scan, no Unit objects
+    ad_code, knight_code, tank_code = UNIT_TYPE_CODES["AD"], UNIT_TYPE_CODES["Knight"], UNIT_TYPE_CODES["Tank"]
+    soft_target_codes = (ad_code, knight_code)
+
+    params = {}
+    if skill_key=="normal_attack":
+        target_list_normal = []
+        for code in (ad_code, knight_code, tank_code): # Priority: AD, then Knight, then Tank
+            if board.count(code):
+                target_list_normal = [rng.choice(board.positions_of(code))]
+                break
+        return target_list_normal
+
+    elif skill_key=="horizontal_shot":
+        # First row with the most AD/Knight units (row 0 if none); only rows holding them are counted
+        params["line_idx"] = board.best_line(soft_target_codes)
+        params["direction"] = rng.choice(["ltr", "rtl"])
+
+    elif skill_key=="vertical_shot":
+        params["line_idx"] = board.best_line(soft_target_codes, vertical=True)
+        params["direction"] = rng.choice(["ttb", "btt"])
+
+    elif skill_key=="ultimate":
+        num_targets = ultimate_targets(board.size)
+        target_list_ulti = []
+        targets_ulti_temp = board.positions_of(ad_code)+board.positions_of(knight_code)+board.positions_of(tank_code); rng.shuffle(targets_ulti_temp)
+        if len(targets_ulti_temp)<num_targets:
+            targets_ulti_temp.extend(board.random_empty_positions(num_targets-len(targets_ulti_temp), rng))
+        target_list_ulti = targets_ulti_temp[:num_targets]
+        return target_list_ulti
+
+    return params
@@ -0,0 +1,281 @@
+# tournament.py
+"""
+Checkpoint tournament: which saved boss is actually the strongest?
+
+The win rate in training_stats.csv is measured with exploration on and a moving epsilon. This
+evaluator plays every checkpoint greedily (epsilon=0) against the same fixed-seed set of player
+strategies (player_strategies.py): episode i against every opponent is seeded with
+seeding.episode_seed(seed, i) for every checkpoint, so all checkpoints face the same games.
+
+Checkpoints come from .pth files (Model/dqn_boss_*.pth by default) and/or a checkpoint store
+(--store). The parent process reads their policy weights once (torch is only needed for .pth
+files); the matches run in a process pool on policy_inference.NumpyPolicy, without torch.
+Work is split into (checkpoint, opponent, seed range) jobs of --chunk episodes, and the
+results do not depend on the number of workers.
+
+Episode outcomes are kept in an eval_cache.EvalCache (Model/eval_cache by default), keyed by
+the weights hash, opponent, seed and game config. A re-run only plays the episodes that are
+not cached yet: new checkpoints, new opponents or a larger --episodes.
+
+Reported per checkpoint: the boss win rate over all opponents with its 95% Wilson interval,
+the mean episode reward, the mean episode length in boss turns and the win rate against each
+opponent. Checkpoints are ranked by win rate, then mean reward.
+
+    python tournament.py                                   # every Model/dqn_boss_*.pth
+    python tournament.py --episodes 500 --workers 4 --csv Model/tournament.csv
+    python tournament.py --pth '' --store Model/checkpoints --opponents random spread
+    python tournament.py --cache ''                        # play everything, no cache
+"""
+import os
+import csv
+import glob
+import math
+import time
+import argparse
+import multiprocessing
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+from headless_training import BossAssaultEnv, MODEL_DIR
+from checkpoint_store import CheckpointStore, episode_of
+from eval_cache import EvalCache, EVAL_CACHE_DIR, game_config, weights_digest, result_key, empty_results
+from player_strategies import PLAYER_STRATEGIES, make_player
+from policy_inference import NumpyPolicy, WEIGHT_NAMES
+from seeding import episode_seed
+
+# --- Tournament configuration ---
+CHECKPOINT_GLOB = os.path.join(MODEL_DIR, "dqn_boss_*.pth")
+TOURNAMENT_EPISODES = 200 # Per checkpoint and opponent
+TOURNAMENT_SEED = 0
+EPISODES_PER_JOB = 50
+Z_95 = 1.959963984540054 # Two-sided 95% normal quantile
+
+
+class MatchStats(NamedTuple):
+    """Totals of a number of episodes of one checkpoint against one opponent."""
+    episodes: int = 0
+    boss_wins: int = 0
+    reward_sum: float = 0.0
+    turns: int = 0 # Boss decisions
+
+    def __add__(self, other):
+        return MatchStats(*(a + b for a, b in zip(self, other)))
+
+    @property
+    def win_rate(self):
+        return self.boss_wins / self.episodes if self.episodes else 0.0
+
+    @property
+    def mean_reward(self):
+        return self.reward_sum / self.episodes if self.episodes else 0.0
+
+    @property
+    def mean_turns(self):
+        return self.turns / self.episodes if self.episodes else 0.0
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    """Wilson score interval (low, high) of a binomial proportion; (0, 1) for no trials."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+# --- Checkpoints ---
+
+def pth_policy_weights(filepath):
+    """{WEIGHT_NAMES: array} of the policy network of a DQNAgent .pth checkpoint (imports torch)."""
+    import torch
+    checkpoint = torch.load(filepath, map_location="cpu")
+    state = checkpoint['policy_net_state_dict']
+    return {name: state[name.replace("_", ".", 1)].numpy() for name in WEIGHT_NAMES}
+
+
+def load_checkpoints(pth_pattern=CHECKPOINT_GLOB, store_dir=None):
+    """
+    [(name, episode, weights)] of the .pth files matching pth_pattern and of the entries of the
+    checkpoint store in store_dir, sorted by episode (None, e.g. the final model, sorts last).
+    """
+    checkpoints = []
+    for filepath in glob.glob(pth_pattern) if pth_pattern else []:
+        name = os.path.splitext(os.path.basename(filepath))[0].replace("dqn_boss_", "")
+        checkpoints.append((name, episode_of(filepath), pth_policy_weights(filepath)))
+    if store_dir:
+        store = CheckpointStore(store_dir)
+        for entry in store.entries():
+            arrays = store.policy_arrays(entry["name"])
+            checkpoints.append((f"store:{entry['name']}", entry["episode"],
+                                {name: arrays[name].copy() for name in WEIGHT_NAMES})) # Plain arrays pickle to workers
+    checkpoints.sort(key=lambda item: (item[1] is None, item[1] or 0, item[0]))
+    return checkpoints
+
+
+# --- Matches ---
+
+def play_matches(weights, opponent, seed, indexes, max_rounds=9, grid_size=4):
+    """(boss_won, episode_reward, boss turns) of the greedy policy `weights` against `opponent` per episode index."""
+    policy = NumpyPolicy(*(weights[name] for name in WEIGHT_NAMES), epsilon=0.0)
+    env = BossAssaultEnv(agent=policy, player=make_player(opponent), max_rounds=max_rounds,
+                         state_dicts=False, grid_size=grid_size)
+    outcomes = []
+    for index in indexes:
+        env.reset(seed=episode_seed(seed, index)) # Reseeds the game, the player and the policy's targeting
+        turns = 0
+        while not env.done:
+            env.step()
+            turns += 1
+        outcomes.append((bool(env.boss_won), env.episode_reward, turns))
+    return outcomes
+
+
+def _play_job(job):
+    key, weights, opponent, seed, indexes, max_rounds, grid_size = job
+    return key, indexes, play_matches(weights, opponent, seed, indexes, max_rounds, grid_size)
+
+
+def _missing_chunks(played, episodes, chunk):
+    """Indexes below episodes that are not played yet, in lists of at most chunk."""
+    missing = np.flatnonzero(~played[:episodes]).tolist()
+    return [missing[i:i + chunk] for i in range(0, len(missing), chunk)]
+
+
+def match_stats(results, episodes):
+    """MatchStats of episodes [0, episodes) of eval_cache per-episode result arrays."""
+    return MatchStats(episodes, int(results["boss_won"][:episodes].sum()), float(results["reward"][:episodes].sum()),
+                      int(results["turns"][:episodes].sum()))
+
+
+def run_tournament(checkpoints, opponents=tuple(PLAYER_STRATEGIES), episodes=TOURNAMENT_EPISODES,
+                   seed=TOURNAMENT_SEED, workers=1, chunk=EPISODES_PER_JOB, max_rounds=9, grid_size=4, cache=None):
+    """
+    Plays every checkpoint of load_checkpoints against every opponent for `episodes` seeded
+    episodes and returns ({(checkpoint name, opponent): MatchStats}, episode counts).
+    Episodes found in cache (an eval_cache.EvalCache) are not replayed, and every finished
+    (checkpoint, opponent) pair is written back to it. Checkpoints with the same weights share
+    their episodes. The counts are {"played", "cached", "shared"}: episodes played now, loaded
+    from the cache, and reused from another checkpoint with the same weights.
+    """
+    chunk = max(1, chunk)
+    config = game_config(max_rounds, grid_size)
+    keys, episode_results, meta, jobs = {}, {}, {}, []
+    counts = {"played": 0, "cached": 0, "shared": 0}
+    for name, _episode, weights in checkpoints:
+        weights_sha = weights_digest(weights)
+        for opponent in opponents:
+            key = keys[(name, opponent)] = result_key(weights_sha, opponent, seed, config)
+            if key in episode_results:
+                counts["shared"] += episodes # Same weights under another name
+                continue
+            episode_results[key] = cache.load(key, episodes) if cache is not None else empty_results(episodes)
+            counts["cached"] += int(episode_results[key]["played"][:episodes].sum())
+            meta[key] = {"checkpoint": name, "opponent": opponent, "seed": seed, "config": config}
+            jobs += [(key, weights, opponent, seed, indexes, max_rounds, grid_size)
+                     for indexes in _missing_chunks(episode_results[key]["played"], episodes, chunk)]
+
+    pending = Counter(job[0] for job in jobs)
+    def record(key, indexes, outcomes):
+        results = episode_results[key]
+        results["played"][indexes] = True
+        results["boss_won"][indexes], results["reward"][indexes], results["turns"][indexes] = zip(*outcomes)
+        pending[key] -= 1
+        if cache is not None and not pending[key]:
+            cache.save(key, results, meta[key])
+
+    if workers <= 1 or not jobs:
+        for job_result in map(_play_job, jobs):
+            record(*job_result)
+    else:
+        with multiprocessing.get_context("spawn").Pool(min(workers, len(jobs))) as pool:
+            for job_result in pool.imap_unordered(_play_job, jobs): # Results are stored per episode index
+                record(*job_result)
+    results = {pair: match_stats(episode_results[key], episodes) for pair, key in keys.items()}
+    counts["played"] = sum(len(job[4]) for job in jobs)
+    return results, counts
+
+
+def rank_checkpoints(checkpoints, results, opponents):
+    """
+    Rows sorted strongest first: (name, episode, total MatchStats, win rate CI,
+    {opponent: MatchStats}).
+    """
+    rows = []
+    for name, episode, _weights in checkpoints:
+        per_opponent = {opponent: results[(name, opponent)] for opponent in opponents}
+        total = sum(per_opponent.values(), MatchStats())
+        rows.append((name, episode, total, wilson_interval(total.boss_wins, total.episodes), per_opponent))
+    rows.sort(key=lambda row: (-row[2].win_rate, -row[2].mean_reward))
+    return rows
+
+
+def _ranks(rows):
+    """Competition ranks of sorted rows: checkpoints with the same results share a rank."""
+    ranks = []
+    for i, row in enumerate(rows):
+        tied = i and (row[2].win_rate, row[2].mean_reward) == (rows[i - 1][2].win_rate, rows[i - 1][2].mean_reward)
+        ranks.append(ranks[-1] if tied else i + 1)
+    return ranks
+
+
+def print_ranking(rows, opponents):
+    header = f"{'rank':>4} {'checkpoint':>24} {'win rate':>8} {'95% CI':>15} {'reward':>8} {'turns':>6}"
+    print(header + "".join(f" {opponent[:12]:>12}" for opponent in opponents))
+    for rank, (name, _episode, total, (low, high), per_opponent) in zip(_ranks(rows), rows):
+        line = (f"{rank:4d} {name:>24} {total.win_rate:8.3f} {f'[{low:.3f}, {high:.3f}]':>15} "
+                f"{total.mean_reward:8.2f} {total.mean_turns:6.2f}")
+        print(line + "".join(f" {per_opponent[opponent].win_rate:12.3f}" for opponent in opponents))
+
+
+def write_ranking_csv(rows, opponents, filepath):
+    with open(filepath, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["rank", "checkpoint", "episode", "episodes", "win_rate", "ci_low", "ci_high",
+                         "mean_reward", "mean_turns"] + [f"win_rate_{opponent}" for opponent in opponents])
+        for rank, (name, episode, total, (low, high), per_opponent) in zip(_ranks(rows), rows):
+            writer.writerow([rank, name, "" if episode is None else episode, total.episodes,
+                             f"{total.win_rate:.4f}", f"{low:.4f}", f"{high:.4f}", f"{total.mean_reward:.3f}",
+                             f"{total.mean_turns:.3f}"] + [f"{per_opponent[opponent].win_rate:.4f}" for opponent in opponents])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank saved boss checkpoints by greedy play against scripted players.")
+    parser.add_argument("--pth", default=CHECKPOINT_GLOB, help="Glob of .pth checkpoints ('' = none).")
+    parser.add_argument("--store", default=None, help="Also evaluate the entries of this checkpoint store.")
+    parser.add_argument("--opponents", nargs="+", choices=list(PLAYER_STRATEGIES), default=list(PLAYER_STRATEGIES))
+    parser.add_argument("--episodes", type=int, default=TOURNAMENT_EPISODES, help="Episodes per checkpoint and opponent.")
+    parser.add_argument("--seed", type=int, default=TOURNAMENT_SEED)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=EPISODES_PER_JOB, help="Episodes per pool job.")
+    parser.add_argument("--max-rounds", type=int, default=9)
+    parser.add_argument("--grid-size", type=int, default=4)
+    parser.add_argument("--csv", default=None, help="Also write the ranking to this CSV file.")
+    parser.add_argument("--cache", default=EVAL_CACHE_DIR, help="Episode result cache ('' = play everything).")
+    args = parser.parse_args(argv)
+
+    checkpoints = load_checkpoints(args.pth, args.store)
+    if not checkpoints:
+        parser.error("No checkpoints found (see --pth / --store).")
+    print(f"{len(checkpoints)} checkpoints x {len(args.opponents)} opponents x {args.episodes} episodes "
+          f"on {args.workers} worker(s)")
+    cache = EvalCache(args.cache) if args.cache else None
+    start = time.perf_counter()
+    results, counts = run_tournament(checkpoints, args.opponents, args.episodes, args.seed, args.workers,
+                                         args.chunk, args.max_rounds, args.grid_size, cache)
+    elapsed = time.perf_counter() - start
+    rows = rank_checkpoints(checkpoints, results, args.opponents)
+    print_ranking(rows, args.opponents)
+    num_played = counts["played"]
+    print(f"{num_played} episodes played in {elapsed:.1f}s ({num_played / max(elapsed, 1e-9):.0f} episodes/sec), "
+          f"{counts['cached']} from the cache, {counts['shared']} shared by checkpoints with the same weights")
+    if args.csv:
+        write_ranking_csv(rows, args.opponents, args.csv)
+        print(f"Ranking written to {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
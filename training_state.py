@@ -0,0 +1,89 @@
+# training_state.py
+"""
+Resumable training runs.
+
+save_training_state writes everything a training loop needs to continue where it stopped
+into one file:
+- the agent's networks, optimizer and counters, with its replay memory and random streams
+  (DQNAgent.training_state)
+- the global random / np.random / torch RNG states and the game's own stream
+- the index of the last finished episode
+- the rolling stats windows of the TrainingStatsLog
+
+load_training_state restores it. A run resumed from episode N therefore continues exactly as
+the uninterrupted run would have, with the same replay memory and no warm-up.
+
+All files are written atomically (temporary file + os.replace), so a run preempted during
+a save keeps the previous complete file. NumPy arrays are stored as tensors, so the file
+loads with torch.load's default weights_only unpickler.
+"""
+import os
+import random
+
+import numpy as np
+import torch
+
+from seeding import GLOBAL_RANDOM
+from atomic_file import replace_file
+
+TRAINING_STATE_FILE = os.path.join("Model", "training_state.pth")
+SAVE_TRAINING_STATE_EVERY_N_EPISODES = 1000
+
+
+def atomic_save(obj, filepath):
+    """torch.save to filepath through atomic_file.replace_file (temporary file, fsync, rename)."""
+    replace_file(lambda tmp_file: torch.save(obj, tmp_file), filepath)
+
+
+def arrays_to_tensors(state):
+    """Copy of a dict with its NumPy arrays wrapped as tensors (for weights_only loading)."""
+    return {key: torch.from_numpy(np.ascontiguousarray(value)) if isinstance(value, np.ndarray) else value
+            for key, value in state.items()}
+
+
+def tensors_to_arrays(state):
+    return {key: value.numpy() if isinstance(value, torch.Tensor) else value for key, value in state.items()}
+
+
+def global_rng_state(game=None):
+    """States of the global random, np.random and torch generators, plus game.rng if it owns one."""
+    kind, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {"python": random.getstate(),
+             "numpy": (kind, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian),
+             "torch": torch.get_rng_state()}
+    if game is not None and game.rng is not GLOBAL_RANDOM:
+        state["game"] = game.rng.getstate()
+    return state
+
+
+def set_global_rng_state(state, game=None):
+    random.setstate(state["python"])
+    kind, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((kind, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+    torch.set_rng_state(state["torch"])
+    if game is not None and "game" in state:
+        game.rng.setstate(state["game"])
+
+
+def save_training_state(filepath, agent, episode, stats=None, game=None):
+    """Saves the run after `episode` finished episodes (see the module docstring)."""
+    atomic_save({"episode": episode,
+                 "agent": agent.training_state(),
+                 "rng": global_rng_state(game),
+                 "stats": stats.state_dict() if stats is not None else None}, filepath)
+
+
+def load_training_state(filepath, agent, stats=None, game=None):
+    """
+    Restores a save_training_state file into agent (and stats / game) and returns the number
+    of finished episodes to resume after; 0 if there is no file.
+    """
+    if not os.path.exists(filepath):
+        return 0
+    state = torch.load(filepath, map_location=agent.device)
+    agent.load_training_state(state["agent"])
+    set_global_rng_state(state["rng"], game)
+    if stats is not None and state["stats"] is not None:
+        stats.load_state_dict(state["stats"])
+    print(f"Training state loaded from {filepath}: resuming after episode {state['episode']}")
+    return state["episode"]
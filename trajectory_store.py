@@ -0,0 +1,338 @@
+# trajectory_store.py
+"""
+File-backed trajectory store: experience that outlives the training process (torch-free).
+
+TrajectoryWriter appends transitions to segment files in a directory. A segment is one .npy
+file of fixed capacity. It holds a structured array of (state, action, reward, next_state,
+done) records. States use the replay storage modes: float32, or uint8 / bit-packed codes
+(see state_encoding.ObservationCodec). Rows become visible to readers only when they are
+committed. Every commit_every finished episodes, and on close, the writer flushes the
+segment and atomically rewrites its manifest <name>.json, which lists the segment files and
+their committed rows. Readers therefore never see a partial episode. Each writer owns its
+manifest and segments, so any number of trainers and actors can write into one directory
+without locking.
+
+TrajectoryStore opens every committed segment of a directory with numpy.memmap. Nothing is
+copied up front: the OS pages in only the records a batch touches. It samples uniform
+minibatches across all segments, decoded into float32 batch arrays with the sample/gather
+interface of replay.ReplayBuffer. DQNAgent.train_offline trains on it without running the
+simulator, so one batch of simulation output serves many training runs and hyperparameter
+settings.
+
+    python trajectory_store.py record --out Data/run1 --episodes 100000 --epsilon 0.3   # no torch
+    python headless_training.py --episodes 50000 --record Data/run1                      # log while training
+    python trajectory_store.py info --data Data/run1
+    python trajectory_store.py train --data Data/run1 --steps 200000 --model Model/dqn_boss_offline.pth
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+import numpy as np
+
+from state_encoding import OBS_DIM, ObservationCodec, REPLAY_STORAGE_MODES, replay_codec
+from seeding import numpy_rng
+from atomic_file import replace_file
+
+SEGMENT_TRANSITIONS = 1 << 20 # Records per segment file (14-85 MB depending on the storage mode)
+COMMIT_EVERY_N_EPISODES = 100 # Episodes between manifest updates (each one flushes the segment)
+MANIFEST_SUFFIX = ".json"
+
+
+def record_dtype(codec):
+    """Structured dtype of one stored transition (states as codec codes, or float32 if codec is None)."""
+    state = (np.float32, (OBS_DIM,)) if codec is None else (codec.dtype, codec.shape)
+    return np.dtype([("state", *state), ("action", np.uint8), ("reward", np.float32),
+                     ("next_state", *state), ("done", np.bool_)])
+
+
+def _codec_spec(codec):
+    if codec is None:
+        return None
+    return {"max_levels": list(codec.max_levels), "scales": codec.scales.tolist(), "packed": codec.packed}
+
+
+def _codec_from_spec(spec):
+    return None if spec is None else ObservationCodec(spec["max_levels"], spec["scales"], spec["packed"])
+
+
+def _write_json(obj, filepath):
+    """Writes obj to filepath atomically (readers see the old or the new file)."""
+    data = json.dumps(obj).encode()
+    replace_file(lambda out: out.write(data), filepath)
+
+
+class TrajectoryWriter:
+    """
+    Appends transitions to <directory>/<name>-NNNNN.npy segments. A writer reopened on an
+    existing manifest continues it with new segments. Transitions of an episode that is
+    not finished by close() are dropped.
+    """
+    def __init__(self, directory, storage="uint8", name="trajectories", segment_size=SEGMENT_TRANSITIONS,
+                 commit_every=COMMIT_EVERY_N_EPISODES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.segment_size = segment_size
+        self.commit_every = commit_every
+        self.codec = replay_codec(storage)
+        self.dtype = record_dtype(self.codec)
+        self.manifest_file = os.path.join(directory, name + MANIFEST_SUFFIX)
+        self.segments = [] # [{"file", "rows"}]: committed rows per segment
+        self.episodes = 0 # Committed episodes
+        # All writers of a directory share one record layout, so readers can sample across them
+        for manifest_path in glob.glob(os.path.join(directory, "*" + MANIFEST_SUFFIX)):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest["codec"] != _codec_spec(self.codec):
+                raise ValueError(f"{manifest_path} was written with another storage mode than {storage!r}.")
+            if manifest_path == self.manifest_file:
+                self.segments = manifest["segments"]
+                self.episodes = manifest["episodes"]
+        self._written = [segment["rows"] for segment in self.segments] # Rows written, committed or not
+        self._segment = None # Open memmap of the segment being written
+        self._episode_start = None # (segment index, row) of the first transition of the current episode
+        self._finished = 0 # Episodes finished since the last commit
+
+    def __len__(self):
+        return sum(segment["rows"] for segment in self.segments)
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._segment.flush()
+        filename = f"{self.name}-{len(self.segments):05d}.npy"
+        self._segment = np.lib.format.open_memmap(os.path.join(self.directory, filename), mode="w+",
+                                                  dtype=self.dtype, shape=(self.segment_size,))
+        self.segments.append({"file": filename, "rows": 0})
+        self._written.append(0)
+
+    def add(self, state, action, reward, next_state, done):
+        # A reopened writer never appends to an old segment: it may hold rows of a dropped episode
+        if self._segment is None or self._written[-1] == self.segment_size:
+            self._open_segment()
+        if self._episode_start is None:
+            self._episode_start = (len(self.segments) - 1, self._written[-1])
+        codec = self.codec
+        row = self._written[-1]
+        self._segment[row] = (state if codec is None else codec.encode(state), action, reward,
+                              next_state if codec is None else codec.encode(next_state), done)
+        self._written[-1] = row + 1
+
+    def end_episode(self):
+        """Marks the transitions added since the last call as one finished episode."""
+        if self._episode_start is None:
+            return
+        self._episode_start = None
+        self._finished += 1
+        if self._finished >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        """Makes all finished episodes visible to readers."""
+        if self._segment is not None:
+            self._segment.flush()
+        committed = list(self._written)
+        if self._episode_start is not None: # Keep the unfinished episode out of the manifest
+            segment, row = self._episode_start
+            committed[segment] = row
+            committed[segment + 1:] = [0] * (len(committed) - segment - 1)
+        for segment, rows in zip(self.segments, committed):
+            segment["rows"] = rows
+        self.episodes += self._finished
+        self._finished = 0
+        _write_json({"codec": _codec_spec(self.codec), "segment_size": self.segment_size,
+                     "episodes": self.episodes, "segments": self.segments}, self.manifest_file)
+
+    def close(self):
+        self.commit()
+        self._segment = None
+
+
+class TrajectoryStore:
+    """
+    Read-only view of every committed transition in a directory, for sampling. refresh()
+    picks up rows committed by writers since the store was opened.
+    """
+    def __init__(self, directory, batch_size=64, seed=None):
+        self.directory = directory
+        self.rng = numpy_rng(seed) # Fresh entropy without a seed
+        self.codec = None
+        self.dtype = None
+        self.episodes = 0
+        self.size = 0
+        self._files = {} # Segment file -> memmap of the whole file
+        self._segments = [] # Memmaps trimmed to their committed rows
+        self._ends = np.zeros(0, dtype=np.int64) # Cumulative row counts of _segments
+        self._allocate_batch(batch_size)
+        self.refresh()
+
+    def _allocate_batch(self, batch_size):
+        if batch_size == getattr(self, "_batch_size", None):
+            return
+        self._batch_size = batch_size
+        self._batch = (np.empty((batch_size, OBS_DIM), dtype=np.float32), np.empty(batch_size, dtype=np.int64),
+                       np.empty(batch_size, dtype=np.float32), np.empty((batch_size, OBS_DIM), dtype=np.float32),
+                       np.empty(batch_size, dtype=bool))
+
+    def refresh(self):
+        """Rereads the manifests; returns the number of committed transitions."""
+        codec_spec, episodes, segments = (), 0, []
+        for manifest_path in sorted(glob.glob(os.path.join(self.directory, "*" + MANIFEST_SUFFIX))):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if codec_spec != () and manifest["codec"] != codec_spec:
+                raise ValueError(f"{manifest_path} uses another storage mode than the other writers in {self.directory}.")
+            codec_spec = manifest["codec"]
+            episodes += manifest["episodes"]
+            for segment in manifest["segments"]:
+                if segment["rows"]:
+                    if segment["file"] not in self._files:
+                        self._files[segment["file"]] = np.load(os.path.join(self.directory, segment["file"]),
+                                                               mmap_mode="r")
+                    segments.append(self._files[segment["file"]][:segment["rows"]])
+        if codec_spec != ():
+            self.codec = _codec_from_spec(codec_spec)
+            self.dtype = record_dtype(self.codec)
+        self.episodes = episodes
+        self._segments = segments
+        self._ends = np.cumsum([len(segment) for segment in segments], dtype=np.int64)
+        self.size = int(self._ends[-1]) if segments else 0
+        return self.size
+
+    def __len__(self):
+        return self.size
+
+    def bytes_per_transition(self):
+        return self.dtype.itemsize if self.dtype is not None else 0
+
+    def gather(self, rows):
+        """
+        (states, actions, rewards, next_states, dones) of the given store rows (0..len-1 across
+        segments), decoded into reused batch arrays as in ReplayBuffer.gather.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        self._allocate_batch(len(rows))
+        records = np.empty(len(rows), dtype=self.dtype)
+        segment_of = np.searchsorted(self._ends, rows, side="right")
+        starts = self._ends - [len(segment) for segment in self._segments]
+        for segment in np.unique(segment_of):
+            pick = segment_of == segment
+            records[pick] = self._segments[segment][rows[pick] - starts[segment]]
+        states, actions, rewards, next_states, dones = self._batch
+        if self.codec is None:
+            states[:] = records["state"]
+            next_states[:] = records["next_state"]
+        else:
+            self.codec.decode(records["state"], out=states)
+            self.codec.decode(records["next_state"], out=next_states)
+        actions[:] = records["action"]
+        rewards[:] = records["reward"]
+        dones[:] = records["done"]
+        return self._batch
+
+    def sample(self, batch_size):
+        """
+        Uniform batch over all committed transitions; returns (rows, batch) as ReplayBuffer.sample.
+        Rows are drawn with replacement (duplicates are negligible in stores of millions) and
+        sorted, so each segment is read in file order.
+        """
+        if self.size == 0:
+            raise ValueError(f"No committed transitions in {self.directory}.")
+        rows = np.sort(self.rng.integers(self.size, size=batch_size))
+        return rows, self.gather(rows)
+
+
+def record_episodes(writer, env, num_episodes):
+    """Plays num_episodes episodes of env (its agent decides; nothing is trained) into writer."""
+    observations = env.observations
+    for _ in range(num_episodes):
+        env.reset()
+        while not env.done:
+            _next_state_dict, reward, done, info = env.step()
+            if info["action_idx"] is not None:
+                writer.add(observations[0], info["action_idx"], reward, observations[1], done)
+        writer.end_episode()
+
+
+def _cmd_record(args):
+    from headless_training import BossAssaultEnv
+    from policy_inference import NumpyPolicy
+    policy = NumpyPolicy.load(args.policy, epsilon=args.epsilon, seed=args.seed)
+    env = BossAssaultEnv(agent=policy, state_dicts=False, seed=args.seed)
+    writer = TrajectoryWriter(args.out, args.storage, args.name)
+    start = time.perf_counter()
+    try:
+        record_episodes(writer, env, args.episodes)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"{args.episodes} episodes in {elapsed:.1f}s; {args.out} ({args.name}) holds {len(writer)} transitions")
+
+
+def _cmd_info(args):
+    store = TrajectoryStore(args.data)
+    print(f"transitions      : {len(store)}")
+    print(f"episodes         : {store.episodes}")
+    print(f"segments         : {len(store._segments)}")
+    print(f"storage          : {'float32' if store.codec is None else 'packed' if store.codec.packed else 'uint8'}")
+    print(f"bytes/transition : {store.bytes_per_transition()}")
+    print(f"data MB          : {len(store) * store.bytes_per_transition() / 1e6:.1f}")
+
+
+def _cmd_train(args):
+    from agent import DQNAgent
+    store = TrajectoryStore(args.data, args.batch_size, seed=args.seed)
+    if not len(store):
+        raise SystemExit(f"No transitions in {args.data}.")
+    agent = DQNAgent(learning_rate=args.lr, discount_factor=args.gamma, batch_size=args.batch_size,
+                     target_update_freq=args.target_update, seed=args.seed, replay_buffer_size=args.batch_size)
+    if args.resume_weights and os.path.exists(args.model):
+        agent.load(args.model)
+    print(f"Training offline on {len(store)} transitions ({store.episodes} episodes) from {args.data}")
+    start = time.perf_counter()
+    for done_steps in range(0, args.steps, args.log_every):
+        agent.train_offline(store, min(args.log_every, args.steps - done_steps))
+        elapsed = time.perf_counter() - start
+        print(f"step {agent.update_count}: {agent.update_count / elapsed:.0f} steps/sec")
+    os.makedirs(os.path.dirname(args.model) or ".", exist_ok=True)
+    agent.save(args.model)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record trajectories to disk and train the DQN boss offline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_record = sub.add_parser("record", help="Play episodes with the exported policy and store them (no torch).")
+    p_record.add_argument("--out", required=True, help="Store directory.")
+    p_record.add_argument("--episodes", type=int, default=10000)
+    p_record.add_argument("--policy", default=os.path.join("Model", "dqn_boss_policy.npz"))
+    p_record.add_argument("--epsilon", type=float, default=0.3, help="Exploration rate of the recording policy.")
+    p_record.add_argument("--storage", choices=REPLAY_STORAGE_MODES, default="uint8")
+    p_record.add_argument("--name", default="trajectories", help="Writer name; use one per concurrent recorder.")
+    p_record.add_argument("--seed", type=int, default=None)
+    p_record.set_defaults(func=_cmd_record)
+
+    p_info = sub.add_parser("info", help="Transitions, episodes and size of a store.")
+    p_info.add_argument("--data", required=True)
+    p_info.set_defaults(func=_cmd_info)
+
+    p_train = sub.add_parser("train", help="Train a DQNAgent on a store, without simulation.")
+    p_train.add_argument("--data", required=True)
+    p_train.add_argument("--steps", type=int, default=100000, help="Gradient steps.")
+    p_train.add_argument("--batch-size", type=int, default=64)
+    p_train.add_argument("--lr", type=float, default=0.0005)
+    p_train.add_argument("--gamma", type=float, default=0.95)
+    p_train.add_argument("--target-update", type=int, default=100, help="Gradient steps between target syncs.")
+    p_train.add_argument("--model", default=os.path.join("Model", "dqn_boss_offline.pth"))
+    p_train.add_argument("--resume-weights", action="store_true", help="Start from the weights in --model.")
+    p_train.add_argument("--log-every", type=int, default=10000)
+    p_train.add_argument("--seed", type=int, default=None)
+    p_train.set_defaults(func=_cmd_train)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
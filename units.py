@@ -38,8 +38,28 @@ class AD(Unit):
     def __init__(self, position=None):
         super().__init__("AD", 1, 1, 2, "A", position)
 
-PLAYER_UNIT_SPECS = {
-    "Tank": {"class": Tank, "max_accumulation": 2, "abbr": "T"},
-    "Knight": {"class": Knight, "max_accumulation": 2, "abbr": "K"},
-    "AD": {"class": AD, "max_accumulation": 3, "abbr": "A"}
-}
\ No newline at end of file
+PLAYER_UNIT_SPECS = { # kill_reward: boss reward for destroying one (GameLogic.get_kill_reward)
+    "Tank": {"class": Tank, "max_accumulation": 2, "abbr": "T", "kill_reward": 3},
+    "Knight": {"class": Knight, "max_accumulation": 2, "abbr": "K", "kill_reward": 4},
+    "AD": {"class": AD, "max_accumulation": 3, "abbr": "A", "kill_reward": 7}
+}
+
+# --- Compact unit type codes (used by board.Board and batch_env) ---
+EMPTY = 0
+UNIT_TYPE_CODES = {"Tank": 1, "Knight": 2, "AD": 3}
+UNIT_CODE_NAMES = [None, "Tank", "Knight", "AD"] # Index = type code
+_UNIT_PROTOTYPES = [None] + [PLAYER_UNIT_SPECS[name]["class"]() for name in UNIT_CODE_NAMES[1:]]
+UNIT_CODE_MAX_HP = [0] + [u.max_hp for u in _UNIT_PROTOTYPES[1:]]
+UNIT_CODE_ATTACK = [0] + [u.attack_power for u in _UNIT_PROTOTYPES[1:]]
+UNIT_CODE_ABBR = [""] + [u.abbr for u in _UNIT_PROTOTYPES[1:]]
+UNIT_CODE_KILL_REWARD = [0] + [PLAYER_UNIT_SPECS[name]["kill_reward"] for name in UNIT_CODE_NAMES[1:]]
+
+# --- Cell states: one small int per (unit type, HP) pair, 0 = empty (solver keys, line tables) ---
+CELL_STATE_OFFSET = [0] * len(UNIT_CODE_NAMES) # State of a (code, hp) cell = offset[code] + hp - 1
+_next_state = 1
+for _code in range(1, len(UNIT_CODE_NAMES)):
+    CELL_STATE_OFFSET[_code] = _next_state
+    _next_state += UNIT_CODE_MAX_HP[_code]
+CELL_STATES = _next_state
+CELL_STATE_DECODE = [(EMPTY, 0)] + [(code, hp) for code in range(1, len(UNIT_CODE_NAMES))
+                                    for hp in range(1, UNIT_CODE_MAX_HP[code] + 1)] # state -> (code, hp)